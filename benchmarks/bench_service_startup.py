@@ -0,0 +1,93 @@
+"""服务启动耗时对比：逐个导入并实例化全部服务（旧版 load_all_services） vs 服务清单 + 按需实例化
+
+用法（项目根目录）：python benchmarks/bench_service_startup.py [--services 300]
+
+在临时目录中按 templates/service_template.py 生成若干个合成服务（工作流与配置复制自 MultiAngle），
+不需要真实的 ComfyUI 服务器。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def create_services(root: Path, count: int):
+    from jinja2 import Environment, FileSystemLoader
+    template = Environment(loader=FileSystemLoader(str(ROOT / "templates"))).get_template("service_template.py")
+    source = ROOT / "services" / "MultiAngle"
+    for i in range(count):
+        name = f"Synthetic{i:04d}"
+        service_dir = root / "services" / name
+        service_dir.mkdir(parents=True)
+        shutil.copy(source / "workflow.json", service_dir / "workflow.json")
+        shutil.copy(source / "config.json", service_dir / "config.json")
+        (service_dir / "service.py").write_text(template.render(service_name=name, server_name="bench"), encoding="utf-8")
+    (root / "comfy_servers.json").write_text(json.dumps({"servers": [
+        {"name": "bench", "host": "127.0.0.1", "port": 1, "upload_dir": str(root / "upload")}
+    ]}))
+
+
+def legacy_load(app, service_root: Path):
+    """原有方式：串行导入每个 service.py、创建实例并挂载路由"""
+    for service_dir in sorted(service_root.iterdir()):
+        if not service_dir.is_dir():
+            continue
+        name = service_dir.name
+        spec = importlib.util.spec_from_file_location(f"services.{name}.service", service_dir / "service.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        instance = getattr(module, f"{name}Service")()
+        app.include_router(instance.router, prefix=f"/service/{name}", tags=[name])
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务启动耗时对比")
+    parser.add_argument("--services", type=int, default=300)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="comfybox-bench-"))
+    try:
+        create_services(root, args.services)
+        service_root = root / "services"
+        os.chdir(root)
+        os.environ["SERVICE_ROOT"] = str(service_root)
+
+        from fastapi import FastAPI
+        from common.base_service.manifest import build_manifest
+        from common.base_service.registry import ServiceRegistry
+
+        print(f"合成服务数: {args.services}")
+        _, legacy_ms = timed(legacy_load, FastAPI(), service_root)
+        print(f"  旧版（导入 + 实例化全部服务）:     {legacy_ms:8.1f} ms")
+
+        _, manifest_ms = timed(build_manifest, service_root)
+        print(f"  生成服务清单（generate_service.py）: {manifest_ms:8.1f} ms")
+
+        app = FastAPI()
+        registry = ServiceRegistry(service_root)
+        _, register_ms = timed(registry.mount, app)
+        print(f"  清单注册路由（启动耗时）:           {register_ms:8.1f} ms  "
+              f"(扫描 {registry.report['discover_ms']} ms)")
+
+        loads = [timed(lazy.get)[1] for lazy in list(registry.services.values())[:20]]
+        print(f"  首次请求时的单个服务加载:           {sum(loads) / len(loads):8.2f} ms（前 20 个服务平均）")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
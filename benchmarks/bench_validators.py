@@ -0,0 +1,119 @@
+"""参数校验基准：旧版 validate_inputs vs 预编译的 InputValidator（大批量请求）
+
+用法（项目根目录）：python benchmarks/bench_validators.py [--items 1000] [--fields 40]
+
+合成映射中 int / float / bool / str / filepath 各占 1/5，批量中每组输入都引用同一批输入文件；
+旧版每个 filepath 参数都访问一次文件系统，预编译版本按 FILE_CHECK_TTL 缓存检查结果。
+输入值使用映射要求的类型（旧版在需要类型转换时会因 inputs[field] = value 报错）。
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from common.utils.validators import InputValidator
+
+TYPES = ["int", "float", "bool", "str", "filepath"]
+
+
+def legacy_validate_inputs(inputs, mappings):
+    """旧版 validate_inputs（按列表位置对齐、逐个 if 判断类型、每次访问文件系统）"""
+    validated_data = []
+    for i, mapping in enumerate(mappings):
+        input = inputs[i]
+        node_id = mapping.get("node_id")
+        data_type = mapping.get("data_type")
+        field = mapping.get("input_field")
+        required = mapping.get("required", False)
+        default = mapping.get("default_value")
+        if required and node_id != input.get("node_id"):
+            raise ValueError(f"输入缺失节点ID或者无法与映射节点ID对齐: {node_id}")
+        if required and field not in input:
+            raise ValueError(f"输入参数缺失: {field}")
+        value = input.get(field, default)
+        if value is None and not required:
+            continue
+        if data_type == "int":
+            if not isinstance(value, int):
+                value = int(value)
+        elif data_type == "float":
+            if not isinstance(value, float):
+                value = float(value)
+        elif data_type == "bool":
+            if not isinstance(value, bool):
+                value = str(value).lower() == "true"
+        elif data_type == "filepath":
+            if not os.path.exists(value):
+                raise ValueError(f"文件路径不存在: {value}")
+        elif data_type == "str":
+            pass
+        input[node_id] = value
+        validated_data.append(input)
+    return validated_data
+
+
+def make_case(field_count: int, item_count: int, file_dir: Path):
+    files = []
+    for i in range(8):
+        path = file_dir / f"input_{i}.png"
+        path.write_bytes(b"\x89PNG")
+        files.append(str(path))
+    mappings = [
+        {"node_id": str(i), "input_field": f"field_{i}", "data_type": TYPES[i % len(TYPES)], "required": True}
+        for i in range(field_count)
+    ]
+    samples = {"int": 7, "float": 0.5, "bool": True, "str": "bench"}
+    batch = [
+        [
+            {"node_id": m["node_id"], m["input_field"]: files[j % len(files)] if m["data_type"] == "filepath"
+             else samples[m["data_type"]]}
+            for m in mappings
+        ]
+        for j in range(item_count)
+    ]
+    return mappings, batch
+
+
+def timed(func, repeat: int):
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="参数校验基准")
+    parser.add_argument("--items", type=int, default=1000, help="批量中的输入组数")
+    parser.add_argument("--fields", type=int, default=40, help="每组输入的参数数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    file_dir = Path(tempfile.mkdtemp(prefix="comfybox-bench-"))
+    try:
+        mappings, batch = make_case(args.fields, args.items, file_dir)
+        validator = InputValidator(mappings)
+
+        # 两种实现的校验结果必须一致
+        expected = [[item[m["input_field"]] for item, m in zip(inputs, mappings)] for inputs in batch]
+        results, errors = validator.validate_many(batch)
+        assert not errors and results == expected
+
+        legacy_ms = timed(lambda: [legacy_validate_inputs(inputs, mappings) for inputs in batch], args.repeat)
+        compiled_ms = timed(lambda: validator.validate_many(batch), args.repeat)
+        print(f"批量 {args.items} 组 × {args.fields} 个参数（其中 {args.fields // len(TYPES)} 个 filepath）")
+        print(f"  旧版 validate_inputs:     {legacy_ms:8.1f} ms  ({legacy_ms / args.items * 1000:6.1f} µs/组)")
+        print(f"  预编译 InputValidator:     {compiled_ms:8.1f} ms  ({compiled_ms / args.items * 1000:6.1f} µs/组)"
+              f"  {legacy_ms / compiled_ms:.1f}x")
+    finally:
+        shutil.rmtree(file_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
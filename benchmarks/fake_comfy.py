@@ -0,0 +1,260 @@
+"""模拟 ComfyUI 服务器，用于在没有 GPU 的机器上压测网关
+
+用法（项目根目录）：python benchmarks/fake_comfy.py --port 8190 --exec-time lognormal:2,0.3 --image-kb 512
+
+实现网关用到的接口：/prompt、/history/{prompt_id}、/view、/queue（GET 查询、POST 删除排队项）、/interrupt、
+/ws、/upload/image、/system_stats。--hang-rate 模拟卡死的 GPU（prompt 一直执行，直到被 /interrupt 中断）。
+与真实 ComfyUI 一致，prompt 按提交顺序排队，由 --workers 个执行槽（默认 1，即单 GPU）依次执行；
+每个 SaveImage / PreviewImage 节点输出 --images-per-node 张图片。
+"""
+import sys
+import time
+import uuid
+import zlib
+import random
+import struct
+import asyncio
+import argparse
+from collections import OrderedDict
+from aiohttp import web, WSMsgType
+
+OUTPUT_NODES = ("SaveImage", "PreviewImage")
+
+
+def parse_distribution(spec: str):
+    """执行耗时分布（秒）：fixed:2 | uniform:1,3 | normal:2,0.5 | lognormal:mu,sigma（按 ln 秒）| exp:2（均值）"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    samplers = {
+        "fixed": lambda: values[0],
+        "uniform": lambda: random.uniform(values[0], values[1]),
+        "normal": lambda: random.gauss(values[0], values[1]),
+        "lognormal": lambda: random.lognormvariate(values[0], values[1]),
+        "exp": lambda: random.expovariate(1 / values[0])
+    }
+    if kind not in samplers:
+        raise argparse.ArgumentTypeError(f"未知的分布: {spec}（可选 {', '.join(samplers)}）")
+    sampler = samplers[kind]
+    return lambda: max(0.0, sampler())
+
+
+def make_png(size_bytes: int) -> bytes:
+    """生成约 size_bytes 大小的有效 PNG（随机像素，几乎不可压缩）"""
+    side = max(1, int((size_bytes / 3) ** 0.5))
+    rows = b"".join(b"\x00" + random.randbytes(side * 3) for _ in range(side))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b"")
+
+
+class FakeComfy:
+    def __init__(self, args):
+        self.args = args
+        self.exec_time = args.exec_time
+        self.image = make_png(args.image_kb * 1024)
+        self.pending: "asyncio.Queue" = asyncio.Queue()
+        self.queued = OrderedDict()  # prompt_id -> 提交编号（排队中）
+        self.running = OrderedDict()  # prompt_id -> 提交编号（执行中）
+        self.history = OrderedDict()
+        self.sockets = {}
+        self.number = 0
+        self.interrupted = set()  # 被 /interrupt 中断的执行中 prompt
+        self.stats = {"prompts": 0, "completed": 0, "failed": 0, "interrupted": 0, "deleted": 0, "views": 0, "uploads": 0}
+
+    async def start_workers(self, app):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.args.workers)]
+
+    async def _send(self, client_id, event: str, data: dict):
+        ws = self.sockets.get(client_id)
+        if ws is not None and not ws.closed:
+            try:
+                await ws.send_json({"type": event, "data": data})
+            except ConnectionError:
+                pass
+
+    async def _broadcast_status(self):
+        data = {"status": {"exec_info": {"queue_remaining": len(self.queued) + len(self.running)}}}
+        for client_id in list(self.sockets):
+            await self._send(client_id, "status", data)
+
+    async def _worker(self):
+        while True:
+            prompt_id, client_id, prompt = await self.pending.get()
+            if prompt_id not in self.queued:
+                continue  # 排队时已被删除
+            self.running[prompt_id] = self.queued.pop(prompt_id)
+            await self._broadcast_status()
+            # 与真实 ComfyUI 相同：执行消息带毫秒时间戳，并记录在 /history 的 status.messages 中
+            start = ["execution_start", {"prompt_id": prompt_id, "timestamp": int(time.time() * 1000)}]
+            await self._send(client_id, *start)
+            if random.random() < self.args.hang_rate:
+                while prompt_id not in self.interrupted:
+                    await asyncio.sleep(0.05)
+            else:
+                duration = self.exec_time()
+                steps = self.args.progress_steps
+                for step in range(1, steps + 1):
+                    await asyncio.sleep(duration / steps)
+                    if prompt_id in self.interrupted:
+                        break
+                    await self._send(client_id, "progress", {"value": step, "max": steps, "prompt_id": prompt_id, "node": None})
+
+            interrupted = prompt_id in self.interrupted
+            self.interrupted.discard(prompt_id)
+            failed = interrupted or random.random() < self.args.fail_rate
+            finished_at = int(time.time() * 1000)
+            error = ["execution_interrupted" if interrupted else "execution_error", {
+                "prompt_id": prompt_id,
+                "timestamp": finished_at,
+                "exception_type": "InterruptProcessingException" if interrupted else "RuntimeError",
+                "exception_message": "已中断" if interrupted else "模拟失败"
+            }]
+            success = ["execution_success", {"prompt_id": prompt_id, "timestamp": finished_at}]
+            outputs = {}
+            if not failed:
+                for node_id, node in prompt.items():
+                    if node.get("class_type") in OUTPUT_NODES:
+                        outputs[node_id] = {"images": [
+                            {"filename": f"{prompt_id}_{node_id}_{i}.png", "subfolder": "", "type": "output"}
+                            for i in range(self.args.images_per_node)
+                        ]}
+            # 与真实 ComfyUI 相同：失败时 completed 为 false、status_str 为 error
+            self.history[prompt_id] = {
+                "prompt": [self.running[prompt_id], prompt_id, prompt, {}, list(outputs)],
+                "outputs": outputs,
+                "status": {
+                    "status_str": "error" if failed else "success",
+                    "completed": not failed,
+                    "messages": [start, error if failed else success]
+                },
+                "meta": {}
+            }
+            while len(self.history) > self.args.max_history:
+                self.history.popitem(last=False)
+            del self.running[prompt_id]
+            self.stats["interrupted" if interrupted else "failed" if failed else "completed"] += 1
+            if failed:
+                await self._send(client_id, *error)
+            else:
+                await self._send(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+                await self._send(client_id, *success)
+            await self._broadcast_status()
+
+    async def prompt(self, request):
+        body = await request.json()
+        prompt = body.get("prompt")
+        if not isinstance(prompt, dict) or not all(
+            isinstance(node, dict) and "class_type" in node for node in prompt.values()
+        ):
+            return web.json_response({"error": {"type": "invalid_prompt", "message": "无效的 prompt"}, "node_errors": {}}, status=400)
+        prompt_id = str(uuid.uuid4())
+        self.number += 1
+        self.queued[prompt_id] = self.number
+        self.stats["prompts"] += 1
+        await self.pending.put((prompt_id, body.get("client_id"), prompt))
+        return web.json_response({"prompt_id": prompt_id, "number": self.number, "node_errors": {}})
+
+    async def history_item(self, request):
+        prompt_id = request.match_info["prompt_id"]
+        item = self.history.get(prompt_id)
+        return web.json_response({prompt_id: item} if item else {})
+
+    async def view(self, request):
+        self.stats["views"] += 1
+        return web.Response(body=self.image, content_type="image/png")
+
+    async def queue(self, request):
+        return web.json_response({
+            "queue_running": [[n, pid] for pid, n in self.running.items()],
+            "queue_pending": [[n, pid] for pid, n in self.queued.items()]
+        })
+
+    async def delete_queued(self, request):
+        body = await request.json()
+        for prompt_id in body.get("delete", []):
+            if self.queued.pop(prompt_id, None) is not None:
+                self.stats["deleted"] += 1
+        if body.get("clear"):
+            self.stats["deleted"] += len(self.queued)
+            self.queued.clear()
+        return web.Response()
+
+    async def interrupt(self, request):
+        # 与新版 ComfyUI 相同：带 prompt_id 时只中断正在执行的该 prompt，否则中断所有执行中的 prompt
+        body = await request.json() if request.can_read_body else {}
+        targets = [body["prompt_id"]] if body.get("prompt_id") else list(self.running)
+        self.interrupted.update(pid for pid in targets if pid in self.running)
+        return web.Response()
+
+    async def upload(self, request):
+        data = await request.post()
+        self.stats["uploads"] += 1
+        return web.json_response({"name": data["image"].filename, "subfolder": "", "type": "input"})
+
+    async def system_stats(self, request):
+        return web.json_response({"system": {"comfyui_version": "fake"}, "devices": [], "fake": self.stats})
+
+    async def ws(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        client_id = request.query.get("clientId") or uuid.uuid4().hex
+        self.sockets[client_id] = ws
+        await self._send(client_id, "status", {
+            "status": {"exec_info": {"queue_remaining": len(self.queued) + len(self.running)}},
+            "sid": client_id
+        })
+        async for msg in ws:
+            if msg.type == WSMsgType.ERROR:
+                break
+        self.sockets.pop(client_id, None)
+        return ws
+
+
+def create_app(args) -> web.Application:
+    fake = FakeComfy(args)
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app.on_startup.append(fake.start_workers)
+    app.add_routes([
+        web.post("/prompt", fake.prompt),
+        web.get("/history/{prompt_id}", fake.history_item),
+        web.get("/view", fake.view),
+        web.get("/queue", fake.queue),
+        web.post("/queue", fake.delete_queued),
+        web.post("/interrupt", fake.interrupt),
+        web.post("/upload/image", fake.upload),
+        web.get("/system_stats", fake.system_stats),
+        *([] if args.no_ws else [web.get("/ws", fake.ws)])
+    ])
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="模拟 ComfyUI 服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8190)
+    parser.add_argument("--workers", type=int, default=1, help="同时执行的 prompt 数（GPU 数）")
+    parser.add_argument("--exec-time", type=parse_distribution, default=parse_distribution("fixed:1"),
+                        help="单个 prompt 的执行耗时分布，如 fixed:1、uniform:0.5,2、lognormal:0,0.5")
+    parser.add_argument("--image-kb", type=int, default=256, help="每张输出图片的大小（KB）")
+    parser.add_argument("--images-per-node", type=int, default=1, help="每个 SaveImage / PreviewImage 节点输出的图片数")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="执行失败的 prompt 比例")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="卡死（直到被 /interrupt 中断）的 prompt 比例")
+    parser.add_argument("--progress-steps", type=int, default=4, help="每个 prompt 推送的 progress 事件数")
+    parser.add_argument("--max-history", type=int, default=10000)
+    parser.add_argument("--no-ws", action="store_true", help="不提供 /ws（测试网关的轮询回退）")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    print(f"模拟 ComfyUI 已启动: http://{args.host}:{args.port}", file=sys.stderr)
+    web.run_app(create_app(args), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
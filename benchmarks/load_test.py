@@ -0,0 +1,273 @@
+"""网关压测：按目标 RPS 开环发送 /service/{name}/execute 请求，统计吞吐量、p50/p95/p99 延迟与错误率
+
+用法（项目根目录）：
+  # 自动启动模拟 ComfyUI（benchmarks/fake_comfy.py）与网关，适合在 CI 中运行
+  python benchmarks/load_test.py --spawn --rps 5 --duration 30 --fake-exec-time uniform:0.2,0.6 --fake-workers 4
+  # 压测已启动的网关
+  python benchmarks/load_test.py --url http://127.0.0.1:8686 --service MultiAngle --rps 2 --duration 60
+
+请求按服务轮流发送，输入根据各服务 config.json 的 input_mappings 生成且每次不同（不会命中结果缓存）：
+名为 image 的字段发送随机的 Base64 PNG，其余字段发送随机文本。
+--max-error-rate 设置后，错误率超过阈值时以非零状态码退出。
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from collections import Counter, defaultdict
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_comfy import make_png  # noqa: E402
+
+DEFAULT_SERVICES = ["GenerateStory", "MultiAngle"]
+
+
+class InputFactory:
+    """按服务的 input_mappings 生成每次不同的请求体"""
+
+    def __init__(self, service_root: Path, image_kb: int):
+        self.service_root = service_root
+        self.image_kb = image_kb
+        self.mappings = {}
+
+    def load(self, service: str):
+        config = json.loads((self.service_root / service / "config.json").read_text(encoding="utf-8"))
+        self.mappings[service] = config.get("input_mappings", [])
+
+    def build(self, service: str):
+        inputs = []
+        for mapping in self.mappings[service]:
+            field = mapping["input_field"]
+            if field == "image":
+                value = "data:image/png;base64," + base64.b64encode(make_png(self.image_kb * 1024)).decode()
+            elif mapping.get("data_type") == "int":
+                value = random.randint(0, 2 ** 31)
+            elif mapping.get("data_type") == "float":
+                value = random.random()
+            else:
+                value = f"load test {uuid.uuid4().hex}"
+            inputs.append({"node_id": mapping["node_id"], field: value})
+        return inputs
+
+
+def percentile(values, p: float):
+    """最近秩百分位数（毫秒）；没有样本时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))
+    return round(ordered[index] * 1000, 1)
+
+
+def summarize(records, elapsed: float):
+    ok = [r for r in records if r["ok"]]
+    latencies = [r["latency"] for r in ok]
+    outcomes = Counter(r["outcome"] for r in records)
+    return {
+        "requests": len(records),
+        "succeeded": len(ok),
+        "errors": len(records) - len(ok),
+        "error_rate": round((len(records) - len(ok)) / len(records), 4) if records else 0.0,
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(max(latencies) * 1000, 1) if latencies else None
+        },
+        "outcomes": dict(outcomes)
+    }
+
+
+async def send(session, url: str, service: str, body, timeout: float, records):
+    started = time.perf_counter()
+    record = {"service": service, "ok": False}
+    try:
+        async with session.post(
+            f"{url}/service/{service}/execute",
+            json=body,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            await response.read()
+            record["ok"] = response.status == 200
+            record["outcome"] = str(response.status)
+    except asyncio.TimeoutError:
+        record["outcome"] = "timeout"
+    except aiohttp.ClientError as e:
+        record["outcome"] = type(e).__name__
+    record["latency"] = time.perf_counter() - started
+    records.append(record)
+
+
+async def run_load(args, services):
+    """开环发压：第 i 个请求在 i / rps 秒时发出，不等待之前的请求完成（超过 --max-outstanding 时计为 dropped）"""
+    factory = InputFactory(Path(args.service_root), args.image_kb)
+    for service in services:
+        factory.load(service)
+
+    records, tasks = [], set()
+    total = int(args.rps * args.duration)
+    connector = aiohttp.TCPConnector(limit=args.max_outstanding)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        for i in range(total):
+            delay = started + i / args.rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            service = services[i % len(services)]
+            if len(tasks) >= args.max_outstanding:
+                records.append({"service": service, "ok": False, "outcome": "dropped", "latency": 0.0})
+                continue
+            task = asyncio.create_task(send(session, args.url, service, factory.build(service), args.timeout, records))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "target_rps": args.rps,
+        "duration_s": round(elapsed, 2),
+        **summarize(records, elapsed),
+        "services": {}
+    }
+    by_service = defaultdict(list)
+    for record in records:
+        by_service[record["service"]].append(record)
+    for service, items in by_service.items():
+        report["services"][service] = summarize(items, elapsed)
+    return report
+
+
+async def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=2)) as response:
+                    if response.status < 500:
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"等待服务启动超时: {url}")
+
+
+def spawn(args, workdir: Path):
+    """在临时目录中启动模拟 ComfyUI 与网关（server_a 指向模拟服务器），返回子进程列表"""
+    (workdir / "frontend" / "dist").mkdir(parents=True)
+    (workdir / "comfy_servers.json").write_text(json.dumps({"servers": [{
+        "name": "server_a",
+        "host": "127.0.0.1",
+        "port": args.fake_port,
+        "upload_dir": str(workdir / "upload"),
+        "max_in_flight": args.max_in_flight,
+        "max_queued": args.max_queued,
+        "queue_timeout": args.timeout
+    }]}))
+    env = {
+        **os.environ,
+        "PROJECT_ROOT": str(ROOT),
+        "SERVICE_ROOT": str(Path(args.service_root).resolve()),
+        "OUTPUT_DIR": str(workdir / "outputs"),
+        "INPUT_DIR": str(workdir / "inputs"),
+        "STATE_DIR": str(workdir / "state"),
+        "PYTHONPATH": str(ROOT),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING")
+    }
+    logs = open(workdir / "spawn.log", "wb")
+    fake = subprocess.Popen([
+        sys.executable, str(ROOT / "benchmarks" / "fake_comfy.py"),
+        "--port", str(args.fake_port),
+        "--workers", str(args.fake_workers),
+        "--exec-time", args.fake_exec_time,
+        "--image-kb", str(args.fake_image_kb),
+        "--fail-rate", str(args.fake_fail_rate)
+    ], cwd=workdir, env=env, stdout=logs, stderr=logs)
+    gateway = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--app-dir", str(ROOT), "--host", "127.0.0.1", "--port", str(args.port)
+    ], cwd=workdir, env=env, stdout=logs, stderr=logs)
+    return [fake, gateway]
+
+
+def print_report(report):
+    latency = report["latency_ms"]
+    print(f"目标 {report['target_rps']} rps，实际耗时 {report['duration_s']} s")
+    print(f"  请求 {report['requests']}，成功 {report['succeeded']}，错误率 {report['error_rate']:.2%}，"
+          f"吞吐量 {report['throughput_rps']} rps")
+    print(f"  延迟 p50 {latency['p50']} ms / p95 {latency['p95']} ms / p99 {latency['p99']} ms / max {latency['max']} ms")
+    print(f"  结果分布: {report['outcomes']}")
+    for service, item in report["services"].items():
+        print(f"  {service}: 请求 {item['requests']}，错误率 {item['error_rate']:.2%}，"
+              f"p50 {item['latency_ms']['p50']} ms，p99 {item['latency_ms']['p99']} ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="网关压测")
+    parser.add_argument("--url", default=None, help="网关地址（默认 http://127.0.0.1:<--port>）")
+    parser.add_argument("--port", type=int, default=8686)
+    parser.add_argument("--service", action="append", dest="services", help=f"压测的服务，可重复（默认 {' '.join(DEFAULT_SERVICES)}）")
+    parser.add_argument("--service-root", default=str(ROOT / "services"))
+    parser.add_argument("--rps", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求的超时（秒）")
+    parser.add_argument("--max-outstanding", type=int, default=1000, help="同时未完成请求数上限")
+    parser.add_argument("--image-kb", type=int, default=16, help="image 字段上传的图片大小（KB）")
+    parser.add_argument("--json", dest="json_path", help="报告另存为 JSON 文件")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="错误率超过该值时以非零状态码退出")
+    parser.add_argument("--seed", type=int, default=None)
+
+    spawn_group = parser.add_argument_group("--spawn：自动启动模拟 ComfyUI 与网关")
+    spawn_group.add_argument("--spawn", action="store_true")
+    spawn_group.add_argument("--fake-port", type=int, default=8190)
+    spawn_group.add_argument("--fake-workers", type=int, default=1)
+    spawn_group.add_argument("--fake-exec-time", default="uniform:0.5,1.5")
+    spawn_group.add_argument("--fake-image-kb", type=int, default=256)
+    spawn_group.add_argument("--fake-fail-rate", type=float, default=0.0)
+    spawn_group.add_argument("--max-in-flight", type=int, default=4)
+    spawn_group.add_argument("--max-queued", type=int, default=200)
+    args = parser.parse_args(argv)
+    args.url = (args.url or f"http://127.0.0.1:{args.port}").rstrip("/")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    services = args.services or DEFAULT_SERVICES
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="comfybox-load-") as workdir:
+        try:
+            if args.spawn:
+                processes = spawn(args, Path(workdir))
+                asyncio.run(wait_ready(f"http://127.0.0.1:{args.fake_port}/system_stats"))
+                asyncio.run(wait_ready(f"{args.url}/services"))
+            report = asyncio.run(run_load(args, services))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+    print_report(report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        print(f"错误率 {report['error_rate']:.2%} 超过阈值 {args.max_error_rate:.2%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""准入队列调度的确定性模拟：FIFO vs 优先级 + 加权公平排队（FairQueue）
+
+用法（项目根目录）：python benchmarks/sim_scheduler.py
+
+用离散事件模拟代替真实的 ComfyUI：FakeExecutor 有 max_in_flight 个执行名额，
+每个 prompt 占用固定时长，不依赖事件循环和真实时钟，结果可重复。
+场景：两个批量流（MultiAngle，API key 权重 2:1）在 t=0 一次性提交大量任务，
+同时交互式请求（GenerateStory）每隔几秒到达一个。
+"""
+import sys
+import heapq
+import argparse
+from collections import deque
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from common.comfy_adapter.types import SchedulingTicket
+from common.comfy_adapter.scheduler import PRIORITIES, FairQueue
+
+
+class FifoQueue:
+    """原有行为：按到达顺序出队"""
+
+    def __init__(self):
+        self._items = deque()
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, item, ticket):
+        self._items.append(item)
+
+    def pop(self):
+        return self._items.popleft()
+
+
+class FakeExecutor:
+    """按虚拟时间执行 prompt 的假执行器，名额释放时从等待队列中取下一个"""
+
+    def __init__(self, queue, max_in_flight: int):
+        self.queue = queue
+        self.free = max_in_flight
+        self.now = 0.0
+        self._events = []  # (时间, 序号, 类型, 请求)
+        self._seq = 0
+        self._pending = {}  # 排队中的请求：id -> 请求
+        self.finished = []
+
+    def _schedule(self, at, kind, request):
+        self._seq += 1
+        heapq.heappush(self._events, (at, self._seq, kind, request))
+
+    def submit(self, request):
+        self._schedule(request["arrival"], "arrive", request)
+
+    def _start(self, request):
+        self.free -= 1
+        request["started"] = self.now
+        self._schedule(self.now + request["duration"], "finish", request)
+
+    def run(self):
+        while self._events:
+            self.now, _, kind, request = heapq.heappop(self._events)
+            if kind == "arrive":
+                if self.free > 0 and not len(self.queue):
+                    self._start(request)
+                else:
+                    self.queue.push(request["id"], request["ticket"])
+                    self._pending[request["id"]] = request
+            else:
+                request["finished"] = self.now
+                self.finished.append(request)
+                self.free += 1
+                if len(self.queue):
+                    self._start(self._pending.pop(self.queue.pop()))
+        return self.finished
+
+
+def build_requests(batch_size: int, interactive_every: float, horizon: float):
+    requests = []
+
+    def add(arrival, flow, priority, weight, duration):
+        requests.append({
+            "id": len(requests),
+            "arrival": arrival,
+            "flow": flow,
+            "duration": duration,
+            "ticket": SchedulingTicket(flow=flow, priority=PRIORITIES[priority], weight=weight)
+        })
+
+    for _ in range(batch_size):
+        add(0.0, "MultiAngle:pipeline-a", "batch", 2.0, 2.0)
+        add(0.0, "MultiAngle:pipeline-b", "batch", 1.0, 2.0)
+    t = 0.5
+    while t < horizon:
+        add(t, "GenerateStory:web", "interactive", 1.0, 1.0)
+        t += interactive_every
+    return requests
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def simulate(queue, args):
+    executor = FakeExecutor(queue, args.max_in_flight)
+    for request in build_requests(args.batch, args.interval, args.horizon):
+        executor.submit(request)
+    return executor.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="准入队列调度模拟")
+    parser.add_argument("--max-in-flight", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=150, help="每个批量流提交的任务数")
+    parser.add_argument("--interval", type=float, default=3.0, help="交互式请求到达间隔（秒）")
+    parser.add_argument("--horizon", type=float, default=300.0, help="交互式请求持续时长（秒）")
+    args = parser.parse_args()
+
+    for name, queue in (("FIFO", FifoQueue()), ("FairQueue", FairQueue())):
+        finished = simulate(queue, args)
+        latency = [r["finished"] - r["arrival"] for r in finished if r["flow"].startswith("GenerateStory")]
+        print(f"== {name} ==")
+        print(f"  交互式请求 {len(latency)} 个：p50={percentile(latency, 50):.1f}s  p95={percentile(latency, 95):.1f}s  "
+              f"max={max(latency):.1f}s")
+
+        # 两个批量流同时排队期间的执行份额
+        cutoff = min(max(r["finished"] for r in finished if r["flow"] == flow)
+                     for flow in ("MultiAngle:pipeline-a", "MultiAngle:pipeline-b"))
+        started = [r for r in finished if r["flow"].startswith("MultiAngle") and r["started"] < cutoff * 0.5]
+        share_a = sum(r["flow"].endswith("pipeline-a") for r in started)
+        print(f"  批量流份额（前半段，权重 2:1）：pipeline-a={share_a}  pipeline-b={len(started) - share_a}")
+        print(f"  全部完成耗时 {max(r['finished'] for r in finished):.1f}s")
+
+
+if __name__ == "__main__":
+    main()
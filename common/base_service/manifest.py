@@ -0,0 +1,68 @@
+import os
+import json
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# 服务清单：记录每个服务的类名与输入参数，网关启动时据此注册路由而不导入 service.py
+# （仅依赖标准库，供 scripts/generate_service.py 直接使用）
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def get_manifest_path() -> Path:
+    """服务清单路径（SERVICE_MANIFEST，默认 SERVICE_ROOT/manifest.json）"""
+    return Path(os.getenv("SERVICE_MANIFEST") or Path(os.getenv("SERVICE_ROOT")) / MANIFEST_NAME)
+
+
+def is_service_dir(path: Path) -> bool:
+    return path.is_dir() and not path.name.startswith(("_", "."))
+
+
+def describe_service(service_dir: Path) -> Dict:
+    """读取单个服务目录的清单条目（不导入 service.py）；缺少文件时 error 字段说明原因"""
+    name = service_dir.name
+    entry = {
+        "name": name,
+        "class_name": f"{name}Service",
+        "service_file": "service.py",
+        "input_parameters": [],
+        "error": None
+    }
+    for filename in ("service.py", "workflow.json", "config.json"):
+        if not (service_dir / filename).exists():
+            entry["error"] = f"缺少 {filename}"
+            return entry
+    try:
+        config = json.loads((service_dir / "config.json").read_text(encoding="utf-8"))
+    except ValueError as e:
+        entry["error"] = f"config.json 解析失败: {str(e)}"
+        return entry
+    entry["version"] = config.get("version", "1.0")
+    entry["input_parameters"] = config.get("input_mappings", [])
+    return entry
+
+
+def scan_services(service_root: Path, names: Optional[List[str]] = None, workers: int = 16) -> List[Dict]:
+    """并发读取服务目录，按名称排序返回清单条目（names 为空时扫描全部目录）"""
+    if names is None:
+        names = [d.name for d in service_root.iterdir() if is_service_dir(d)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        entries = list(pool.map(describe_service, (service_root / name for name in sorted(names))))
+    return entries
+
+
+def build_manifest(service_root: Path, path: Optional[Path] = None) -> Dict:
+    """扫描服务目录并写入服务清单（由 scripts/generate_service.py 在生成服务后调用）
+
+    内容只取决于服务目录（不含生成时间），服务不变时重新生成的文件完全相同
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "services": scan_services(Path(service_root))
+    }
+    path = Path(path or Path(service_root) / MANIFEST_NAME)
+    temp_path = path.with_name(f".{path.name}.part")
+    temp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(temp_path, path)
+    return manifest
@@ -0,0 +1,201 @@
+import json
+import time
+import asyncio
+import inspect
+import logging
+import importlib.util
+from pathlib import Path
+from dotenv import load_dotenv
+from typing import Callable, Dict, List, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from common.base_service.service import STANDARD_ROUTES, BaseService
+from common.base_service.manifest import get_manifest_path, is_service_dir, scan_services
+from common.utils.file_handler import get_service_path
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class LazyService:
+    """按清单注册的服务：首次请求时才导入 service.py 并创建实例"""
+
+    def __init__(self, entry: Dict, on_loaded: Optional[Callable[[str, BaseService], None]] = None):
+        self.name = entry["name"]
+        self.class_name = entry.get("class_name", f"{self.name}Service")
+        self.service_file = Path(get_service_path(self.name)) / entry.get("service_file", "service.py")
+        self.error: Optional[str] = entry.get("error")
+        self.instance: Optional[BaseService] = None
+        self.load_ms: Optional[float] = None
+        self.on_loaded = on_loaded
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def state(self) -> str:
+        if self.instance is not None:
+            return "loaded"
+        return "failed" if self.error else "registered"
+
+    def get(self) -> BaseService:
+        """返回服务实例（首次调用时在当前线程加载，用于启动预加载）；加载失败抛出 503，下次请求重试"""
+        if self.instance is not None:
+            return self.instance
+        return self._load()
+
+    async def aget(self) -> BaseService:
+        """请求中使用的 get：在线程中加载，不阻塞事件循环；并发的首次请求只加载一次"""
+        if self.instance is not None:
+            return self.instance
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.instance is None:
+                await asyncio.to_thread(self._load)
+        return self.instance
+
+    def _load(self) -> BaseService:
+        """导入 service.py 并创建实例（读取配置、创建服务器池等）"""
+        started = time.perf_counter()
+        try:
+            spec = importlib.util.spec_from_file_location(f"services.{self.name}.service", self.service_file)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            instance = getattr(module, self.class_name)()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {str(e)}"
+            logger.exception("加载服务失败", extra={"service": self.name})
+            raise HTTPException(503, f"服务 {self.name} 加载失败: {self.error}")
+        self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.instance, self.error = instance, None
+        logger.info("服务已加载", extra={"service": self.name, "load_ms": self.load_ms})
+        if self.on_loaded:
+            self.on_loaded(self.name, instance)
+        return instance
+
+    def stats(self) -> Dict:
+        return {"name": self.name, "state": self.state, "load_ms": self.load_ms, "error": self.error}
+
+
+class ServiceRegistry:
+    """从服务清单注册全部服务，不导入任何 service.py
+
+    标准路由只注册一次（/service/{service_name}/execute 等），按路径中的服务名转发给按需加载的实例，
+    注册耗时与服务数量无关；子类的自定义路由由挂载在 /service 下的分发入口转交给实例自己的 router。
+    清单不存在时扫描 SERVICE_ROOT；清单中没有的新目录同样按扫描结果注册（并提示重新生成清单）。
+    """
+
+    def __init__(self, service_root: Path, manifest_path: Optional[Path] = None):
+        self.service_root = Path(service_root)
+        self.manifest_path = Path(manifest_path or get_manifest_path())
+        self.services: Dict[str, LazyService] = {}
+        self.loaded: Dict[str, BaseService] = {}
+        self.report: Dict = {}
+
+    def discover(self) -> List[Dict]:
+        started = time.perf_counter()
+        dirs = {d.name for d in self.service_root.iterdir() if is_service_dir(d)}
+        entries, source = [], "scan"
+        if self.manifest_path.exists():
+            try:
+                manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+                entries = [e for e in manifest.get("services", []) if e["name"] in dirs]
+                source = "manifest"
+            except (ValueError, KeyError) as e:
+                logger.error("服务清单解析失败，改为扫描服务目录", extra={"path": str(self.manifest_path), "error": str(e)})
+        missing = sorted(dirs - {e["name"] for e in entries})
+        if missing and source == "manifest":
+            logger.warning("服务清单中缺少部分服务目录，请重新运行 scripts/generate_service.py", extra={"services": missing})
+        entries += scan_services(self.service_root, missing)
+        self.report = {
+            "source": source,
+            "manifest": str(self.manifest_path),
+            "unlisted": missing if source == "manifest" else [],
+            "discover_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        return entries
+
+    def _on_loaded(self, name: str, instance: BaseService):
+        self.loaded[name] = instance
+
+    def get(self, service_name: str) -> BaseService:
+        """按服务名取实例（首次调用时加载）；服务不存在时抛出 404"""
+        return self._lazy(service_name).get()
+
+    async def aget(self, service_name: str) -> BaseService:
+        """按服务名取实例，首次调用时在线程中加载（见 LazyService.aget）；服务不存在时抛出 404"""
+        return await self._lazy(service_name).aget()
+
+    def _lazy(self, service_name: str) -> LazyService:
+        lazy = self.services.get(service_name)
+        if lazy is None:
+            raise HTTPException(404, f"服务不存在: {service_name}")
+        return lazy
+
+    def _proxy_endpoint(self, method_name: str) -> Callable:
+        """参数与 BaseService 方法相同（另加路径参数 service_name）的路由函数，转发给对应的服务实例
+
+        子类以不同的参数签名重写标准方法时，请改为自定义路由。
+        """
+        func = getattr(BaseService, method_name)
+        signature = inspect.signature(func)
+
+        async def endpoint(service_name: str, **kwargs):
+            result = getattr(await self.aget(service_name), method_name)(**kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+        service_param = inspect.Parameter("service_name", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=str)
+        endpoint.__signature__ = signature.replace(
+            parameters=[service_param] + list(signature.parameters.values())[1:]
+        )
+        endpoint.__name__ = method_name
+        endpoint.__doc__ = func.__doc__
+        return endpoint
+
+    def mount(self, app: FastAPI):
+        """注册标准路由与自定义路由的分发入口，并按清单登记所有服务（不加载）"""
+        started = time.perf_counter()
+        for entry in self.discover():
+            if entry.get("error"):
+                logger.warning("服务目录不完整，已跳过", extra={"service": entry["name"], "error": entry["error"]})
+            self.services[entry["name"]] = LazyService(entry, self._on_loaded)
+        for path, method_name, options in STANDARD_ROUTES:
+            app.add_api_route(f"/service/{{service_name}}{path}", self._proxy_endpoint(method_name), **options)
+        app.mount("/service", self, name="services")
+        self.report.update({
+            "services": len(self.services),
+            "skipped": [name for name, lazy in self.services.items() if lazy.error],
+            "register_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+        logger.info("服务注册完成", extra=self.report)
+
+    async def __call__(self, scope, receive, send):
+        """/service/<name>/... 中标准路由以外的请求：转交给服务实例自己的 router（自定义路由）"""
+        service_name, _, rest = scope["path"][len(scope.get("root_path", "")):].lstrip("/").partition("/")
+        try:
+            service = await self.aget(service_name)
+        except HTTPException as e:
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+            return
+        await service.router({**scope, "root_path": f"{scope.get('root_path', '')}/{service_name}"}, receive, send)
+
+    def preload(self):
+        """启动时加载全部服务（SERVICE_PRELOAD=1），失败的服务记录在报告中"""
+        started = time.perf_counter()
+        for lazy in self.services.values():
+            if lazy.state == "registered":
+                try:
+                    lazy.get()
+                except HTTPException:
+                    pass
+        failed = [name for name, lazy in self.services.items() if lazy.state == "failed"]
+        self.report.update({"preload_ms": round((time.perf_counter() - started) * 1000, 1), "failed": failed})
+        logger.info("服务预加载完成", extra={"loaded": len(self.loaded), "failed": failed})
+
+    def stats(self) -> Dict:
+        return {
+            **self.report,
+            "loaded": len(self.loaded),
+            "items": [lazy.stats() for lazy in self.services.values()]
+        }
@@ -1,28 +1,85 @@
 import os
+import logging
 import json
-import requests
-import time
+import base64
+import asyncio
+from pathlib import Path
+from dataclasses import asdict
 from abc import ABC
-from typing import List, Dict, Any
-from fastapi import Body, APIRouter, HTTPException
-from fastapi.routing import APIRoute
-from common.comfy_adapter.config_loader import load_comfy_config
-from common.comfy_adapter.executor import ComfyExecutor
-from common.utils.validators import validate_inputs
-from common.utils.file_handler import get_service_path
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from common.comfy_adapter.server_pool import DeadlineExceeded, NoBackendAvailable, get_server_pool, journal_finish
+from common.comfy_adapter.journal import journal_context
+from common.comfy_adapter.admission import Saturated
+from common.comfy_adapter.assets import get_asset_store, is_data_uri, parse_asset_ref
+from common.comfy_adapter.outputs import index_outputs
+from common.comfy_adapter.renditions import PILLOW_AVAILABLE, get_renderer, parse_renditions
+from common.comfy_adapter.types import DownloadedImage, PromptState, RenditionSpec, SchedulingTicket, WorkflowStatus
+from common.comfy_adapter.scheduler import make_ticket
+from common.comfy_adapter.result_cache import get_result_cache, workflow_cache_key
+from common.base_service.workflow_template import PreparedWorkflow, WorkflowTemplate
+from common.jobs.manager import get_job_manager
+from common.utils.validators import InputValidator
+from common.utils.file_handler import get_output_subdir, get_service_path
+from common.utils.config_registry import get_config_registry
+from common.utils.metrics import CACHE_REQUESTS, ERRORS, REQUESTS, STAGE_SECONDS
+from common.utils.tracing import stage, start_span
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 批量执行：单次请求最多的输入组数、默认并发数
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+
+# 每个服务都有的标准路由：(路径, 方法名, add_api_route 参数)
+# 服务注册表据此在服务实例化之前注册路由（见 common/base_service/registry.py）
+STANDARD_ROUTES = (
+    ("/execute", "execute_workflow", {"methods": ["POST"], "tags": ["Execution"]}),
+    ("/execute_stream", "execute_stream", {"methods": ["POST"], "tags": ["Execution"]}),
+    ("/execute_batch", "execute_batch", {"methods": ["POST"], "tags": ["Execution"]}),
+    ("/jobs", "submit_job", {"methods": ["POST"], "status_code": 202, "tags": ["Execution"]}),
+    ("/health", "health_check", {"methods": ["GET"], "tags": ["Status"]}),
+    ("/metadata", "get_metadata", {"methods": ["GET"], "tags": ["Info"]}),
+)
+
+
+def _input_fields(user_inputs: Any) -> List[str]:
+    """请求参数的字段名（node_id.字段），用于日志中不记录参数值"""
+    if not isinstance(user_inputs, list):
+        return []
+    return [
+        f"{item.get('node_id')}.{key}"
+        for item in user_inputs if isinstance(item, dict)
+        for key in item if key != "node_id"
+    ]
+
 
 class BaseService(ABC):
-    def __init__(self, service_name: str, server_name: str):
+    def __init__(self, service_name: str, server_name: str = None, server_group: str = None):
+        if not (server_name or server_group):
+            raise ValueError(f"服务 {service_name} 需要指定 server_name 或 server_group")
         self.service_name = service_name
         self.server_name = server_name
+        self.server_group = server_group
         self.service_path = get_service_path(service_name)
         self.router = APIRouter()  # 改用 Router 而非独立 App
         
-        # 加载工作流和配置文件
+        # 加载工作流和配置文件（文件变化时自动重建模板，见 reload）
         self.workflow = self.load_workflow()
         self.config = self.load_config()
-        self.comfy_config = load_comfy_config(self.server_name)
-        self.comfy_executor = ComfyExecutor(self.comfy_config)
+        self.template = WorkflowTemplate(self.workflow, self.config.get("input_mappings", []))
+        self.validator = InputValidator(self.config.get("input_mappings", []))
+        self.renditions = parse_renditions(self.config)
+        registry = get_config_registry()
+        registry.subscribe(os.path.join(self.service_path, "workflow.json"), lambda workflow: self.reload(workflow=workflow))
+        registry.subscribe(os.path.join(self.service_path, "config.json"), lambda config: self.reload(config=config))
+        # 按分组（或单台服务器）派发任务
+        self.server_pool = get_server_pool(self.server_group or self.server_name)
+        self.result_cache = get_result_cache()
         
         # 注册路由
         self.register_routes()
@@ -32,16 +89,33 @@ class BaseService(ABC):
         workflow_path = os.path.join(self.service_path, "workflow.json")
         if not os.path.exists(workflow_path):
             raise FileNotFoundError(f"工作流文件缺失: {workflow_path}")
-        with open(workflow_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return get_config_registry().load_json(workflow_path)
 
     def load_config(self) -> Dict:
         """加载服务配置"""
         config_path = os.path.join(self.service_path, "config.json")
         if not os.path.exists(config_path):
             raise FileNotFoundError(f"配置文件缺失: {config_path}")
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return get_config_registry().load_json(config_path)
+
+    def reload(self, workflow: Optional[Dict] = None, config: Optional[Dict] = None):
+        """workflow.json / config.json 变化后重建模板
+
+        新模板构建成功后才整体替换（构建失败时保留旧配置）；已注入的请求持有旧模板，照常执行完成。
+        """
+        workflow = self.workflow if workflow is None else workflow
+        config = self.config if config is None else config
+        template = WorkflowTemplate(workflow, config.get("input_mappings", []))
+        validator = InputValidator(config.get("input_mappings", []))
+        renditions = parse_renditions(config)
+        self.workflow, self.config, self.template = workflow, config, template
+        self.validator, self.renditions = validator, renditions
+        logger.info("服务配置已重新加载", extra={"service": self.service_name})
+
+    @property
+    def comfy_config(self):
+        """服务器池中第一台服务器的配置（随 comfy_servers.json 热加载更新）"""
+        return self.server_pool.backends[0].config
 
     def health_check(self) -> Dict[str, str]:
         """健康检查端点"""
@@ -59,29 +133,14 @@ class BaseService(ABC):
                     "description": m.get("description", "")
                 }
                 for m in self.config.get("input_mappings", [])
-            ]
+            ],
+            "renditions": {name: asdict(spec) for name, spec in self.renditions.items()}
         }
 
     def register_routes(self):
         """显式注册标准路由"""
-        self.router.add_api_route(
-            "/execute",
-            self.execute_workflow,
-            methods=["POST"],
-            tags=["Execution"]
-        )
-        self.router.add_api_route(
-            "/health",
-            self.health_check,
-            methods=["GET"],
-            tags=["Status"]
-        )
-        self.router.add_api_route(
-            "/metadata",
-            self.get_metadata,
-            methods=["GET"],
-            tags=["Info"]
-        )
+        for path, method_name, options in STANDARD_ROUTES:
+            self.router.add_api_route(path, getattr(self, method_name), **options)
         
         # 允许子类扩展路由
         self.register_custom_routes()
@@ -91,61 +150,467 @@ class BaseService(ABC):
         pass
 
 
-    def execute_workflow(self, user_inputs: List[Dict]) -> Dict:
-        """单次请求完成参数注入+执行"""
-        print(f"原始输入: {user_inputs}")
+    async def close(self):
+        """释放服务器池持有的连接（共享的服务器池可重复关闭）"""
+        await self.server_pool.close()
+
+    async def build_workflow(self, user_inputs: List[Dict]) -> PreparedWorkflow:
+        """参数校验 + 注入，返回可直接提交的工作流（未修改的节点与模板共享）"""
+        # 1. 参数校验（预编译的校验器，按 node_id + input_field 对齐）
+        with stage("validate", service=self.service_name):
+            values = self.validator.validate(user_inputs)
+
+        # 2. 按预编译的注入位置注入（None 时使用工作流默认值）
+        return await self.inject_values(values)
+
+    async def inject_values(self, values: List[Any]) -> PreparedWorkflow:
+        """将校验后的参数值（按 input_mappings 顺序）注入模板"""
+        with stage("inject", service=self.service_name):
+            return self.template.render([await self.resolve_input_asset(value) for value in values])
+
+    @staticmethod
+    async def resolve_input_asset(value: Any) -> Any:
+        """Base64 图片保存到输入文件仓库并替换为 asset:// 引用；校验引用的文件存在
+
+        解码、计算哈希与写盘在线程中进行，大图片不阻塞事件循环
+        """
+        store = get_asset_store()
+        if is_data_uri(value):
+            try:
+                return (await asyncio.to_thread(store.put_data_uri, value)).ref
+            except ValueError as e:
+                raise HTTPException(400, str(e))
+        asset_id = parse_asset_ref(value)
+        if asset_id is not None and await asyncio.to_thread(store.get, asset_id) is None:
+            raise HTTPException(400, f"输入文件不存在: {value}")
+        return value
+
+    def make_ticket(self, priority: Optional[str], api_key: Optional[str], default: str) -> SchedulingTicket:
+        """生成准入队列的调度信息：按服务 + API key 公平排队，服务权重取 config.json 的 "weight"（默认 1）
+
+        config.json 的 "deadline"（秒）覆盖 COMFY_JOB_DEADLINE，"hedge": false 关闭该服务的对冲提交
+        """
         try:
-            # 1. 参数校验
-            validated_inputs = validate_inputs(
-                user_inputs,
-                self.config.get("input_mappings", [])
+            deadline = self.config.get("deadline")
+            return make_ticket(
+                self.service_name,
+                priority or default,
+                api_key,
+                float(self.config.get("weight", 1.0)),
+                float(deadline) if deadline is not None else None,
+                bool(self.config.get("hedge", True))
+            )
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+    def get_rendition(self, name: Optional[str]) -> Optional[RenditionSpec]:
+        """按名称取派生版本（为空或 original 时返回 None，即原图）"""
+        if not name or name == "original":
+            return None
+        spec = self.renditions.get(name)
+        if spec is None:
+            raise HTTPException(400, f"未知的派生版本: {name}（可选 original, {', '.join(self.renditions)}）")
+        if not PILLOW_AVAILABLE:
+            raise HTTPException(501, "网关未安装 Pillow，无法生成派生图片")
+        return spec
+
+    async def render_images(self, images: List[DownloadedImage], spec: RenditionSpec) -> List[DownloadedImage]:
+        """在进程池中生成派生图片（结果缓存在原图旁边）"""
+        with stage("render", service=self.service_name, rendition=spec.name, images=len(images)):
+            return await get_renderer().render_all(images, spec)
+
+    @staticmethod
+    def _image_result(image: DownloadedImage, inline: bool = False) -> Dict:
+        result = {
+            "filename": image.filename,
+            "node_id": image.node_id,
+            "url": image.url,
+            "size": image.size,
+            "content_type": image.content_type,
+            "elapsed_ms": image.elapsed_ms,
+            "attempts": image.attempts
+        }
+        if image.rendition:
+            result["rendition"] = image.rendition
+        if inline:
+            result["data"] = image.data
+        if image.error:
+            result["error"] = image.error
+        return result
+
+    def cache_key(self, workflow: PreparedWorkflow) -> Optional[str]:
+        """返回结果缓存键；缓存关闭、服务配置 "cache": false 或存在随机种子节点时返回 None"""
+        if self.result_cache is None or not self.config.get("cache", True):
+            return None
+        if workflow.unpinned_seeds():
+            return None
+        return workflow_cache_key(workflow.canonical_json(), self.server_pool.identity)
+
+    async def _execute(
+        self,
+        workflow: PreparedWorkflow,
+        on_status: Optional[Callable[[WorkflowStatus], None]] = None,
+        ticket: Optional[SchedulingTicket] = None
+    ) -> Dict:
+        """派发到负载最低的后端，等待完成后并发下载结果"""
+        # 4. 派发并等待完成
+        backend, status = await self.server_pool.execute(workflow, on_status, ticket)
+        if on_status:
+            on_status(status)
+        
+        # 5. 并发下载结果（分块写入输出目录）
+        with stage("download", service=self.service_name, backend=backend.name, images=len(status.images_meta)) as span:
+            images = await backend.executor.download_images(
+                status.images_meta,
+                str(get_output_subdir(self.service_name, status.prompt_id))
             )
-            
-            # 2. 深拷贝工作流
-            modified_workflow = json.loads(json.dumps(self.workflow))
-            
-            # 3. 批量参数注入
-            for i, mapping in enumerate(self.config.get("input_mappings", [])):
-                node_id = mapping["node_id"]
-                field = mapping["input_field"]
-                input = validated_inputs[i]
-                
-                # 获取值（用户输入优先）
-                value = input.get(field)
-                
-                if value is None:
-                    # 使用工作流默认值
-                    node = modified_workflow.get(node_id)
-                    default_value = node.get("inputs", {}).get(field) if node else None
-                    if default_value is None and mapping.get("required"):
-                        raise HTTPException(400, f"节点{node_id}缺失必填参数{field}")
-                else:
-                    # 应用用户输入值
-                    node = modified_workflow.get(node_id)
-                    if node and "inputs" in node:
-                        node["inputs"][field] = value
-
-            # 4. 执行工作流
-            modified_workflow = {"prompt": modified_workflow}
-            prompt_id = self.comfy_executor.submit_workflow(modified_workflow)
-            
-            # 5. 轮询状态
-            status = self.comfy_executor.get_workflow_status(prompt_id)
-            while not status.completed:
-                time.sleep(2)
-                status = self.comfy_executor.get_workflow_status(prompt_id)
-            
-            # 6. 下载结果
-            images = self.comfy_executor.download_images(status.images_meta)
-            
-            return {
-                "status": "completed",
-                "images": [
-                    img_data for img_data in images.values() 
-                    if img_data is not None
-                ]
-            }
+        download_seconds = span.duration_ms / 1000
+        self._count_download_errors(images, backend.name)
+        await index_outputs(status.prompt_id, self.service_name, backend.name, images)
+        journal_finish(status.prompt_id, PromptState.COMPLETED, self._download_error(images))
+        return {
+            "prompt_id": status.prompt_id,
+            "backend": backend.name,
+            "images": images,
+            "download_ms": round(download_seconds * 1000, 1)
+        }
+
+    def _count_download_errors(self, images: List[DownloadedImage], backend: str):
+        for image in images:
+            if image.error:
+                ERRORS.inc(service=self.service_name, backend=backend, stage="download", type="image")
+
+    @staticmethod
+    def _download_error(images: List[DownloadedImage]) -> Optional[str]:
+        failed = sum(1 for image in images if image.error)
+        return f"{failed}/{len(images)} 张图片下载失败" if failed else None
+
+    def _count_cache(self, key: Optional[str], cached: bool):
+        if key is not None:
+            CACHE_REQUESTS.inc(service=self.service_name, result="hit" if cached else "miss")
+
+    def _encode_inline(self, images: List[DownloadedImage], backend: str) -> List[Optional[str]]:
+        with stage("encode", service=self.service_name, backend=backend or "", images=len(images)):
+            return [self._read_inline(image) for image in images]
+
+    @contextmanager
+    def _track_request(self, endpoint: str, status: int = 200):
+        """按接口与最终状态码计数（HTTPException 取其状态码，客户端断开记为 499，其他异常记为 500）"""
+        try:
+            yield
         except HTTPException as e:
-            raise e
-        except Exception as e:
-            raise HTTPException(500, f"执行失败: {str(e)}")
+            status = e.status_code
+            raise
+        except asyncio.CancelledError:
+            status = 499
+            raise
+        except Exception:
+            status = 500
+            raise
+        finally:
+            REQUESTS.inc(service=self.service_name, endpoint=endpoint, status=str(status))
+
+    @staticmethod
+    def _read_inline(image: DownloadedImage) -> Optional[str]:
+        """读取已落盘的图片并编码为 Base64 data URI"""
+        if image.error or not image.path:
+            return None
+        encoded_image = base64.b64encode(Path(image.path).read_bytes()).decode('utf-8')
+        return f"data:{image.content_type};base64,{encoded_image}"
+
+    async def run_workflow(
+        self,
+        workflow: PreparedWorkflow,
+        on_status: Optional[Callable[[WorkflowStatus], None]] = None,
+        inline: bool = False,
+        ticket: Optional[SchedulingTicket] = None,
+        rendition: Optional[str] = None
+    ) -> Dict:
+        """提交已注入的工作流并返回结果；相同工作流优先复用结果缓存
+
+        rendition 指定返回的派生版本（如 thumb、webp），派生图片由原图生成，原图仍保存在输出目录
+        """
+        spec = self.get_rendition(rendition)
+        key = self.cache_key(workflow)
+        # 缓存键写入提交日志：网关重启后恢复的结果直接进入结果缓存
+        with journal_context(service=self.service_name, cache_key=key):
+            if key is None:
+                result = await self._execute(workflow, on_status, ticket)
+            else:
+                result = await self.result_cache.get_or_run(key, lambda: self._execute(workflow, on_status, ticket))
+        
+        self._count_cache(key, result.get("cached", False))
+        if spec is not None:
+            result = {**result, "images": await self.render_images(result["images"], spec)}
+        data = None
+        if inline:
+            data = await asyncio.to_thread(self._encode_inline, result["images"], result["backend"])
+        return self.format_result(result, data)
+
+    @classmethod
+    def format_result(cls, result: Dict, data: Optional[List[Optional[str]]] = None) -> Dict:
+        """执行结果 {"prompt_id", "backend", "images": List[DownloadedImage], ...} 转为接口返回格式
+
+        data 为 inline 模式下与 images 一一对应的 Base64 data URI
+        """
+        images = result["images"]
+        return {
+            "status": "completed",
+            "prompt_id": result["prompt_id"],
+            "backend": result["backend"],
+            "cached": result.get("cached", False),
+            "images": [
+                data[i] if data is not None else image.url
+                for i, image in enumerate(images) if image.error is None
+            ],
+            "outputs": [cls._image_result(image) for image in images],
+            "download_ms": result.get("download_ms", 0)
+        }
+
+    async def stream_workflow(
+        self,
+        workflow: PreparedWorkflow,
+        inline: bool = False,
+        ticket: Optional[SchedulingTicket] = None,
+        rendition: Optional[RenditionSpec] = None
+    ) -> AsyncIterator[Dict]:
+        """执行工作流并逐条产出事件：状态变化、每张图片（下载完成即产出）、结束
+
+        指定 rendition 时推送的是派生图片（每张原图下载后立即生成）
+        """
+        key = self.cache_key(workflow)
+        cached = self.result_cache.lookup(key) if key else None
+        self._count_cache(key, cached is not None)
+        if cached is not None:
+            images = cached["images"]
+            if rendition is not None:
+                images = await self.render_images(images, rendition)
+            if inline:
+                encoded = await asyncio.to_thread(self._encode_inline, images, cached["backend"])
+            for i, image in enumerate(images):
+                if inline:
+                    image.data = encoded[i]
+                yield {"event": "image", **self._image_result(image, inline)}
+            yield {"event": "completed", "prompt_id": cached["prompt_id"], "backend": cached["backend"], "cached": True}
+            return
+
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def execute():
+            try:
+                return await self.server_pool.execute(workflow, events.put_nowait, ticket)
+            finally:
+                events.put_nowait(None)
+
+        with journal_context(service=self.service_name, cache_key=key):
+            execution = asyncio.create_task(execute())
+        try:
+            while (status := await events.get()) is not None:
+                yield {
+                    "event": "status",
+                    "prompt_id": status.prompt_id,
+                    "status": status.status_str,
+                    "progress": status.progress
+                }
+
+            backend, status = await execution
+            images = []
+            # 推流期间会让出控制权，span 不设为当前 span
+            download = start_span(
+                "download",
+                service=self.service_name,
+                backend=backend.name,
+                images=len(status.images_meta)
+            )
+            async for image in backend.executor.iter_images(
+                status.images_meta,
+                str(get_output_subdir(self.service_name, status.prompt_id)),
+                inline=inline and rendition is None
+            ):
+                images.append(image)
+                if rendition is not None:
+                    image = await get_renderer().render(image, rendition)
+                    if inline:
+                        image.data = self._read_inline(image)
+                yield {"event": "image", **self._image_result(image, inline)}
+            STAGE_SECONDS.observe(
+                download.end(),
+                stage="download",
+                service=self.service_name,
+                backend=backend.name
+            )
+            self._count_download_errors(images, backend.name)
+            await index_outputs(status.prompt_id, self.service_name, backend.name, images)
+            journal_finish(status.prompt_id, PromptState.COMPLETED, self._download_error(images))
+            if key:
+                await self.result_cache.put(key, {"prompt_id": status.prompt_id, "backend": backend.name, "images": images})
+            yield {"event": "completed", "prompt_id": status.prompt_id, "backend": backend.name, "cached": False}
+        finally:
+            # 客户端断开时不再等待结果
+            if not execution.done():
+                execution.cancel()
+
+    @staticmethod
+    def _saturated_error(e: Saturated) -> HTTPException:
+        return HTTPException(429, str(e), headers={"Retry-After": str(e.retry_after)})
+
+    @classmethod
+    def _dispatch_error(cls, e: Exception) -> HTTPException:
+        """派发失败对应的状态码：满载 429、没有可用后端（失联或熔断）503、超过任务期限 504"""
+        if isinstance(e, Saturated):
+            return cls._saturated_error(e)
+        if isinstance(e, NoBackendAvailable):
+            return HTTPException(503, str(e), headers={"Retry-After": str(e.retry_after)})
+        return HTTPException(504, str(e))
+
+    def check_admission(self, workflow: PreparedWorkflow):
+        """受理流式/异步请求前检查后端是否满载（命中结果缓存时不受限制）"""
+        key = self.cache_key(workflow)
+        if key and self.result_cache.get(key) is not None:
+            return
+        try:
+            self.server_pool.check_admission()
+        except (Saturated, NoBackendAvailable) as e:
+            raise self._dispatch_error(e)
+
+    async def execute_workflow(
+        self,
+        user_inputs: List[Dict],
+        inline: bool = False,
+        priority: Optional[str] = None,
+        rendition: Optional[str] = None,
+        x_api_key: Optional[str] = Header(None)
+    ) -> Dict:
+        """单次请求完成参数注入+执行（全程异步，不占用线程池）
+
+        默认返回输出目录下的图片地址；inline=true 时返回 Base64（旧版行为）。
+        priority 默认为 interactive，X-API-Key 请求头决定公平排队的份额；
+        rendition 指定返回的派生版本（见 /metadata，如 thumb、webp）
+        """
+        # 参数值可能包含提示词与 Base64 图片，INFO 级别只记录字段名，完整参数仅在 DEBUG 级别输出
+        logger.info("收到执行请求", extra={"service": self.service_name, "fields": _input_fields(user_inputs)})
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("执行请求参数", extra={"service": self.service_name, "inputs": user_inputs})
+        with self._track_request("execute"):
+            ticket = self.make_ticket(priority, x_api_key, "interactive")
+            try:
+                modified_workflow = await self.build_workflow(user_inputs)
+                return await self.run_workflow(modified_workflow, inline=inline, ticket=ticket, rendition=rendition)
+            except HTTPException as e:
+                raise e
+            except (Saturated, NoBackendAvailable, DeadlineExceeded) as e:
+                raise self._dispatch_error(e)
+            except Exception as e:
+                raise HTTPException(500, f"执行失败: {str(e)}")
+
+    async def execute_stream(
+        self,
+        user_inputs: List[Dict],
+        inline: bool = False,
+        priority: Optional[str] = None,
+        rendition: Optional[str] = None,
+        x_api_key: Optional[str] = Header(None)
+    ) -> StreamingResponse:
+        """以 NDJSON 流式返回执行过程，每张图片下载完成后立即推送"""
+        with self._track_request("execute_stream"):
+            ticket = self.make_ticket(priority, x_api_key, "interactive")
+            spec = self.get_rendition(rendition)
+            # 参数错误、后端满载在开始推流前直接返回 400 / 429
+            modified_workflow = await self.build_workflow(user_inputs)
+            self.check_admission(modified_workflow)
+
+        async def ndjson():
+            try:
+                async for event in self.stream_workflow(modified_workflow, inline, ticket, spec):
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+            except Exception as e:
+                yield json.dumps({"event": "error", "detail": f"执行失败: {str(e)}"}, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    async def execute_batch(
+        self,
+        batch: List[List[Dict]],
+        inline: bool = False,
+        concurrency: int = BATCH_CONCURRENCY,
+        priority: Optional[str] = None,
+        rendition: Optional[str] = None,
+        x_api_key: Optional[str] = Header(None)
+    ) -> StreamingResponse:
+        """批量执行多组输入：全部校验通过后以受控并发提交，按完成顺序以 NDJSON 返回每一项结果
+
+        单项失败不影响其他项，每行 {"event": "item", "index": i, "status": "completed" | "failed", ...}，
+        最后一行为 {"event": "completed", "total", "succeeded", "failed"}；priority 默认为 batch
+        """
+        with self._track_request("execute_batch"):
+            ticket = self.make_ticket(priority, x_api_key, "batch")
+            self.get_rendition(rendition)
+            if not batch:
+                raise HTTPException(400, "批量输入不能为空")
+            if len(batch) > BATCH_MAX_ITEMS:
+                raise HTTPException(400, f"单次批量最多 {BATCH_MAX_ITEMS} 组输入")
+
+            # 参数错误在提交任何工作流之前一次性返回
+            with stage("validate", service=self.service_name):
+                batch_values, errors = self.validator.validate_many(batch)
+            workflows = []
+            for index, values in enumerate(batch_values):
+                if values is None:
+                    continue
+                try:
+                    workflows.append(await self.inject_values(values))
+                except HTTPException as e:
+                    errors.append({"index": index, "detail": e.detail})
+                except Exception as e:
+                    errors.append({"index": index, "detail": f"参数错误: {str(e)}"})
+            if errors:
+                raise HTTPException(400, sorted(errors, key=lambda error: error["index"]))
+
+        semaphore = asyncio.Semaphore(max(1, min(concurrency, BATCH_MAX_ITEMS)))
+
+        async def run_item(index: int, workflow: PreparedWorkflow) -> Dict:
+            async with semaphore:
+                try:
+                    return {"event": "item", "index": index, **await self.run_workflow(
+                        workflow, inline=inline, ticket=ticket, rendition=rendition
+                    )}
+                except Exception as e:
+                    item = {"event": "item", "index": index, "status": "failed", "detail": f"执行失败: {str(e)}"}
+                    if isinstance(e, (Saturated, NoBackendAvailable)):
+                        item["retry_after"] = e.retry_after
+                    return item
+
+        async def ndjson():
+            tasks = [asyncio.create_task(run_item(i, workflow)) for i, workflow in enumerate(workflows)]
+            failed = 0
+            try:
+                for next_item in asyncio.as_completed(tasks):
+                    item = await next_item
+                    failed += item["status"] == "failed"
+                    yield json.dumps(item, ensure_ascii=False) + "\n"
+                yield json.dumps({
+                    "event": "completed",
+                    "total": len(tasks),
+                    "succeeded": len(tasks) - failed,
+                    "failed": failed
+                }) + "\n"
+            finally:
+                # 客户端断开时取消尚未完成的项
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    async def submit_job(
+        self,
+        user_inputs: List[Dict],
+        priority: Optional[str] = None,
+        rendition: Optional[str] = None,
+        x_api_key: Optional[str] = Header(None)
+    ) -> Dict:
+        """提交后台任务并立即返回 job_id，通过 GET /jobs/{job_id} 查询结果（priority 默认为 batch）"""
+        with self._track_request("jobs", status=202):
+            ticket = self.make_ticket(priority, x_api_key, "batch")
+            self.get_rendition(rendition)
+            job = await get_job_manager().submit(self, user_inputs, ticket, rendition)
+            return job.to_dict()
@@ -0,0 +1,138 @@
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from common.comfy_adapter.result_cache import find_unpinned_seeds
+from common.comfy_adapter.assets import parse_asset_ref
+
+SEPARATORS = (",", ":")
+
+
+def _dumps(value: Any, sort_keys: bool = False) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=SEPARATORS, sort_keys=sort_keys)
+
+
+class InjectionSlot:
+    """input_mappings 中的一个注入位置（加载时预先解析）"""
+
+    __slots__ = ("node_id", "field", "required", "injectable", "default_value")
+
+    def __init__(self, mapping: Dict, workflow: Dict):
+        self.node_id = mapping["node_id"]
+        self.field = mapping["input_field"]
+        self.required = mapping.get("required", False)
+        node = workflow.get(self.node_id)
+        # 节点不存在或没有 inputs 时忽略用户输入（与原注入逻辑一致）
+        self.injectable = bool(node) and "inputs" in node
+        self.default_value = node.get("inputs", {}).get(self.field) if node else None
+
+
+class WorkflowTemplate:
+    """预编译的工作流模板
+
+    加载时解析注入位置，并预先序列化每个节点；每次请求只复制被注入的节点，
+    其余节点与模板共享，提交时直接拼接出 /prompt 请求体。模板本身只读。
+    """
+
+    def __init__(self, workflow: Dict, input_mappings: List[Dict]):
+        self.workflow = workflow
+        self.slots = [InjectionSlot(m, workflow) for m in input_mappings]
+
+        # 提交用的节点片段（保持原顺序）
+        self._node_ids = list(workflow.keys())
+        self._index = {node_id: i for i, node_id in enumerate(self._node_ids)}
+        self._parts = [f"{_dumps(node_id)}:{_dumps(workflow[node_id])}" for node_id in self._node_ids]
+
+        # 计算缓存键用的规范化片段（键排序，与 canonical_json 输出一致）
+        self._sorted_ids = sorted(self._node_ids)
+        self._sorted_index = {node_id: i for i, node_id in enumerate(self._sorted_ids)}
+        self._canonical_parts = [
+            f"{_dumps(node_id)}:{_dumps(workflow[node_id], sort_keys=True)}" for node_id in self._sorted_ids
+        ]
+
+        self.unpinned_seeds = set(find_unpinned_seeds(workflow))
+
+    def render(self, values: List[Any]) -> "PreparedWorkflow":
+        """按 input_mappings 顺序注入参数值（None 表示使用工作流默认值）"""
+        prompt = dict(self.workflow)
+        modified: Set[str] = set()
+        asset_refs: Dict[Tuple[str, str], str] = {}
+        for slot, value in zip(self.slots, values):
+            if value is None:
+                if slot.default_value is None and slot.required:
+                    raise HTTPException(400, f"节点{slot.node_id}缺失必填参数{slot.field}")
+                continue
+            if not slot.injectable:
+                continue
+            if slot.node_id not in modified:
+                node = self.workflow[slot.node_id]
+                prompt[slot.node_id] = {**node, "inputs": dict(node["inputs"])}
+                modified.add(slot.node_id)
+            prompt[slot.node_id]["inputs"][slot.field] = value
+            asset_id = parse_asset_ref(value)
+            if asset_id:
+                asset_refs[(slot.node_id, slot.field)] = asset_id
+        return PreparedWorkflow(self, prompt, modified, asset_refs)
+
+
+class PreparedWorkflow:
+    """一次请求注入后的工作流：prompt 与模板共享未修改的节点
+
+    asset_refs 记录值为 asset:// 引用的输入，派发到具体服务器后由 with_inputs 替换为该服务器上的文件名；
+    缓存键基于引用（即文件内容哈希）计算，与文件传到哪台服务器无关。
+    """
+
+    __slots__ = ("template", "prompt", "modified", "asset_refs")
+
+    def __init__(
+        self,
+        template: WorkflowTemplate,
+        prompt: Dict,
+        modified: Set[str],
+        asset_refs: Optional[Dict[Tuple[str, str], str]] = None
+    ):
+        self.template = template
+        self.prompt = prompt
+        self.modified = modified
+        self.asset_refs = asset_refs or {}
+
+    def with_inputs(self, values: Dict[Tuple[str, str], Any]) -> "PreparedWorkflow":
+        """返回替换了部分输入的新工作流：{(node_id, input_field): value}"""
+        prompt = dict(self.prompt)
+        copied: Set[str] = set()
+        for (node_id, field), value in values.items():
+            if node_id not in copied:
+                node = prompt[node_id]
+                prompt[node_id] = {**node, "inputs": dict(node["inputs"])}
+                copied.add(node_id)
+            prompt[node_id]["inputs"][field] = value
+        asset_refs = {slot: asset_id for slot, asset_id in self.asset_refs.items() if slot not in values}
+        return PreparedWorkflow(self.template, prompt, self.modified | copied, asset_refs)
+
+    def to_payload(self, extra: Optional[Dict] = None) -> bytes:
+        """拼接 /prompt 请求体：{"prompt": {...}, **extra}"""
+        parts = self.template._parts
+        if self.modified:
+            parts = list(parts)
+            for node_id in self.modified:
+                parts[self.template._index[node_id]] = f"{_dumps(node_id)}:{_dumps(self.prompt[node_id])}"
+        body = '{"prompt":{' + ",".join(parts) + "}"
+        for key, value in (extra or {}).items():
+            body += f",{_dumps(key)}:{_dumps(value)}"
+        return (body + "}").encode("utf-8")
+
+    def canonical_json(self) -> str:
+        """与 canonical_json(self.prompt) 等价，但只序列化被修改的节点"""
+        parts = self.template._canonical_parts
+        if self.modified:
+            parts = list(parts)
+            for node_id in self.modified:
+                parts[self.template._sorted_index[node_id]] = \
+                    f"{_dumps(node_id)}:{_dumps(self.prompt[node_id], sort_keys=True)}"
+        return "{" + ",".join(parts) + "}"
+
+    def unpinned_seeds(self) -> List[str]:
+        """运行时随机生成种子的节点（模板结果 + 被修改节点的重新检查）"""
+        unpinned = self.template.unpinned_seeds - self.modified
+        if self.modified:
+            unpinned |= set(find_unpinned_seeds({node_id: self.prompt[node_id] for node_id in self.modified}))
+        return sorted(unpinned)
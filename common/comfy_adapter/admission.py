@@ -0,0 +1,117 @@
+import math
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from .types import SchedulingTicket
+from .scheduler import FairQueue
+
+
+class Saturated(Exception):
+    """后端已满载（排队已满或排队超时），调用方应返回 429 并带上 Retry-After"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """单个 ComfyUI 服务器的准入控制（所有服务共享）
+
+    同时提交到 ComfyUI 的 prompt 数不超过 max_in_flight，超出的请求在网关内排队
+    （按优先级与服务/API key 的加权公平份额出队，见 FairQueue）；
+    排队数超过 max_queued 时立即拒绝，排队超过 queue_timeout 秒后放弃。
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queued: int, queue_timeout: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_duration = 0.0  # 单个 prompt 占用时长的指数移动平均（秒），用于估算 Retry-After
+        self._waiters = FairQueue()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def saturated(self) -> bool:
+        return self.active >= self.max_in_flight and self.queued >= self.max_queued
+
+    def retry_after(self) -> int:
+        """按平均占用时长估算排到当前队尾所需的秒数"""
+        if not self.avg_duration:
+            return 1
+        return max(1, math.ceil(self.avg_duration * (self.queued + 1) / self.max_in_flight))
+
+    async def acquire(self, ticket: Optional[SchedulingTicket] = None, timeout: Optional[float] = None):
+        """获取执行名额；timeout 为调用方剩余的时间（与 queue_timeout 取较小值）"""
+        if self.active < self.max_in_flight and not self._waiters:
+            self.active += 1
+            return
+        if self.queued >= self.max_queued:
+            self.rejected += 1
+            raise Saturated(f"后端 {self.name} 排队已满 ({self.max_queued})", self.retry_after())
+
+        # 名额由 release() 直接移交给下一个出队的等待者，active 计数不变
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.push(future, ticket or SchedulingTicket())
+        queue_timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        try:
+            await asyncio.wait_for(future, queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Saturated(f"后端 {self.name} 排队超过 {queue_timeout:g} 秒", self.retry_after())
+        except asyncio.CancelledError:
+            # 取消与移交同时发生时归还名额
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            self._waiters.discard(future)
+
+    def release(self):
+        # 热加载调低 max_in_flight 后，超出新限额的名额不再移交
+        if self.active <= self.max_in_flight:
+            while self._waiters:
+                future = self._waiters.pop()
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.active -= 1
+
+    def configure(self, max_in_flight: int, max_queued: int, queue_timeout: float):
+        """更新限额（配置热加载）：调高时立即放行排队中的请求，调低时随执行中的 prompt 结束逐步收紧"""
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        while self.active < self.max_in_flight and self._waiters:
+            self.active += 1
+            self.release()
+
+    @asynccontextmanager
+    async def slot(self, ticket: Optional[SchedulingTicket] = None, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        await self.acquire(ticket, timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started
+            self.avg_duration = duration if not self.avg_duration else 0.8 * self.avg_duration + 0.2 * duration
+            self.release()
+
+    def stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "queued_by_flow": self._waiters.stats(),
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "retry_after": self.retry_after()
+        }
@@ -0,0 +1,200 @@
+import os
+import re
+import base64
+import shutil
+import asyncio
+import hashlib
+import mimetypes
+from pathlib import Path
+from dotenv import load_dotenv
+from typing import Any, Dict, Optional
+from common.utils.file_handler import get_temp_path
+from .types import ComfyConfig, InputAsset
+load_dotenv()
+
+ASSET_SCHEME = "asset://"
+# 允许作为输入的文件类型
+CONTENT_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp"
+}
+_ASSET_ID = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URI = re.compile(r"^data:(image/[\w.+-]+);base64,(.*)$", re.DOTALL)
+
+
+def parse_asset_ref(value: Any) -> Optional[str]:
+    """"asset://<sha256>" 形式的输入返回 asset_id，否则返回 None"""
+    if isinstance(value, str) and value.startswith(ASSET_SCHEME):
+        return value[len(ASSET_SCHEME):]
+    return None
+
+
+def is_data_uri(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith("data:image/")
+
+
+class AssetStore:
+    """网关本地的输入文件仓库：按内容 sha256 寻址，相同内容只保存一份
+
+    文件存放在 <asset_dir>/<id[:2]>/<id><ext>。
+    """
+
+    def __init__(self, asset_dir: str, max_bytes: int = 50 * 1024 ** 2):
+        self.asset_dir = Path(asset_dir)
+        self.max_bytes = max_bytes  # 单个文件的大小上限
+        self._assets: Dict[str, InputAsset] = {}
+
+    def put(self, data: bytes, content_type: Optional[str] = None, filename: Optional[str] = None) -> InputAsset:
+        """保存文件并返回 InputAsset；类型不支持或超过大小上限时抛出 ValueError"""
+        if not data:
+            raise ValueError("文件内容为空")
+        if len(data) > self.max_bytes:
+            raise ValueError(f"文件超过大小上限 {self.max_bytes} 字节")
+        ext = Path(filename).suffix.lower() if filename else None
+        if not ext and content_type:
+            ext = mimetypes.guess_extension(content_type.split(";")[0].strip())
+        if ext not in CONTENT_TYPES:
+            raise ValueError(f"不支持的文件类型: {ext or content_type}（可选 {', '.join(CONTENT_TYPES)}）")
+
+        asset_id = hashlib.sha256(data).hexdigest()
+        if asset_id in self._assets:
+            return self._assets[asset_id]
+        path = self.asset_dir / asset_id[:2] / f"{asset_id}{ext}"
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = get_temp_path(path)
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+        asset = InputAsset(asset_id=asset_id, path=str(path), size=len(data), content_type=CONTENT_TYPES[ext])
+        self._assets[asset_id] = asset
+        return asset
+
+    def put_data_uri(self, uri: str) -> InputAsset:
+        """保存 Base64 data URI（data:image/png;base64,...）"""
+        match = _DATA_URI.match(uri)
+        if not match:
+            raise ValueError("无效的 Base64 图片格式")
+        try:
+            data = base64.b64decode(match.group(2), validate=True)
+        except ValueError:
+            raise ValueError("无效的 Base64 数据")
+        return self.put(data, content_type=match.group(1))
+
+    def get(self, asset_id: str) -> Optional[InputAsset]:
+        if asset_id in self._assets:
+            return self._assets[asset_id]
+        if not _ASSET_ID.match(asset_id):
+            return None
+        for path in (self.asset_dir / asset_id[:2]).glob(f"{asset_id}.*"):
+            if path.suffix in CONTENT_TYPES:
+                asset = InputAsset(
+                    asset_id=asset_id,
+                    path=str(path),
+                    size=path.stat().st_size,
+                    content_type=CONTENT_TYPES[path.suffix]
+                )
+                self._assets[asset_id] = asset
+                return asset
+        return None
+
+
+class BackendAssets:
+    """单台 ComfyUI 服务器上已有的输入文件（按内容哈希记忆，重复输入跳过传输）
+
+    文件以 <sha256><ext> 命名写入 ComfyUI 输入目录，同一文件的并发请求只传输一次。
+    """
+
+    def __init__(self, config: ComfyConfig, executor):
+        self.name = config.name
+        self.mode = config.upload_mode
+        self.upload_dir = config.upload_dir
+        self.executor = executor
+        self.transferred = 0
+        self.transferred_bytes = 0
+        self.skipped = 0
+        self._present: Dict[str, str] = {}  # asset_id -> ComfyUI 中的文件名
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def ensure(self, asset: InputAsset) -> str:
+        """确保文件已在该服务器上，返回 LoadImage 节点可用的文件名
+
+        传输在独立任务中进行，发起传输的请求断开不影响等待同一文件的其他请求
+        """
+        if asset.asset_id in self._present:
+            self.skipped += 1
+            return self._present[asset.asset_id]
+        if asset.asset_id in self._inflight:
+            self.skipped += 1
+        else:
+            task = asyncio.create_task(self._transfer(asset))
+            self._inflight[asset.asset_id] = task
+            task.add_done_callback(lambda _: self._done(asset.asset_id, task))
+        return await asyncio.shield(self._inflight[asset.asset_id])
+
+    def forget(self):
+        """忘记已传输的文件（ComfyUI 重启或输入目录变化后文件可能已不存在），之后按需重新传输"""
+        self._present.clear()
+
+    def _done(self, asset_id: str, task: asyncio.Task):
+        self._inflight.pop(asset_id, None)
+        if not task.cancelled():
+            # 所有等待者都已断开时，避免出现 "exception was never retrieved" 警告
+            task.exception()
+
+    async def _transfer(self, asset: InputAsset) -> str:
+        name = Path(asset.path).name
+        if self.mode == "copy":
+            await asyncio.to_thread(self._copy, asset, name)
+        else:
+            name = await self.executor.upload_image(asset.path, name, asset.content_type)
+        self._present[asset.asset_id] = name
+        self.transferred += 1
+        self.transferred_bytes += asset.size
+        return name
+
+    def _copy(self, asset: InputAsset, name: str):
+        target = Path(self.upload_dir) / name
+        if target.exists():
+            return
+        temp_path = get_temp_path(target)
+        shutil.copyfile(asset.path, temp_path)
+        os.replace(temp_path, target)
+
+    async def resolve(self, workflow):
+        """将工作流中的 asset:// 引用替换为该服务器上的文件名（无引用时原样返回）"""
+        refs = getattr(workflow, "asset_refs", None)
+        if not refs:
+            return workflow
+        store = get_asset_store()
+        asset_ids = sorted(set(refs.values()))
+        assets = [store.get(asset_id) for asset_id in asset_ids]
+        missing = [asset_id for asset_id, asset in zip(asset_ids, assets) if asset is None]
+        if missing:
+            raise ValueError(f"输入文件不存在: {', '.join(missing)}")
+        names = dict(zip(asset_ids, await asyncio.gather(*(self.ensure(asset) for asset in assets))))
+        return workflow.with_inputs({slot: names[asset_id] for slot, asset_id in refs.items()})
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "present": len(self._present),
+            "transferred": self.transferred,
+            "transferred_bytes": self.transferred_bytes,
+            "skipped": self.skipped
+        }
+
+
+_asset_store: Optional[AssetStore] = None
+
+
+def get_asset_store() -> AssetStore:
+    """进程内共享的输入文件仓库（ASSET_DIR，默认 INPUT_DIR/assets）"""
+    global _asset_store
+    if _asset_store is None:
+        asset_dir = os.getenv("ASSET_DIR") or str(Path(os.getenv("INPUT_DIR", "./inputs")) / "assets")
+        _asset_store = AssetStore(asset_dir, max_bytes=int(os.getenv("ASSET_MAX_BYTES", 50 * 1024 ** 2)))
+    return _asset_store
@@ -0,0 +1,396 @@
+import os
+import logging
+import json
+import time
+import asyncio
+import base64
+import aiohttp
+from dotenv import load_dotenv
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+from pathlib import Path
+from common.utils.file_handler import get_output_url, get_temp_path
+from common.utils.tracing import span
+from .types import ComfyConfig, WorkflowStatus, ComfyImageMeta, DownloadedImage
+from .executor import CHUNK_SIZE, execution_failure, parse_workflow_status
+from .ws_listener import ComfyEventListener
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (502, 503, 504)  # 幂等 GET 遇到这些状态码时重试
+
+
+class SubmitError(aiohttp.ClientError):
+    """ComfyUI 拒绝提交（非 200 响应），status 为 HTTP 状态码"""
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"HTTP {status}: {text}")
+        self.status = status
+
+
+class AsyncComfyExecutor:
+    """基于 aiohttp 连接池的异步执行器，单个事件循环即可同时等待大量生成任务
+
+    完成状态优先通过共享的 /ws 事件获取；连接不可用时回落到指数退避轮询 /history。
+    """
+
+    def __init__(
+        self,
+        config: ComfyConfig,
+        keepalive_timeout: float = 60,
+        min_poll_interval: float = 0.1,
+        poll_interval: float = 2.0,
+        event_timeout: float = 30.0,
+        use_websocket: bool = True
+    ):
+        self.config = config
+        self.base_url = f"http://{config.host}:{config.port}"
+        self.upload_dir = config.upload_dir
+        self.pool_size = config.pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.min_poll_interval = min_poll_interval
+        self.poll_interval = poll_interval  # 轮询退避上限
+        self.event_timeout = event_timeout  # 等待事件的兜底超时，超时后查询一次 /history
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats = {"requests": 0, "connections_created": 0, "connections_reused": 0}
+        self.events = ComfyEventListener(
+            config.host, config.port, self.get_session
+        ) if use_websocket else None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """延迟创建连接池（ClientSession 必须在运行中的事件循环内创建）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                trace_configs=[self._create_trace_config()]
+            )
+        return self._session
+
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        """统计请求数与新建/复用连接数"""
+        def counter(key: str):
+            async def on_event(session, context, params):
+                self._stats[key] += 1
+            return on_event
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(counter("requests"))
+        trace_config.on_connection_create_end.append(counter("connections_created"))
+        trace_config.on_connection_reuseconn.append(counter("connections_reused"))
+        return trace_config
+
+    def pool_stats(self) -> Dict:
+        """连接池统计：connections_created 远小于 requests 说明长连接复用生效"""
+        return {
+            "base_url": self.base_url,
+            "pool_size": self.pool_size,
+            **self._stats
+        }
+
+    def _timeout(self, total: float) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=total, connect=self.config.connect_timeout)
+
+    async def _get_json(self, url: str, timeout: aiohttp.ClientTimeout) -> Any:
+        """幂等 GET：连接错误、超时及 502/503/504 时指数退避重试，最多重试 max_retries 次"""
+        session = await self.get_session()
+        for attempt in range(self.config.max_retries + 1):
+            try:
+                async with session.get(url, timeout=timeout) as response:
+                    response.raise_for_status()
+                    return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRY_STATUSES
+                if not retryable or attempt >= self.config.max_retries:
+                    raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def close(self):
+        """关闭事件监听与连接池"""
+        if self.events is not None:
+            await self.events.stop()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def submit_workflow(self, workflow: Any) -> str:
+        """提交工作流并返回 prompt_id
+
+        workflow 为 /prompt 请求体字典，或预编译模板渲染出的 PreparedWorkflow（直接拼接请求体）
+        """
+        try:
+            session = await self.get_session()
+            extra = {}
+            if self.events is not None:
+                # 带上监听器的 client_id，执行事件才会推送到共享连接
+                self.events.start()
+                extra["client_id"] = self.events.client_id
+            if isinstance(workflow, dict):
+                body = json.dumps({**extra, **workflow}, ensure_ascii=False).encode("utf-8")
+            else:
+                body = workflow.to_payload(extra)
+            async with session.post(
+                f"{self.base_url}/prompt",
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=self._timeout(self.config.submit_timeout)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    if "prompt_id" in data:
+                        return data["prompt_id"]
+                    raise ValueError("Invalid response format")
+
+                # 处理非200响应
+                raise SubmitError(response.status, await response.text())
+
+        except Exception as e:
+            raise RuntimeError(f"提交失败: {str(e)}") from e
+
+    async def get_workflow_status(self, prompt_id: str) -> WorkflowStatus:
+        """查询工作流状态"""
+        try:
+            data = await self._get_json(
+                f"{self.base_url}/history/{prompt_id}",
+                self._timeout(self.config.status_timeout)
+            )
+            return parse_workflow_status(prompt_id, data.get(prompt_id, {}))
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return WorkflowStatus(
+                prompt_id=prompt_id,
+                completed=False,
+                status_str="error",
+                images_meta=[],
+                error=str(e)
+            )
+
+    async def wait_for_completion(
+        self,
+        prompt_id: str,
+        on_status: Optional[Callable[[WorkflowStatus], None]] = None
+    ) -> WorkflowStatus:
+        """等待工作流结束：优先等待 /ws 结束事件，连接不可用时指数退避轮询
+
+        ComfyUI 报告执行失败时立即返回（completed 为 False，见 execution_failure）；
+        查询 /history 失败时继续等待，总时长由调用方限制
+        """
+        def on_progress(prompt_id: str, progress: float):
+            if on_status:
+                on_status(WorkflowStatus(
+                    prompt_id=prompt_id,
+                    completed=False,
+                    status_str="running",
+                    images_meta=[],
+                    progress=progress
+                ))
+
+        interval = self.min_poll_interval
+        event_seen = False
+        while True:
+            status = await self.get_workflow_status(prompt_id)
+            if status.completed or execution_failure(status) is not None:
+                return status
+            if on_status:
+                on_status(status)
+
+            if not event_seen and self.events is not None and self.events.connected:
+                # 收到结束事件后 /history 可能尚未写入，改为短间隔轮询确认
+                event_seen = await self.events.wait(prompt_id, self.event_timeout, on_progress)
+                interval = self.min_poll_interval
+                continue
+
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, self.poll_interval)
+
+    async def get_queue(self, timeout: float = 5) -> Dict[str, List]:
+        """查询 /queue：queue_running / queue_pending，每项为 [编号, prompt_id, prompt, ...]"""
+        session = await self.get_session()
+        async with session.get(
+            f"{self.base_url}/queue",
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def get_queue_depth(self, timeout: float = 5) -> int:
+        """查询 /queue 中正在执行和排队的 prompt 数量"""
+        data = await self.get_queue(timeout)
+        return len(data.get("queue_running", [])) + len(data.get("queue_pending", []))
+
+    async def get_queued_prompt_ids(self, timeout: float = 5) -> Set[str]:
+        """/queue 中正在执行和排队的 prompt_id"""
+        data = await self.get_queue(timeout)
+        return {item[1] for item in data.get("queue_running", []) + data.get("queue_pending", [])}
+
+    async def cancel_prompt(self, prompt_id: str, timeout: float = 5):
+        """取消 prompt：排队中的从 /queue 删除，正在执行的通过 /interrupt 中断（只中断该 prompt）"""
+        queue = await self.get_queue(timeout)
+        running = {item[1] for item in queue.get("queue_running", [])}
+        session = await self.get_session()
+        if prompt_id in running:
+            url, body = f"{self.base_url}/interrupt", {"prompt_id": prompt_id}
+        else:
+            url, body = f"{self.base_url}/queue", {"delete": [prompt_id]}
+        async with session.post(url, json=body, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+
+    async def upload_image(self, path: Path, name: str, content_type: str) -> str:
+        """通过 /upload/image 上传到 ComfyUI 输入目录，返回 LoadImage 节点可用的文件名"""
+        try:
+            data = await asyncio.to_thread(Path(path).read_bytes)
+            session = await self.get_session()
+            form = aiohttp.FormData()
+            form.add_field("image", data, filename=name, content_type=content_type)
+            form.add_field("type", "input")
+            form.add_field("overwrite", "true")
+            async with session.post(
+                f"{self.base_url}/upload/image",
+                data=form,
+                timeout=self._timeout(self.config.download_timeout)
+            ) as response:
+                if response.status != 200:
+                    text = await response.text()
+                    raise aiohttp.ClientError(f"HTTP {response.status}: {text}")
+                data = await response.json()
+        except Exception as e:
+            raise RuntimeError(f"上传失败: {str(e)}") from e
+
+        subfolder = data.get("subfolder")
+        return f"{subfolder}/{data['name']}" if subfolder else data["name"]
+
+    def _start_downloads(
+        self,
+        images_meta: List[ComfyImageMeta],
+        output_dir: Optional[str],
+        inline: bool
+    ) -> List[asyncio.Task]:
+        """为每张图片创建下载任务，并发数受 download_concurrency 限制
+
+        未指定 output_dir 时使用调用时的 OUTPUT_DIR 环境变量
+        """
+        output_dir = output_dir or os.getenv("OUTPUT_DIR", "./outputs")
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.config.download_concurrency)
+
+        async def download(meta: ComfyImageMeta) -> DownloadedImage:
+            async with semaphore:
+                return await self._download_image(meta, Path(output_dir), inline)
+
+        return [asyncio.create_task(download(meta)) for meta in images_meta]
+
+    async def iter_images(
+        self,
+        images_meta: List[ComfyImageMeta],
+        output_dir: Optional[str] = None,
+        inline: bool = False
+    ) -> AsyncIterator[DownloadedImage]:
+        """并发下载图片，按完成顺序逐张产出"""
+        tasks = self._start_downloads(images_meta, output_dir, inline)
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def download_images(
+        self,
+        images_meta: List[ComfyImageMeta],
+        output_dir: Optional[str] = None,
+        inline: bool = False
+    ) -> List[DownloadedImage]:
+        """并发下载所有图片到输出目录，按 images_meta 顺序返回
+
+        inline=True 时同时返回 Base64 data URI（旧版行为）
+        """
+        return list(await asyncio.gather(*self._start_downloads(images_meta, output_dir, inline)))
+
+    async def _download_image(
+        self,
+        meta: ComfyImageMeta,
+        output_dir: Path,
+        inline: bool
+    ) -> DownloadedImage:
+        """下载单张图片，失败时指数退避重试；客户端错误（4xx）不重试"""
+        result = DownloadedImage(filename=meta.filename, node_id=meta.node_id)
+        started = time.perf_counter()
+        with span("download_image", filename=meta.filename, node_id=meta.node_id) as current:
+            for attempt in range(1, self.config.download_retries + 2):
+                result.attempts = attempt
+                try:
+                    await self._fetch_image(meta, output_dir / meta.filename, inline, result)
+                    result.error = None
+                    break
+                except Exception as e:
+                    result.error = str(e)
+                    client_error = isinstance(e, aiohttp.ClientResponseError) and e.status < 500
+                    if client_error or attempt > self.config.download_retries:
+                        logger.warning("下载失败", extra={"image": meta.filename, "attempts": attempt, "error": str(e)})
+                        break
+                    await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+            current.set_attribute("attempts", result.attempts)
+            current.set_attribute("size", result.size)
+            if result.error:
+                current.set_error(result.error)
+        result.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    async def _fetch_image(
+        self,
+        meta: ComfyImageMeta,
+        filepath: Path,
+        inline: bool,
+        result: DownloadedImage
+    ):
+        """从 /view 分块读取写入临时文件，完成后原子替换；仅 inline 模式在内存中保留完整内容"""
+        session = await self.get_session()
+        params = {
+            "filename": meta.filename,
+            "type": meta.type,
+            "subfolder": meta.subfolder,
+            "format": meta.format
+        }
+        temp_path = get_temp_path(filepath)
+        chunks = [] if inline else None
+        size = 0
+        try:
+            async with session.get(
+                f"{self.base_url}/view",
+                params=params,
+                timeout=self._timeout(self.config.download_timeout)
+            ) as response:
+                response.raise_for_status()
+                result.content_type = response.content_type or result.content_type
+                with open(temp_path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        # 写盘放到线程中执行，避免阻塞事件循环
+                        await asyncio.to_thread(f.write, chunk)
+                        size += len(chunk)
+                        if chunks is not None:
+                            chunks.append(chunk)
+            os.replace(temp_path, filepath)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        result.size = size
+        result.path = str(filepath)
+        result.url = get_output_url(filepath)
+        if chunks is not None:
+            encoded_image = base64.b64encode(b"".join(chunks)).decode('utf-8')
+            result.data = f"data:{result.content_type};base64,{encoded_image}"
+
+
+_executors: Dict[str, AsyncComfyExecutor] = {}
+
+
+def get_async_executor(config: ComfyConfig) -> AsyncComfyExecutor:
+    """同一 ComfyUI 服务器的所有服务共享一个执行器（连接池 + /ws 监听）"""
+    key = f"{config.host}:{config.port}"
+    if key not in _executors:
+        _executors[key] = AsyncComfyExecutor(config)
+    return _executors[key]
@@ -0,0 +1,132 @@
+import os
+import time
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 统计窗口（秒）内至少 MIN_REQUESTS 次结果、失败率达到 ERROR_RATE 时断开；断开 OPEN_SECONDS 秒后放行探测请求
+BREAKER_ERROR_RATE = float(os.getenv("COMFY_BREAKER_ERROR_RATE", 0.5))
+BREAKER_MIN_REQUESTS = int(os.getenv("COMFY_BREAKER_MIN_REQUESTS", 5))
+BREAKER_WINDOW = float(os.getenv("COMFY_BREAKER_WINDOW", 60))
+BREAKER_OPEN_SECONDS = float(os.getenv("COMFY_BREAKER_OPEN_SECONDS", 30))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("COMFY_BREAKER_HALF_OPEN_PROBES", 1))
+
+
+class BreakerState:
+    CLOSED = "closed"  # 正常派发
+    OPEN = "open"  # 失败率过高，不再派发新任务
+    HALF_OPEN = "half_open"  # 冷却结束，只放行少量探测请求
+
+    VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}  # 指标取值
+
+
+class CircuitBreaker:
+    """单个后端的熔断器：按滑动窗口内的失败率在 closed / open / half_open 之间切换
+
+    与健康检查互补：健康检查只发现连不上的后端，熔断器发现能连上但提交失败、执行卡死的后端。
+    结果为 None 的请求（如工作流本身有错、被对冲请求取代）不计入失败率。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        error_rate: float = BREAKER_ERROR_RATE,
+        min_requests: int = BREAKER_MIN_REQUESTS,
+        window: float = BREAKER_WINDOW,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        half_open_probes: int = BREAKER_HALF_OPEN_PROBES
+    ):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.opened = 0  # 累计断开次数
+        self._state = BreakerState.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._results: Deque[Tuple[float, bool]] = deque()
+
+    @property
+    def state(self) -> str:
+        if self._state == BreakerState.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = BreakerState.HALF_OPEN
+            self._probes = 0
+            logger.info("熔断器进入半开状态", extra={"backend": self.name})
+        return self._state
+
+    @property
+    def available(self) -> bool:
+        """是否可以派发新任务"""
+        state = self.state
+        return state == BreakerState.CLOSED or (state == BreakerState.HALF_OPEN and self._probes < self.half_open_probes)
+
+    def retry_after(self) -> int:
+        """断开状态下距离放行探测请求的秒数"""
+        if self.state != BreakerState.OPEN:
+            return 1
+        return max(1, int(self.open_seconds - (time.monotonic() - self._opened_at)) + 1)
+
+    def on_start(self) -> bool:
+        """任务开始派发到该后端；返回是否为半开状态下的探测请求（结束时传给 record）"""
+        if self.state == BreakerState.HALF_OPEN:
+            self._probes += 1
+            return True
+        return False
+
+    def record(self, ok: Optional[bool], probe: bool = False):
+        """记录任务结果：True 成功、False 后端故障、None 不计入"""
+        if probe:
+            self._probes -= 1
+        if ok is None:
+            return
+        now = time.monotonic()
+        state = self.state
+        if state == BreakerState.HALF_OPEN:
+            if ok:
+                self._close()
+            else:
+                self._open(now, "探测请求失败")
+            return
+        if state == BreakerState.OPEN:
+            return
+        self._results.append((now, ok))
+        while self._results and self._results[0][0] < now - self.window:
+            self._results.popleft()
+        total, failures = self.counts()
+        if total >= self.min_requests and failures / total >= self.error_rate:
+            self._open(now, f"{self.window:g} 秒内 {failures}/{total} 次失败")
+
+    def counts(self) -> Tuple[int, int]:
+        """窗口内的 (结果数, 失败数)"""
+        failures = sum(1 for _, ok in self._results if not ok)
+        return len(self._results), failures
+
+    def _open(self, now: float, reason: str):
+        self._state = BreakerState.OPEN
+        self._opened_at = now
+        self._results.clear()
+        self.opened += 1
+        logger.error("熔断器断开，暂停向后端派发任务", extra={
+            "backend": self.name, "reason": reason, "open_seconds": self.open_seconds
+        })
+
+    def _close(self):
+        self._state = BreakerState.CLOSED
+        self._results.clear()
+        logger.info("熔断器恢复闭合", extra={"backend": self.name})
+
+    def stats(self) -> Dict:
+        total, failures = self.counts()
+        return {
+            "state": self.state,
+            "requests": total,
+            "failures": failures,
+            "opened": self.opened,
+            "retry_after": self.retry_after()
+        }
@@ -1,17 +1,50 @@
-import json
-from pathlib import Path
+from typing import Dict, List
+from common.utils.config_registry import get_config_registry
 from .types import ComfyConfig
 
+SERVERS_FILE = "comfy_servers.json"
+
+
+def _load_servers() -> List[Dict]:
+    # 解析结果由配置缓存共享，文件变化时自动重新加载
+    return get_config_registry().load_json(SERVERS_FILE)["servers"]
+
+
+# comfy_servers.json 中可选的模型标识、连接池/超时字段
+OPTIONAL_FIELDS = (
+    "model_identity", "pool_size", "max_retries", "connect_timeout",
+    "submit_timeout", "status_timeout", "download_timeout",
+    "download_concurrency", "download_retries",
+    "max_in_flight", "max_queued", "queue_timeout", "upload_mode"
+)
+
+
+def _to_config(server: Dict) -> ComfyConfig:
+    return ComfyConfig(
+        host=server["host"],
+        port=server["port"],
+        upload_dir=server["upload_dir"],
+        name=server["name"],
+        group=server.get("group"),
+        **{k: server[k] for k in OPTIONAL_FIELDS if k in server}
+    )
+
 
 def load_comfy_config(server_name: str) -> ComfyConfig:
     """根据服务器名称加载配置"""
-    servers_config = json.loads(Path("comfy_servers.json").read_text())
-    server = next((s for s in servers_config["servers"] if s["name"] == server_name), None)
+    server = next((s for s in _load_servers() if s["name"] == server_name), None)
     if not server:
         raise ValueError(f"未找到服务器配置: {server_name}")
     
-    return ComfyConfig(
-        host=server["host"],
-        port=server["port"],
-        upload_dir=server["upload_dir"]
-    )
\ No newline at end of file
+    return _to_config(server)
+
+
+def load_comfy_group(target: str) -> List[ComfyConfig]:
+    """加载分组内的所有服务器配置；target 不是分组名时按单个服务器名称处理"""
+    servers = _load_servers()
+    members = [s for s in servers if s.get("group") == target]
+    if not members:
+        members = [s for s in servers if s["name"] == target]
+    if not members:
+        raise ValueError(f"未找到服务器分组或服务器配置: {target}")
+    return [_to_config(s) for s in members]
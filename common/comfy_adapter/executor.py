@@ -1,122 +1,68 @@
-import os
-import requests
-import json
-import base64
-from dotenv import load_dotenv
-from typing import Dict, List, Union
-from pathlib import Path
-from .types import ComfyConfig, WorkflowStatus, ComfyImageMeta
-from requests.exceptions import RequestException
-load_dotenv()
+"""解析 ComfyUI /history 返回内容的公共函数（异步执行器与服务器池共用）"""
+from typing import Dict, Optional
+from .types import WorkflowStatus, ComfyImageMeta
 
-class ComfyExecutor:
-    def __init__(self, config: ComfyConfig):
-        self.config = config
-        self.base_url = f"http://{config.host}:{config.port}"
-        self.upload_dir = config.upload_dir
-        
+CHUNK_SIZE = 256 * 1024  # 下载图片时的分块大小
 
-    def submit_workflow(self, workflow: Dict) -> str:
-        """提交工作流并返回 prompt_id"""
-        try:
-            url = f"{self.base_url}/prompt"
-            response = requests.post(
-                url,
-                json=workflow,
-                headers={"Content-Type": "application/json"},
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "prompt_id" in data:
-                    return data["prompt_id"]
-                raise ValueError("Invalid response format")
-            
-            # 处理非200响应
-            error_msg = f"HTTP {response.status_code}: {response.text}"
-            raise RequestException(error_msg)
-            
-        except Exception as e:
-            raise RuntimeError(f"提交失败: {str(e)}")
 
-    def get_workflow_status(self, prompt_id: str) -> WorkflowStatus:
-        """增强版工作流状态查询"""
-        try:
-            url = f"{self.base_url}/history/{prompt_id}"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()  # 触发HTTP错误
-            
-            history_data = response.json().get(prompt_id, {})
-            outputs = history_data.get("outputs", {})
-            status_info = history_data.get("status", {})
-            
-            # 提取图片元数据（支持多节点输出）
-            images_meta = []
-            for node_id, node_data in outputs.items():
-                if "images" not in node_data:
-                    continue
-                for img in node_data["images"]:
-                    images_meta.append(ComfyImageMeta(
-                        filename=img["filename"],
-                        subfolder=img.get("subfolder", ""),
-                        type=img["type"],
-                        node_id=node_id
-                    ))
-            
-            return WorkflowStatus(
-                prompt_id=prompt_id,
-                completed=status_info.get("completed", False),
-                status_str=status_info.get("status_str", "unknown"),
-                images_meta=images_meta,
-                messages=history_data.get("status", {}).get("messages", []),
-                meta=history_data.get("meta", {})
-            )
-            
-        except requests.exceptions.RequestException as e:
-            return WorkflowStatus(
-                prompt_id=prompt_id,
-                completed=False,
-                status_str="error",
-                images_meta=[],
-                error=str(e)
-            )
+def parse_workflow_status(prompt_id: str, history_data: Dict) -> WorkflowStatus:
+    """将 /history/{prompt_id} 的返回内容解析为 WorkflowStatus"""
+    outputs = history_data.get("outputs", {})
+    status_info = history_data.get("status", {})
+    
+    # 提取图片元数据（支持多节点输出）
+    images_meta = []
+    for node_id, node_data in outputs.items():
+        if "images" not in node_data:
+            continue
+        for img in node_data["images"]:
+            images_meta.append(ComfyImageMeta(
+                filename=img["filename"],
+                subfolder=img.get("subfolder", ""),
+                type=img["type"],
+                node_id=node_id
+            ))
+    
+    return WorkflowStatus(
+        prompt_id=prompt_id,
+        completed=status_info.get("completed", False),
+        status_str=status_info.get("status_str", "unknown"),
+        images_meta=images_meta,
+        messages=status_info.get("messages", []),
+        meta=history_data.get("meta", {})
+    )
 
-    def download_images(
-        self, 
-        images_meta: List[ComfyImageMeta],
-        output_dir: str = os.getenv("OUTPUT_DIR", "./outputs")
-    ) -> Dict[str, str]:  # 返回 Base64 字符串
-        """下载并编码图片为 Base64"""
-        results = {}
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
-        
-        for meta in images_meta:
-            try:
-                params = {
-                    "filename": meta.filename,
-                    "type": meta.type,
-                    "subfolder": meta.subfolder,
-                    "format": meta.format
-                }
-                response = requests.get(
-                    f"{self.base_url}/view",
-                    params=params,
-                    timeout=10
-                )
-                response.raise_for_status()
-                
-                # 转换为 Base64
-                encoded_image = base64.b64encode(response.content).decode('utf-8')
-                results[meta.filename] = f"data:image/png;base64,{encoded_image}"
-                
-                # 保存文件（可选）
-                filepath = Path(output_dir) / meta.filename
-                with open(filepath, "wb") as f:
-                    f.write(response.content)
-                
-            except Exception as e:
-                results[meta.filename] = None
-                print(f"下载失败 [{meta.filename}]: {str(e)}")
-        
-        return results
\ No newline at end of file
+
+def execution_failure(status: WorkflowStatus) -> Optional[str]:
+    """ComfyUI 报告执行失败（/history 中 status_str 为 error）时返回失败原因，否则返回 None
+
+    查询 /history 本身失败（status.error 不为空）不算执行失败，调用方应继续等待
+    """
+    if status.completed or status.status_str != "error" or status.error is not None:
+        return None
+    for message in status.messages:
+        if isinstance(message, list) and len(message) == 2 and message[0] in ("execution_error", "execution_interrupted"):
+            detail = message[1]
+            return f"{detail.get('exception_type', message[0])}: {detail.get('exception_message', '')}".strip(": ")
+    return "执行失败"
+
+
+def execution_seconds(status: WorkflowStatus) -> Optional[float]:
+    """ComfyUI 实际执行的时长（秒）：/history 中 execution_start 到结束消息的时间戳之差
+
+    时间戳来自 ComfyUI 所在机器的时钟，只取差值，不受与网关之间时钟偏差的影响；缺少时间戳时返回 None
+    """
+    timestamps = {
+        message[0]: message[1].get("timestamp")
+        for message in status.messages
+        if isinstance(message, list) and len(message) == 2 and isinstance(message[1], dict)
+    }
+    started = timestamps.get("execution_start")
+    finished = next(
+        (timestamps[event] for event in ("execution_success", "execution_error", "execution_interrupted")
+         if timestamps.get(event) is not None),
+        None
+    )
+    if started is None or finished is None:
+        return None
+    return max(0.0, (finished - started) / 1000)
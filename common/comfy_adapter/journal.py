@@ -0,0 +1,187 @@
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import astuple, fields
+from typing import Any, Dict, Iterator, List, Optional
+from dotenv import load_dotenv
+from common.utils.file_handler import get_state_path
+from .types import JournalEntry, PromptState
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 批量提交的间隔（秒）：期间的所有记录在一个事务中写入，每批只 fsync 一次
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("PROMPT_JOURNAL_FLUSH_INTERVAL", 0.05))
+# 已结束记录的保留时长（秒）；超过该时长仍未结束的记录同样清理
+JOURNAL_TTL = float(os.getenv("PROMPT_JOURNAL_TTL", 7 * 24 * 3600))
+PRUNE_EVERY = 1000  # 每写入多少批清理一次
+
+COLUMNS = [f.name for f in fields(JournalEntry)]
+
+_context: ContextVar[Dict[str, Any]] = ContextVar("prompt_journal_context", default={})
+
+
+@contextmanager
+def journal_context(**values) -> Iterator[None]:
+    """为当前上下文中提交的 prompt 附加日志字段（job_id、cache_key 等），可嵌套"""
+    token = _context.set({**_context.get(), **{k: v for k, v in values.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class PromptJournal:
+    """已提交到 ComfyUI 的 prompt 日志（SQLite WAL，只追加与更新状态）
+
+    写入在事件循环中只是入队，由后台线程按 JOURNAL_FLUSH_INTERVAL 分批在一个事务中提交
+    （synchronous=FULL，每批 fsync 一次）；网关重启后据此重新关联仍在执行的 prompt，而不是重新提交。
+    提交成功到日志落盘之间（最多一个批次间隔）进程崩溃时，该 prompt 不会被恢复。
+    """
+
+    def __init__(self, db_path: str, flush_interval: float = JOURNAL_FLUSH_INTERVAL, ttl: float = JOURNAL_TTL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS prompts (
+                prompt_id TEXT PRIMARY KEY,
+                backend TEXT NOT NULL,
+                service TEXT NOT NULL,
+                job_id TEXT,
+                cache_key TEXT,
+                state TEXT NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_prompts_state ON prompts(state, updated_at)")
+        self._conn.commit()
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.batches = 0
+        self.records = 0
+        self._thread = threading.Thread(target=self._run, name="prompt-journal", daemon=True)
+        self._thread.start()
+
+    def submitted(self, prompt_id: str, backend: str, service: str = ""):
+        """记录新提交的 prompt（附带 journal_context 中的字段）"""
+        context = _context.get()
+        entry = JournalEntry(
+            prompt_id=prompt_id,
+            backend=backend,
+            service=service or context.get("service", ""),
+            job_id=context.get("job_id"),
+            cache_key=context.get("cache_key")
+        )
+        self._queue.put(("insert", astuple(entry)))
+
+    def finish(self, prompt_id: str, state: str, error: Optional[str] = None):
+        self._queue.put(("update", (state, error, time.time(), prompt_id)))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while item is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+            try:
+                self._write([op for op in batch if op is not None])
+            except sqlite3.Error:
+                logger.exception("提交日志写入失败", extra={"records": len(batch)})
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def _write(self, batch: List[tuple]):
+        if not batch:
+            return
+        with self._lock:
+            with self._conn:
+                for op, params in batch:
+                    if op == "insert":
+                        self._conn.execute(
+                            f"INSERT OR REPLACE INTO prompts ({', '.join(COLUMNS)}) "
+                            f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                            params
+                        )
+                    else:
+                        self._conn.execute(
+                            "UPDATE prompts SET state = ?, error = ?, updated_at = ? WHERE prompt_id = ?", params
+                        )
+            self.batches += 1
+            self.records += len(batch)
+            if self.batches % PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM prompts WHERE updated_at < ?", (time.time() - self.ttl,))
+
+    def flush(self):
+        """等待已入队的记录全部落盘"""
+        self._queue.join()
+
+    def unfinished(self, before: Optional[float] = None) -> List[JournalEntry]:
+        """尚未取回结果的 prompt（按提交顺序）；before 为本进程启动时间，只返回上次进程提交的 prompt"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM prompts WHERE state = ? AND created_at < ? ORDER BY created_at",
+                (PromptState.SUBMITTED, before or time.time())
+            ).fetchall()
+        return [JournalEntry(*row) for row in rows]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM prompts GROUP BY state").fetchall())
+        return {
+            "path": self.db_path,
+            "states": counts,
+            "pending_writes": self._queue.qsize(),
+            "batches": self.batches,
+            "records": self.records
+        }
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        with self._lock:
+            self._conn.close()
+
+
+_journal: Optional[PromptJournal] = None
+
+
+def get_prompt_journal() -> Optional[PromptJournal]:
+    """进程内共享的提交日志；PROMPT_JOURNAL_ENABLED=0 时返回 None"""
+    global _journal
+    if _journal is None and os.getenv("PROMPT_JOURNAL_ENABLED", "1") == "1":
+        _journal = PromptJournal(os.getenv("PROMPT_JOURNAL_PATH") or str(get_state_path("prompt_journal.db")))
+    return _journal
+
+
+def close_prompt_journal():
+    global _journal
+    if _journal is not None:
+        _journal.close()
+        _journal = None
@@ -0,0 +1,311 @@
+import os
+import time
+import shutil
+import asyncio
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+from typing import Dict, Iterable, List, Optional, Tuple
+from common.utils.file_handler import get_output_dir, get_output_url, get_state_path
+from .types import DownloadedImage
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 输出文件保留时长（秒）与总大小上限（字节），0 表示不限制；两者都为 0 时不启动清理任务
+OUTPUT_RETENTION = float(os.getenv("OUTPUT_RETENTION", 0))
+OUTPUT_MAX_BYTES = int(os.getenv("OUTPUT_MAX_BYTES", 0))
+# 清理间隔（秒）；超过大小上限时清理到上限的该比例以下，避免每轮只删一个 prompt
+OUTPUT_JANITOR_INTERVAL = float(os.getenv("OUTPUT_JANITOR_INTERVAL", 600))
+OUTPUT_LOW_WATERMARK = 0.9
+SWEEP_BATCH = 500
+
+
+class OutputIndex:
+    """输出文件索引（SQLite WAL）：按 prompt_id 查询输出文件、按时间与大小清理，无需扫描输出目录
+
+    路径按相对 OUTPUT_DIR 保存，迁移输出目录后索引仍然有效。
+    """
+
+    def __init__(self, db_path: str, output_dir: Optional[Path] = None):
+        self.db_path = db_path
+        self.output_dir = Path(output_dir or get_output_dir()).resolve()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS outputs (
+                path TEXT PRIMARY KEY,
+                prompt_id TEXT NOT NULL,
+                service TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                node_id TEXT,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                content_type TEXT,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_prompt ON outputs(prompt_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outputs_created ON outputs(created_at)")
+        self._conn.commit()
+
+    def _relative(self, path: str) -> Optional[str]:
+        try:
+            return Path(path).resolve().relative_to(self.output_dir).as_posix()
+        except ValueError:
+            return None
+
+    def add(self, prompt_id: str, service: str, backend: str, images: List[DownloadedImage]):
+        """登记一次执行下载成功的输出文件（不在输出目录下的文件忽略）"""
+        now = time.time()
+        rows = [
+            (relative, prompt_id, service, backend, image.node_id, image.filename, image.size, image.content_type, now)
+            for image in images
+            if not image.error and image.path and (relative := self._relative(image.path)) is not None
+        ]
+        if not rows:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO outputs "
+                    "(path, prompt_id, service, backend, node_id, filename, size, content_type, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+
+    def by_prompt(self, prompt_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, service, backend, node_id, filename, size, content_type, created_at "
+                "FROM outputs WHERE prompt_id = ? ORDER BY rowid",
+                (prompt_id,)
+            ).fetchall()
+        return [
+            {
+                "filename": filename,
+                "node_id": node_id,
+                "url": get_output_url(self.output_dir / path),
+                "size": size,
+                "content_type": content_type,
+                "service": service,
+                "backend": backend,
+                "created_at": created_at
+            }
+            for path, service, backend, node_id, filename, size, content_type, created_at in rows
+        ]
+
+    def locate(self, prompt_id: str, filename: str) -> Optional[Path]:
+        """prompt 的某个输出文件（含同目录下的派生图片）的路径，不存在时返回 None"""
+        if not filename or Path(filename).name != filename or filename.startswith("."):
+            return None
+        paths = self.paths(prompt_id)
+        for path in paths:
+            if path.name == filename:
+                return path
+        # 派生图片不登记在索引中，只在分片布局的 prompt 目录内查找
+        directories = {path.parent for path in paths if path.parent.name == prompt_id}
+        for directory in directories:
+            if (directory / filename).is_file():
+                return directory / filename
+        return None
+
+    def oldest_prompts(self, before: Optional[float] = None, limit: int = SWEEP_BATCH) -> List[Tuple[str, int]]:
+        """最早的 prompt 及其输出总大小 [(prompt_id, bytes)]，before 为空时不限时间"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT prompt_id, SUM(size) FROM outputs GROUP BY prompt_id "
+                "HAVING MIN(created_at) < ? ORDER BY MIN(created_at) LIMIT ?",
+                (before if before is not None else float("inf"), limit)
+            ).fetchall()
+
+    def paths(self, prompt_id: str) -> List[Path]:
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM outputs WHERE prompt_id = ?", (prompt_id,)).fetchall()
+        return [self.output_dir / row[0] for row in rows]
+
+    def remove(self, prompt_ids: Iterable[str]):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("DELETE FROM outputs WHERE prompt_id = ?", [(p,) for p in prompt_ids])
+
+    def totals(self) -> Tuple[int, int, int]:
+        """(prompt 数, 文件数, 总字节数)"""
+        with self._lock:
+            prompts, files, size = self._conn.execute(
+                "SELECT COUNT(DISTINCT prompt_id), COUNT(*), COALESCE(SUM(size), 0) FROM outputs"
+            ).fetchone()
+        return prompts, files, size
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OutputJanitor:
+    """后台清理输出目录：删除超过保留时长的 prompt，总大小超过上限时从最早的 prompt 开始删除
+
+    以 prompt 为单位删除整个输出目录（原图与派生图片一起删除）；大小只统计索引中的原图。
+    结果缓存（_cache）由 ResultCache 自行淘汰，缓存中的硬链接不受影响；未登记到索引的文件
+    （如启用索引之前平铺在输出目录下的文件）不会被删除。
+    """
+
+    def __init__(
+        self,
+        index: OutputIndex,
+        retention: float = OUTPUT_RETENTION,
+        max_bytes: int = OUTPUT_MAX_BYTES,
+        interval: float = OUTPUT_JANITOR_INTERVAL
+    ):
+        self.index = index
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.runs = 0
+        self.deleted_prompts = 0
+        self.deleted_bytes = 0
+        self.last_run: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention > 0 or self.max_bytes > 0
+
+    def start(self):
+        """启动后台清理（需在事件循环内调用，重复调用无副作用）"""
+        if not self.enabled or self.interval <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("清理输出目录失败")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> Dict[str, int]:
+        """执行一轮清理（文件删除在线程中进行），返回删除的 prompt 数与字节数"""
+        return await asyncio.to_thread(self._sweep)
+
+    def _sweep(self) -> Dict[str, int]:
+        prompts = freed = 0
+        if self.retention > 0:
+            while batch := self.index.oldest_prompts(before=time.time() - self.retention):
+                prompts += len(batch)
+                freed += self._delete(batch)
+        if self.max_bytes > 0:
+            total = self.index.totals()[2]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes * OUTPUT_LOW_WATERMARK
+                while excess > 0 and (batch := self.index.oldest_prompts()):
+                    victims = []
+                    for prompt_id, size in batch:
+                        victims.append((prompt_id, size))
+                        excess -= size
+                        if excess <= 0:
+                            break
+                    prompts += len(victims)
+                    freed += self._delete(victims)
+        self.runs += 1
+        self.last_run = time.time()
+        self.deleted_prompts += prompts
+        self.deleted_bytes += freed
+        if prompts:
+            logger.info("已清理过期输出", extra={"prompts": prompts, "bytes": freed})
+        return {"prompts": prompts, "bytes": freed}
+
+    def _delete(self, prompts: List[Tuple[str, int]]) -> int:
+        directories = set()
+        for prompt_id, _ in prompts:
+            for path in self.index.paths(prompt_id):
+                # 分片布局下整个 prompt 目录（含派生图片）一起删除，否则只删除登记的文件
+                if path.parent.name == prompt_id and path.parent != self.index.output_dir:
+                    directories.add(path.parent)
+                else:
+                    path.unlink(missing_ok=True)
+        for directory in directories:
+            shutil.rmtree(directory, ignore_errors=True)
+            self._remove_empty_parents(directory.parent)
+        self.index.remove(prompt_id for prompt_id, _ in prompts)
+        return sum(size for _, size in prompts)
+
+    def _remove_empty_parents(self, directory: Path):
+        """删除变空的分片 / 日期 / 服务目录，不删除输出根目录"""
+        while directory != self.index.output_dir and self.index.output_dir in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:
+                return
+            directory = directory.parent
+
+    def stats(self) -> Dict:
+        prompts, files, size = self.index.totals()
+        return {
+            "index": self.index.db_path,
+            "prompts": prompts,
+            "files": files,
+            "bytes": size,
+            "retention": self.retention,
+            "max_bytes": self.max_bytes,
+            "janitor_enabled": self.enabled,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "deleted_prompts": self.deleted_prompts,
+            "deleted_bytes": self.deleted_bytes
+        }
+
+
+_index: Optional[OutputIndex] = None
+_janitor: Optional[OutputJanitor] = None
+
+
+def get_output_index() -> Optional[OutputIndex]:
+    """进程内共享的输出索引；OUTPUT_INDEX_ENABLED=0 时返回 None
+
+    数据库默认放在 STATE_DIR（OUTPUT_INDEX_PATH 可修改），不放进对外提供静态访问的输出目录
+    """
+    global _index
+    if _index is None and os.getenv("OUTPUT_INDEX_ENABLED", "1") == "1":
+        _index = OutputIndex(os.getenv("OUTPUT_INDEX_PATH") or str(get_state_path("outputs_index.db")))
+    return _index
+
+
+def get_output_janitor() -> Optional[OutputJanitor]:
+    """进程内共享的输出清理任务（依赖输出索引）"""
+    global _janitor
+    if _janitor is None and (index := get_output_index()) is not None:
+        _janitor = OutputJanitor(index)
+    return _janitor
+
+
+async def index_outputs(prompt_id: str, service: str, backend: str, images: List[DownloadedImage]):
+    """登记输出文件（在线程中写入 SQLite，不阻塞事件循环；索引未启用或写入失败时只记录日志，不影响请求）"""
+    index = get_output_index()
+    if index is None:
+        return
+    try:
+        await asyncio.to_thread(index.add, prompt_id, service, backend, images)
+    except sqlite3.Error:
+        logger.exception("输出索引写入失败", extra={"prompt_id": prompt_id})
+
+
+async def close_outputs():
+    global _index, _janitor
+    if _janitor is not None:
+        await _janitor.stop()
+        _janitor = None
+    if _index is not None:
+        _index.close()
+        _index = None
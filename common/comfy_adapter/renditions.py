@@ -0,0 +1,207 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import importlib.util
+import multiprocessing
+from dataclasses import astuple, fields, replace
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from dotenv import load_dotenv
+from typing import Dict, List, Optional
+from common.utils.file_handler import get_output_url, get_temp_path
+from .types import DownloadedImage, RenditionSpec
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 编码派生图片的工作进程数
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", min(4, os.cpu_count() or 1)))
+
+# 内置的派生版本；环境变量 OUTPUT_RENDITIONS（JSON）与服务 config.json 的 "renditions" 可覆盖或新增
+DEFAULT_RENDITIONS = {
+    "webp": {"format": "webp", "quality": 80},
+    "jpeg": {"format": "jpeg", "quality": 85},
+    "preview": {"format": "webp", "quality": 80, "max_size": 1024},
+    "thumb": {"format": "webp", "quality": 75, "max_size": 256}
+}
+
+# format -> (Pillow 格式名, 扩展名, Content-Type)
+FORMATS = {
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "png": ("PNG", ".png", "image/png")
+}
+
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+# 派生版本定义中允许的字段（名称取自 renditions 的键）
+RENDITION_FIELDS = [f.name for f in fields(RenditionSpec) if f.name != "name"]
+
+
+def parse_renditions(config: Dict) -> Dict[str, RenditionSpec]:
+    """合并内置、OUTPUT_RENDITIONS 与服务配置中的派生版本定义；定义不合法时抛出 ValueError"""
+    definitions = {**DEFAULT_RENDITIONS, **json.loads(os.getenv("OUTPUT_RENDITIONS") or "{}"), **config.get("renditions", {})}
+    renditions = {}
+    for name, definition in definitions.items():
+        if not isinstance(definition, dict):
+            raise ValueError(f"派生版本 {name} 的定义需为对象（可选字段 {', '.join(RENDITION_FIELDS)}）")
+        unknown = sorted(set(definition) - set(RENDITION_FIELDS))
+        if unknown:
+            raise ValueError(f"派生版本 {name} 包含未知字段: {', '.join(unknown)}（可选 {', '.join(RENDITION_FIELDS)}）")
+        spec = RenditionSpec(name=name, **definition)
+        if not isinstance(spec.format, str) or spec.format not in FORMATS:
+            raise ValueError(f"派生版本 {name} 的格式不受支持: {spec.format}（可选 {', '.join(FORMATS)}）")
+        if not _is_int(spec.quality) or not 1 <= spec.quality <= 100 or \
+                (spec.max_size is not None and (not _is_int(spec.max_size) or spec.max_size <= 0)):
+            raise ValueError(f"派生版本 {name} 的 quality 需为 1~100 的整数、max_size 需为正整数")
+        renditions[name] = spec
+    return renditions
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def derivative_path(source: Path, spec: RenditionSpec) -> Path:
+    """派生文件与原图放在同一目录，文件名带上参数摘要（修改参数后不会复用旧文件）"""
+    tag = hashlib.sha1(repr(astuple(spec)[1:]).encode("utf-8")).hexdigest()[:8]
+    return source.with_name(f"{source.stem}.{spec.name}-{tag}{FORMATS[spec.format][1]}")
+
+
+def _render_file(source: str, target: str, pil_format: str, quality: int, max_size: Optional[int]) -> int:
+    """在工作进程中执行：解码、缩放并编码为目标格式，原子写入 target，返回文件大小"""
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image.load()
+        if max_size:
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            # JPEG 不支持透明通道，铺在白色背景上
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        temp_path = get_temp_path(Path(target))
+        try:
+            image.save(temp_path, pil_format, quality=quality)
+            os.replace(temp_path, target)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+    return os.path.getsize(target)
+
+
+class RenditionRenderer:
+    """在进程池中生成输出图片的派生版本（格式转换 / 缩略图），不占用事件循环
+
+    派生文件缓存在原图旁边，原图未更新时直接复用；同一文件的并发请求只编码一次。
+    """
+
+    def __init__(self, workers: int = RENDITION_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.rendered = 0
+        self.reused = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # 网关进程中有日志与提交日志的写入线程，使用 forkserver（不支持时 spawn）避免 fork 时继承锁
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._pool
+
+    async def render(self, image: DownloadedImage, spec: RenditionSpec) -> DownloadedImage:
+        """返回派生版本；下载失败的图片原样返回，编码失败时记录日志并返回原图"""
+        if image.error or not image.path:
+            return image
+        source = Path(image.path)
+        target = derivative_path(source, spec)
+        try:
+            if target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+                self.reused += 1
+                size = target.stat().st_size
+            else:
+                size = await self._render_once(source, target, spec)
+        except Exception as e:
+            self.failed += 1
+            logger.warning("生成派生图片失败", extra={"image": image.filename, "rendition": spec.name, "error": str(e)})
+            return image
+        self.bytes_in += image.size
+        self.bytes_out += size
+        return replace(
+            image,
+            filename=target.name,
+            path=str(target),
+            url=get_output_url(target),
+            size=size,
+            content_type=FORMATS[spec.format][2],
+            data=None,
+            rendition=spec.name
+        )
+
+    async def _render_once(self, source: Path, target: Path, spec: RenditionSpec) -> int:
+        key = str(target)
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.get_running_loop().run_in_executor(
+            self._get_pool(),
+            _render_file,
+            str(source),
+            key,
+            FORMATS[spec.format][0],
+            spec.quality,
+            spec.max_size
+        )
+        self._inflight[key] = future
+        try:
+            size = await asyncio.shield(future)
+        except BrokenProcessPool:
+            # 工作进程异常退出，下次请求重建进程池
+            self._pool = None
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.rendered += 1
+        return size
+
+    async def render_all(self, images: List[DownloadedImage], spec: RenditionSpec) -> List[DownloadedImage]:
+        return list(await asyncio.gather(*(self.render(image, spec) for image in images)))
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "rendered": self.rendered,
+            "reused": self.reused,
+            "failed": self.failed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_renderer: Optional[RenditionRenderer] = None
+
+
+def get_renderer() -> RenditionRenderer:
+    """进程内共享的派生图片生成器（进程池在首次使用时创建）"""
+    global _renderer
+    if _renderer is None:
+        _renderer = RenditionRenderer()
+    return _renderer
+
+
+def close_renderer():
+    if _renderer is not None:
+        _renderer.close()
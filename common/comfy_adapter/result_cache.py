@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import asdict
+from pathlib import Path
+from dotenv import load_dotenv
+from typing import Awaitable, Callable, Dict, List, Optional
+from common.utils.file_handler import get_output_url
+from .types import DownloadedImage
+load_dotenv()
+
+# 常见的随机种子输入字段；值为负数（如 -1）表示由节点在运行时随机生成
+SEED_FIELDS = ("seed", "noise_seed", "rand_seed")
+
+
+def canonical_json(prompt: Dict) -> str:
+    """规范化序列化（键排序、无空白），用于计算缓存键"""
+    return json.dumps(prompt, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def workflow_cache_key(canonical: str, backend_identity: str) -> str:
+    """对注入后完整工作流的规范化序列化结果（见 canonical_json）计算 sha256"""
+    digest = hashlib.sha256()
+    digest.update(backend_identity.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def find_unpinned_seeds(prompt: Dict) -> List[str]:
+    """找出运行时随机生成种子的节点，这类工作流的结果不可缓存
+
+    - 种子字段的值为负数（rgthree / Impact 等节点约定 -1 表示随机）
+    - class_type 含 "random" 但没有给出固定种子值的节点
+    """
+    unpinned = []
+    for node_id, node in prompt.items():
+        inputs = node.get("inputs", {})
+        seeds = [inputs[f] for f in SEED_FIELDS if f in inputs]
+        pinned = [s for s in seeds if isinstance(s, int) and s >= 0]
+        if any(isinstance(s, (int, float)) and s < 0 for s in seeds):
+            unpinned.append(node_id)
+        elif "random" in node.get("class_type", "").lower() and not pinned:
+            unpinned.append(node_id)
+    return unpinned
+
+
+class ResultCache:
+    """内容寻址的结果缓存：键为注入后工作流 + 后端模型标识的哈希，值为输出文件
+
+    文件存放在 <cache_dir>/<key[:2]>/<key>/，按 LRU 与总大小淘汰，超过 TTL 视为失效；
+    相同键的并发请求共享同一次 ComfyUI 执行。淘汰只在事件循环中更新索引，目录在下次写入时于线程中删除。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = 10 * 1024 ** 3,
+        ttl: float = 7 * 24 * 3600
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()  # key -> manifest，按访问顺序排列
+        self._total_bytes = 0
+        self._inflight: Dict[str, asyncio.Task] = {}  # key -> 共享的执行任务
+        self._waiters: Dict[str, int] = {}  # key -> 等待该执行的请求数
+        self._trash: List[Path] = []  # 已移出索引、等待删除的条目目录
+        self._files_lock: Optional[asyncio.Lock] = None  # 串行化缓存目录的写入与删除
+        self._load_index()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def _load_index(self):
+        """启动时扫描缓存目录重建索引（按创建时间近似 LRU 顺序）"""
+        manifests = []
+        for manifest_path in self.cache_dir.glob("*/*/manifest.json"):
+            try:
+                manifests.append(json.loads(manifest_path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        for manifest in sorted(manifests, key=lambda m: m["created_at"]):
+            self._entries[manifest["key"]] = manifest
+            self._total_bytes += manifest["size"]
+
+    def get(self, key: str) -> Optional[Dict]:
+        """命中时返回 {"prompt_id", "backend", "images"}，图片路径指向缓存目录"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["created_at"] > self.ttl:
+            self._discard(key)
+            return None
+
+        entry_dir = self._entry_dir(key)
+        images = []
+        for image in entry["images"]:
+            path = entry_dir / image["filename"]
+            images.append(DownloadedImage(
+                filename=image["filename"],
+                node_id=image.get("node_id"),
+                path=str(path),
+                url=get_output_url(path),
+                size=image["size"],
+                content_type=image["content_type"]
+            ))
+        self._entries.move_to_end(key)
+        return {"prompt_id": entry.get("prompt_id"), "backend": entry.get("backend"), "images": images}
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """查询缓存并计入命中/未命中统计"""
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return cached
+
+    async def put(self, key: str, result: Dict):
+        """写入缓存并淘汰过期/超量的条目（文件操作都在线程中执行），下载不完整的结果不缓存"""
+        if key in self._entries or any(image.error for image in result["images"]):
+            return
+        if self._files_lock is None:
+            self._files_lock = asyncio.Lock()
+        async with self._files_lock:
+            if key in self._entries:
+                return
+            entry_dir = self._entry_dir(key)
+            # 同一键此前被淘汰、目录尚未删除时，由 _write_entry 清空后重写
+            self._trash = [path for path in self._trash if path != entry_dir]
+            manifest = await asyncio.to_thread(self._write_entry, key, result)
+            self._entries[key] = manifest
+            self._total_bytes += manifest["size"]
+            self._enforce_limits()
+            trash, self._trash = self._trash, []
+            if trash:
+                await asyncio.to_thread(self._remove_dirs, trash)
+
+    def _write_entry(self, key: str, result: Dict) -> Dict:
+        """将下载好的输出文件硬链接（跨文件系统时复制）到缓存目录，返回 manifest"""
+        images: List[DownloadedImage] = result["images"]
+        entry_dir = self._entry_dir(key)
+        # 不在索引中的键，目录里只可能是已淘汰条目的残留
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        for image in images:
+            target = entry_dir / image.filename
+            if target.exists():
+                target.unlink()
+            try:
+                os.link(image.path, target)
+            except OSError:
+                shutil.copy2(image.path, target)
+
+        manifest = {
+            "key": key,
+            "prompt_id": result.get("prompt_id"),
+            "backend": result.get("backend"),
+            "created_at": time.time(),
+            "size": sum(image.size for image in images),
+            "images": [
+                {k: v for k, v in asdict(image).items() if k in ("filename", "node_id", "size", "content_type")}
+                for image in images
+            ]
+        }
+        (entry_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        return manifest
+
+    async def get_or_run(
+        self,
+        key: str,
+        run: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        """命中缓存直接返回；未命中时执行 run()，相同键的并发请求等待同一次执行
+
+        run() 返回 {"prompt_id", "backend", "images": List[DownloadedImage], ...}。
+        执行在独立任务中进行，某个请求断开不影响其他等待者；最后一个等待者离开时才取消执行。
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.hits += 1
+            cached = True
+        else:
+            lookup = self.lookup(key)
+            if lookup is not None:
+                return {**lookup, "cached": True}
+            task = asyncio.create_task(self._run(key, run))
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            cached = False
+
+        self._waiters[key] += 1
+        try:
+            # asyncio.wait 在本请求被取消时抛出 CancelledError，但不会取消共享任务
+            await asyncio.wait({task})
+        finally:
+            self._leave(key, task)
+        if task.cancelled():
+            # 共享执行在外部被取消（如网关关闭），本请求并未断开：重新执行
+            return await self.get_or_run(key, run)
+        return {**task.result(), "cached": cached}
+
+    async def _run(self, key: str, run: Callable[[], Awaitable[Dict]]) -> Dict:
+        try:
+            result = await run()
+            await self.put(key, result)
+            return result
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+                self._waiters.pop(key, None)
+
+    def _leave(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is not task:
+            return
+        self._waiters[key] -= 1
+        if self._waiters[key] == 0 and not task.done():
+            # 所有等待者都已断开，不再等待 ComfyUI 的结果；之后的请求重新执行
+            del self._inflight[key]
+            del self._waiters[key]
+            task.cancel()
+
+    def _enforce_limits(self):
+        expire_before = time.time() - self.ttl
+        for key, entry in list(self._entries.items()):
+            if entry["created_at"] < expire_before:
+                self._discard(key)
+        while self._total_bytes > self.max_bytes and self._entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: str):
+        """移出索引，目录留待下次写入时在线程中删除"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry["size"]
+            self._trash.append(self._entry_dir(key))
+
+    @staticmethod
+    def _remove_dirs(paths: List[Path]):
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "inflight": len(self._inflight),
+            "pending_removal": len(self._trash)
+        }
+
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """进程内共享的结果缓存；RESULT_CACHE_ENABLED=0 时返回 None"""
+    global _result_cache
+    if os.getenv("RESULT_CACHE_ENABLED", "1") != "1":
+        return None
+    if _result_cache is None:
+        cache_dir = os.getenv("RESULT_CACHE_DIR") or str(Path(os.getenv("OUTPUT_DIR", "./outputs")) / "_cache")
+        _result_cache = ResultCache(
+            cache_dir,
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 10 * 1024 ** 3)),
+            ttl=float(os.getenv("RESULT_CACHE_TTL", 7 * 24 * 3600))
+        )
+    return _result_cache
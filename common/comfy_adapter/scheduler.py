@@ -0,0 +1,107 @@
+import os
+import json
+import heapq
+import itertools
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional
+from .types import SchedulingTicket
+load_dotenv()
+
+# 优先级类别：交互式请求总是先于批量请求出队，批量任务只消耗空闲的执行名额
+PRIORITIES = {"interactive": 0, "batch": 1}
+_PRIORITY_NAMES = {p: name for name, p in PRIORITIES.items()}
+
+
+def _load_key_weights() -> Dict[str, float]:
+    """API_KEY_WEIGHTS 环境变量（JSON 对象）：{"<api key>": 权重}，未配置的 key 权重为 1"""
+    raw = os.getenv("API_KEY_WEIGHTS")
+    return {k: float(v) for k, v in json.loads(raw).items()} if raw else {}
+
+
+_key_weights = _load_key_weights()
+
+
+def make_ticket(
+    service_name: str,
+    priority: str,
+    api_key: Optional[str] = None,
+    service_weight: float = 1.0,
+    deadline: Optional[float] = None,
+    hedge: bool = True
+) -> SchedulingTicket:
+    """按服务与 API key 生成调度信息；优先级名称不合法时抛出 ValueError"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"未知优先级: {priority}（可选 {', '.join(PRIORITIES)}）")
+    return SchedulingTicket(
+        flow=f"{service_name}:{api_key or 'anonymous'}",
+        service=service_name,
+        priority=PRIORITIES[priority],
+        weight=service_weight * _key_weights.get(api_key, 1.0),
+        deadline=deadline,
+        hedge=hedge
+    )
+
+
+class FairQueue:
+    """准入等待队列：严格优先级 + 同一优先级内按流的加权公平排队
+
+    同一优先级内采用 start-time fair queueing：每个条目的起始标签为
+    max(当前虚拟时间, 该流上一个条目的结束标签)，结束标签 = 起始标签 + 1/weight，
+    按起始标签出队。权重为 2 的流获得的执行名额约为权重 1 的两倍，
+    空闲的流重新到达时不会因为之前未使用的份额而插队。
+
+    只做排队决策，不涉及 I/O 与时钟，可直接用假执行器做确定性测试。
+    """
+
+    def __init__(self):
+        self._heaps: Dict[int, List[list]] = {}
+        self._vtime: Dict[int, float] = {}  # 各优先级的虚拟时间（最近出队条目的起始标签）
+        self._finish: Dict[tuple, float] = {}  # (优先级, 流) -> 上一个条目的结束标签
+        self._entries: Dict[Any, list] = {}  # item -> 堆条目，用于移除
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def push(self, item: Any, ticket: SchedulingTicket):
+        key = (ticket.priority, ticket.flow)
+        start = max(self._vtime.get(ticket.priority, 0.0), self._finish.get(key, 0.0))
+        self._finish[key] = start + 1.0 / max(ticket.weight, 1e-6)
+        entry = [start, next(self._seq), item, ticket]
+        self._entries[item] = entry
+        heapq.heappush(self._heaps.setdefault(ticket.priority, []), entry)
+
+    def pop(self) -> Any:
+        """取出下一个应执行的条目（队列为空时抛出 IndexError）"""
+        for priority in sorted(self._heaps):
+            heap = self._heaps[priority]
+            while heap:
+                start, _, item, ticket = heapq.heappop(heap)
+                if self._entries.get(item) is None:
+                    continue  # 已被 discard
+                del self._entries[item]
+                self._vtime[priority] = start
+                self._prune(priority)
+                return item
+        raise IndexError("pop from empty FairQueue")
+
+    def discard(self, item: Any):
+        """移除条目（排队超时或取消），不存在时忽略；堆中的条目延迟清理"""
+        entry = self._entries.pop(item, None)
+        if entry is not None:
+            entry[2] = None
+
+    def _prune(self, priority: int):
+        """清理已空闲的流的结束标签，避免字典随流的数量无限增长"""
+        vtime = self._vtime[priority]
+        for key in [k for k, finish in self._finish.items() if k[0] == priority and finish <= vtime]:
+            del self._finish[key]
+
+    def stats(self) -> Dict:
+        queued: Dict[str, Dict[str, int]] = {}
+        for entry in self._entries.values():
+            ticket: SchedulingTicket = entry[3]
+            name = _PRIORITY_NAMES.get(ticket.priority, str(ticket.priority))
+            flows = queued.setdefault(name, {})
+            flows[ticket.flow] = flows.get(ticket.flow, 0) + 1
+        return queued
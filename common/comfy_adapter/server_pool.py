@@ -0,0 +1,632 @@
+import os
+import time
+import logging
+import asyncio
+import aiohttp
+from collections import deque
+from dotenv import load_dotenv
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+from .types import ComfyConfig, PromptState, SchedulingTicket, WorkflowStatus
+from .admission import AdmissionController, Saturated
+from .assets import BackendAssets
+from .circuit_breaker import BreakerState, CircuitBreaker
+from .config_loader import SERVERS_FILE, load_comfy_config, load_comfy_group
+from .executor import execution_failure, execution_seconds
+from .journal import get_prompt_journal
+from common.utils.config_registry import get_config_registry
+from common.utils.metrics import ERRORS, HEDGES, REGISTRY, STAGE_SECONDS
+from common.utils.tracing import add_prompt_id, create_background_task, record_stage, stage, start_span
+from .async_executor import AsyncComfyExecutor, SubmitError, get_async_executor
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 单个任务的总时长上限（秒，含网关排队、执行与改派），0 表示不限制；服务 config.json 的 "deadline" 可覆盖
+JOB_DEADLINE = float(os.getenv("COMFY_JOB_DEADLINE", 1800))
+# 对冲提交：执行时长超过该服务最近执行时长的 HEDGE_QUANTILE 分位（至少 HEDGE_MIN_DELAY 秒）时，
+# 向另一台空闲的后端再提交一次，先完成的结果生效，另一个在 ComfyUI 中取消
+HEDGE_ENABLED = os.getenv("COMFY_HEDGE_ENABLED", "0") == "1"
+HEDGE_QUANTILE = float(os.getenv("COMFY_HEDGE_QUANTILE", 0.95))
+HEDGE_MIN_SAMPLES = int(os.getenv("COMFY_HEDGE_MIN_SAMPLES", 20))
+HEDGE_MIN_DELAY = float(os.getenv("COMFY_HEDGE_MIN_DELAY", 1))
+LATENCY_SAMPLES = 200  # 每个服务保留的最近执行时长样本数
+
+
+class BackendDown(Exception):
+    """后端在任务执行期间被判定为不可用"""
+
+
+class DeadlineExceeded(Exception):
+    """任务超过总时长上限，调用方应返回 504"""
+
+
+class ExecutionFailed(RuntimeError):
+    """ComfyUI 报告执行失败（/history 中 status_str 为 error）"""
+
+
+class NoBackendAvailable(RuntimeError):
+    """服务器池中没有可派发的后端（全部失联或熔断），调用方应返回 503 并带上 Retry-After"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Backend:
+    """单个 ComfyUI 服务器的调度状态（所有服务器池共享同一实例）"""
+
+    def __init__(self, config: ComfyConfig, executor: AsyncComfyExecutor):
+        self.name = config.name
+        self.config = config
+        self.executor = executor
+        self.admission = AdmissionController(
+            config.name,
+            max_in_flight=config.max_in_flight,
+            max_queued=config.max_queued,
+            queue_timeout=config.queue_timeout
+        )
+        self.assets = BackendAssets(config, executor)
+        self.breaker = CircuitBreaker(config.name)
+        self.in_flight = 0  # 本网关已提交且未结束的 prompt 数
+        self.queue_depth = 0  # 最近一次 /queue 查询到的排队数（含其他客户端提交的任务）
+        self.healthy = True
+        self.failures = 0
+        self._down_event = asyncio.Event()
+
+    @property
+    def load(self) -> int:
+        # /queue 已包含本网关的任务，取较大值而不是相加；两次健康检查之间以本地计数为准
+        # 网关内排队等待准入的请求尚未提交，需要另外加上
+        return max(self.in_flight, self.queue_depth) + self.admission.queued
+
+    def mark_up(self, queue_depth: int):
+        if not self.healthy:
+            logger.info("后端恢复可用", extra={"backend": self.name})
+            self._down_event = asyncio.Event()
+            # 后端可能已重启或清空了输入目录，之前传过的输入文件需要重新传输
+            self.assets.forget()
+        self.healthy = True
+        self.failures = 0
+        self.queue_depth = queue_depth
+
+    def mark_down(self, reason: str):
+        if self.healthy:
+            logger.error("后端已剔除", extra={"backend": self.name, "reason": reason})
+        self.healthy = False
+        # 唤醒所有在该后端上等待的任务，由服务器池重新调度
+        self._down_event.set()
+
+    async def wait_down(self):
+        await self._down_event.wait()
+
+    def configure(self, config: ComfyConfig):
+        """应用 comfy_servers.json 中的新配置，保留在途计数与准入队列
+
+        地址变化时改用新地址的执行器（正在执行的任务继续使用原执行器直到结束）；
+        pool_size 只在新建连接池时生效。
+        """
+        if (config.host, config.port) != (self.config.host, self.config.port):
+            self.executor = get_async_executor(config)
+            self.assets = BackendAssets(config, self.executor)
+        elif config.upload_dir != self.config.upload_dir:
+            self.assets.forget()
+        self.executor.config = config
+        self.executor.upload_dir = config.upload_dir
+        self.assets.mode = config.upload_mode
+        self.assets.upload_dir = config.upload_dir
+        self.admission.configure(config.max_in_flight, config.max_queued, config.queue_timeout)
+        self.config = config
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "base_url": self.executor.base_url,
+            "healthy": self.healthy,
+            "breaker": self.breaker.stats(),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admission": self.admission.stats(),
+            "assets": self.assets.stats(),
+            "pool": self.executor.pool_stats()
+        }
+
+
+class ServerPool:
+    """同一分组内多台 ComfyUI 服务器的负载均衡
+
+    每个任务派发给负载最低的健康后端；后端失联时将其剔除，并把其上未完成的任务重新派发。
+    失败率过高的后端由熔断器暂停派发；任务总时长受期限限制，可选对冲提交到第二台后端。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        backends: List[Backend],
+        health_interval: float = float(os.getenv("COMFY_HEALTH_INTERVAL", 5)),
+        max_failures: int = int(os.getenv("COMFY_MAX_FAILURES", 3)),
+        max_requeue: int = int(os.getenv("COMFY_MAX_REQUEUE", 2))
+    ):
+        self.name = name
+        self.backends = backends
+        self.health_interval = health_interval
+        self.max_failures = max_failures  # 连续健康检查失败多少次后剔除
+        self.max_requeue = max_requeue  # 单个任务最多重新派发次数
+        self._rr = 0
+        self._health_task: Optional[asyncio.Task] = None
+        self._latency: Dict[str, Deque[float]] = {}  # 服务 -> 最近的执行时长（秒）
+        self._background: Set[asyncio.Task] = set()
+        self.hedges = {"started": 0, "won": 0, "lost": 0}
+
+    def start(self):
+        """启动后台健康检查（需在事件循环内调用，重复调用无副作用；通常由第一个请求触发）"""
+        if self._health_task is None or self._health_task.done():
+            self._health_task = create_background_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+        for backend in self.backends:
+            await backend.executor.close()
+
+    @property
+    def identity(self) -> str:
+        """后端模型标识（结果缓存键的一部分）：同组服务器部署相同的模型"""
+        identities = sorted({b.config.model_identity or "" for b in self.backends})
+        return f"{self.name}:{','.join(identities)}"
+
+    def check_admission(self):
+        """所有健康后端都已满载时抛出 Saturated（用于流式/异步接口在受理前快速拒绝）"""
+        self.select()
+
+    def select(self) -> Backend:
+        """选择负载最低且未满载的健康后端（跳过熔断中的后端），负载相同时轮询"""
+        healthy = [b for b in self.backends if b.healthy]
+        if not healthy:
+            raise NoBackendAvailable(f"服务器池 {self.name} 没有可用的后端", max(1, int(self.health_interval)))
+        available = [b for b in healthy if b.breaker.available]
+        if not available:
+            raise NoBackendAvailable(
+                f"服务器池 {self.name} 的后端均已熔断",
+                min(b.breaker.retry_after() for b in healthy)
+            )
+        healthy = available
+        candidates = [b for b in healthy if not b.admission.saturated]
+        if not candidates:
+            raise Saturated(
+                f"服务器池 {self.name} 的所有后端均已满载",
+                min(b.admission.retry_after() for b in healthy)
+            )
+        self._rr += 1
+        offset = self._rr % len(candidates)
+        rotated = candidates[offset:] + candidates[:offset]
+        return min(rotated, key=lambda b: b.load)
+
+    async def execute(
+        self,
+        workflow: Any,
+        on_status: Optional[Callable[[WorkflowStatus], None]] = None,
+        ticket: Optional[SchedulingTicket] = None
+    ) -> Tuple[Backend, WorkflowStatus]:
+        """派发工作流并等待完成，后端失联时重新派发到其他后端
+
+        后端同时执行的 prompt 达到上限时按 ticket 的优先级与公平份额在准入队列中等待；
+        排队已满或超时抛出 Saturated，超过任务期限抛出 DeadlineExceeded
+        """
+        self.start()
+        service = ticket.service if ticket else ""
+        timeout = ticket.deadline if ticket and ticket.deadline is not None else JOB_DEADLINE
+        deadline = time.monotonic() + timeout if timeout > 0 else None
+        requeued = 0
+        while True:
+            backend = queue_wait = None
+            try:
+                remaining = _remaining(deadline)
+                backend = self.select()
+                queue_wait = start_span(
+                    "queue_wait",
+                    service=service,
+                    backend=backend.name,
+                    priority=ticket.priority if ticket else None,
+                    flow=ticket.flow if ticket else None
+                )
+                async with backend.admission.slot(ticket, remaining):
+                    STAGE_SECONDS.observe(
+                        queue_wait.end(),
+                        stage="queue_wait",
+                        service=service,
+                        backend=backend.name
+                    )
+                    if not backend.breaker.available:
+                        # 排队期间熔断器已断开，或半开状态的探测名额已被先出队的请求占用：重新选择后端
+                        continue
+                    # 探测名额在出队时立即占用（与上面的检查之间没有让出控制权）
+                    probe = backend.breaker.on_start()
+                    return await self._execute_hedged(backend, workflow, on_status, ticket, deadline, probe)
+            except Saturated as e:
+                if queue_wait is not None:
+                    queue_wait.end(error=str(e))
+                if deadline is not None and time.monotonic() >= deadline:
+                    ERRORS.inc(service=service, backend=backend.name if backend else "", stage="queue_wait", type="deadline")
+                    raise DeadlineExceeded(f"任务超过期限（{timeout:g} 秒），仍在网关内排队") from e
+                ERRORS.inc(service=service, backend=backend.name if backend else "", stage="queue_wait", type="saturated")
+                raise
+            except BackendDown as e:
+                ERRORS.inc(service=service, backend=backend.name, stage="execute", type="backend_down")
+                requeued += 1
+                if requeued > self.max_requeue:
+                    raise RuntimeError(f"任务重新派发 {self.max_requeue} 次后仍失败: {str(e)}")
+                logger.warning("任务重新派发", extra={"backend": backend.name, "requeued": requeued, "max_requeue": self.max_requeue})
+            except DeadlineExceeded:
+                ERRORS.inc(service=service, backend=backend.name if backend else "", stage="execute", type="deadline")
+                raise
+
+    async def _execute_hedged(
+        self,
+        backend: Backend,
+        workflow: Any,
+        on_status: Optional[Callable[[WorkflowStatus], None]],
+        ticket: Optional[SchedulingTicket],
+        deadline: Optional[float],
+        probe: bool = False
+    ) -> Tuple[Backend, WorkflowStatus]:
+        """在 backend 上执行；超过该服务的对冲时延仍未完成时，再提交到另一台空闲后端，取先完成的结果
+
+        只向调用方转发原请求的状态；两个请求都失败时抛出原请求的异常（BackendDown 由 execute 重新派发）。
+        半开状态下的探测请求（probe）不对冲。
+        """
+        service = ticket.service if ticket else ""
+        delay = None if probe else self._hedge_delay(service, ticket)
+        if delay is None:
+            return backend, await self._attempt(backend, workflow, on_status, service, deadline, probe)
+
+        prompts: Dict[str, str] = {}  # 后端名称 -> prompt_id，用于取消落后的请求
+
+        def track(target: Backend, forward: Optional[Callable[[WorkflowStatus], None]]):
+            def callback(status: WorkflowStatus):
+                prompts.setdefault(target.name, status.prompt_id)
+                if forward:
+                    forward(status)
+            return callback
+
+        primary = asyncio.create_task(self._attempt(backend, workflow, track(backend, on_status), service, deadline))
+        attempts = {primary: backend}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            alternate = None if done else self._select_hedge(backend)
+            if alternate is None:
+                return backend, await primary
+
+            logger.info("执行超过对冲时延，提交到另一台后端", extra={
+                "service": service, "backend": backend.name, "hedge_backend": alternate.name, "delay": round(delay, 2)
+            })
+            HEDGES.inc(service=service, result="started")
+            self.hedges["started"] += 1
+            hedge = asyncio.create_task(self._hedge(alternate, workflow, track(alternate, None), ticket, deadline))
+            attempts[hedge] = alternate
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    winner = attempts[task]
+                    for loser_task in pending:
+                        loser_task.cancel()
+                        loser = attempts[loser_task]
+                        if loser.name in prompts:
+                            self._abandon(loser, prompts[loser.name], f"{winner.name} 上的{'对冲' if task is hedge else '原'}请求已先完成")
+                    result = "won" if task is hedge else "lost"
+                    HEDGES.inc(service=service, result=result)
+                    self.hedges[result] += 1
+                    if task is hedge:
+                        # 原请求落后于晚启动的对冲请求，计为该后端的一次故障
+                        backend.breaker.record(False)
+                    return winner, task.result()
+            raise primary.exception()
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+    async def _hedge(
+        self,
+        backend: Backend,
+        workflow: Any,
+        on_status: Callable[[WorkflowStatus], None],
+        ticket: Optional[SchedulingTicket],
+        deadline: Optional[float]
+    ) -> WorkflowStatus:
+        async with backend.admission.slot(ticket, _remaining(deadline)):
+            probe = backend.breaker.on_start()
+            return await self._attempt(backend, workflow, on_status, ticket.service if ticket else "", deadline, probe)
+
+    def _select_hedge(self, exclude: Backend) -> Optional[Backend]:
+        """对冲请求的目标：熔断器闭合、有空闲执行名额的其他健康后端，没有时不对冲"""
+        candidates = [
+            b for b in self.backends
+            if b is not exclude and b.healthy and b.breaker.state == BreakerState.CLOSED
+            and b.admission.active < b.admission.max_in_flight and not b.admission.queued
+        ]
+        return min(candidates, key=lambda b: b.load) if candidates else None
+
+    def _hedge_delay(self, service: str, ticket: Optional[SchedulingTicket]) -> Optional[float]:
+        """该服务的对冲时延：最近执行时长的 HEDGE_QUANTILE 分位；未开启或样本不足时返回 None"""
+        if not HEDGE_ENABLED or (ticket and not ticket.hedge) or len(self.backends) < 2:
+            return None
+        samples = self._latency.get(service)
+        if samples is None or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return max(HEDGE_MIN_DELAY, ordered[min(len(ordered) - 1, int(len(ordered) * HEDGE_QUANTILE))])
+
+    async def _attempt(
+        self,
+        backend: Backend,
+        workflow: Any,
+        on_status: Optional[Callable[[WorkflowStatus], None]],
+        service: str,
+        deadline: Optional[float],
+        probe: bool = False
+    ) -> WorkflowStatus:
+        """在 backend 上执行一次，并把结果计入其熔断器：连接失败、5xx、失联、超过期限计为故障，
+        工作流本身的错误（4xx、ComfyUI 执行失败）与取消不计入
+
+        probe 为调用方取得准入名额时通过 breaker.on_start() 占用的半开探测名额，结束时归还
+        """
+        outcome = None
+        started = time.monotonic()
+        try:
+            status = await self._execute_on(backend, workflow, on_status, service, deadline)
+            outcome = True
+            self._latency.setdefault(service, deque(maxlen=LATENCY_SAMPLES)).append(time.monotonic() - started)
+            return status
+        except (BackendDown, DeadlineExceeded):
+            outcome = False
+            raise
+        except RuntimeError as e:
+            if isinstance(e.__cause__, SubmitError) and e.__cause__.status >= 500:
+                outcome = False
+            raise
+        finally:
+            backend.breaker.record(outcome, probe)
+
+    def _abandon(self, backend: Backend, prompt_id: str, reason: str):
+        """不再等待该 prompt：日志记为 cancelled，并在后台从 ComfyUI 队列删除或中断执行"""
+        journal_finish(prompt_id, PromptState.CANCELLED, reason)
+        task = asyncio.create_task(self._cancel_prompt(backend, prompt_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    @staticmethod
+    async def _cancel_prompt(backend: Backend, prompt_id: str):
+        try:
+            await backend.executor.cancel_prompt(prompt_id)
+        except Exception as e:
+            logger.warning("取消 prompt 失败", extra={"backend": backend.name, "prompt_id": prompt_id, "error": str(e)})
+
+    async def _execute_on(
+        self,
+        backend: Backend,
+        workflow: Any,
+        on_status: Optional[Callable[[WorkflowStatus], None]],
+        service: str = "",
+        deadline: Optional[float] = None
+    ) -> WorkflowStatus:
+        labels = {"service": service, "backend": backend.name}
+        backend.in_flight += 1
+        try:
+            try:
+                # 输入文件按需传到该后端（已传过的跳过）
+                if getattr(workflow, "asset_refs", None):
+                    with stage("upload", **labels) as span:
+                        span.set_attribute("assets", len(set(workflow.asset_refs.values())))
+                        workflow = await backend.assets.resolve(workflow)
+                with stage("submit", **labels) as span:
+                    prompt_id = await backend.executor.submit_workflow(workflow)
+                    span.set_attribute("prompt_id", prompt_id)
+                    add_prompt_id(prompt_id)
+                    _journal_submitted(prompt_id, backend.name, service)
+            except RuntimeError as e:
+                # 连接类错误说明后端不可用；其他错误（如工作流校验失败）直接抛出
+                if isinstance(e.__cause__, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+                    ERRORS.inc(stage="submit", type="connection", **labels)
+                    backend.mark_down(str(e))
+                    raise BackendDown(str(e))
+                ERRORS.inc(stage="submit", type="rejected", **labels)
+                raise
+
+            if on_status:
+                on_status(WorkflowStatus(
+                    prompt_id=prompt_id,
+                    completed=False,
+                    status_str="submitted",
+                    images_meta=[]
+                ))
+
+            # execute 阶段包含 ComfyUI 自身的排队时间与 GPU 执行时间，成功时再拆分为 comfy_queue 与 gpu 两个子阶段
+            # 请求被取消（客户端断开、网关关闭）时日志中保持 submitted，由下次启动时的恢复流程取回结果
+            try:
+                with stage("execute", prompt_id=prompt_id, **labels) as span:
+                    wait_task = asyncio.create_task(
+                        backend.executor.wait_for_completion(prompt_id, on_status)
+                    )
+                    down_task = asyncio.create_task(backend.wait_down())
+                    try:
+                        done, _ = await asyncio.wait(
+                            {wait_task, down_task},
+                            timeout=_remaining(deadline),
+                            return_when=asyncio.FIRST_COMPLETED
+                        )
+                    finally:
+                        wait_task.cancel()
+                        down_task.cancel()
+                    if wait_task in done:
+                        status = wait_task.result()
+                        span.set_attribute("status", status.status_str)
+                        span.set_attribute("images", len(status.images_meta))
+                        failure = execution_failure(status)
+                        if failure is not None:
+                            ERRORS.inc(stage="execute", type="comfy_error", **labels)
+                            raise ExecutionFailed(f"ComfyUI 执行失败: {failure}")
+                        _record_execution(backend, status, span.start_time, labels)
+                        return status
+                    if down_task in done:
+                        raise BackendDown(f"后端 {backend.name} 在执行 {prompt_id} 期间失联")
+                    raise DeadlineExceeded(f"任务超过期限，已取消 {backend.name} 上的 {prompt_id}")
+            except BackendDown as e:
+                journal_finish(prompt_id, PromptState.REQUEUED, str(e))
+                raise
+            except DeadlineExceeded as e:
+                self._abandon(backend, prompt_id, str(e))
+                raise
+            except Exception as e:
+                journal_finish(prompt_id, PromptState.FAILED, str(e))
+                raise
+        finally:
+            backend.in_flight -= 1
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self._check(b) for b in self.backends))
+            await asyncio.sleep(self.health_interval)
+
+    async def _check(self, backend: Backend):
+        try:
+            backend.mark_up(await backend.executor.get_queue_depth())
+        except Exception as e:
+            backend.failures += 1
+            if backend.failures >= self.max_failures:
+                backend.mark_down(f"连续 {backend.failures} 次健康检查失败: {str(e)}")
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "backends": [b.stats() for b in self.backends],
+            "hedges": self.hedges
+        }
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    """距离任务期限的秒数（无期限时为 None），已超过时抛出 DeadlineExceeded"""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("任务超过期限")
+    return remaining
+
+
+def _record_execution(backend: Backend, status: WorkflowStatus, submitted_at: float, labels: Dict[str, str]):
+    """将 execute 阶段拆分为 ComfyUI 排队（comfy_queue）与实际执行（gpu）
+
+    执行时长优先取 /history 消息时间戳之差，其次取 /ws execution_start 事件的到达时间；都没有时不拆分
+    """
+    elapsed = time.time() - submitted_at
+    gpu = execution_seconds(status)
+    if gpu is None and backend.executor.events is not None:
+        started_at = backend.executor.events.started_at(status.prompt_id)
+        gpu = time.time() - started_at if started_at is not None else None
+    if gpu is None:
+        return
+    gpu = min(max(gpu, 0.0), elapsed)
+    record_stage("comfy_queue", start_time=submitted_at, seconds=elapsed - gpu, **labels)
+    record_stage("gpu", start_time=submitted_at + elapsed - gpu, seconds=gpu, **labels)
+
+
+def _journal_submitted(prompt_id: str, backend: str, service: str):
+    journal = get_prompt_journal()
+    if journal is not None:
+        journal.submitted(prompt_id, backend, service)
+
+
+def journal_finish(prompt_id: str, state: str, error: Optional[str] = None):
+    """在提交日志中记录 prompt 的最终状态（日志关闭时忽略）"""
+    journal = get_prompt_journal()
+    if journal is not None:
+        journal.finish(prompt_id, state, error)
+
+
+async def reattach(backend_name: str, prompt_id: str, timeout: float) -> Tuple[Backend, Optional[WorkflowStatus]]:
+    """重新关联网关重启前提交的 prompt（不重新提交）
+
+    已结束的直接返回 /history 中的状态；仍在 /queue 中排队或执行的等待完成（最多 timeout 秒）；
+    ComfyUI 中已找不到（如 ComfyUI 也重启过）时返回 None。
+    """
+    backend = _get_backend(load_comfy_config(backend_name))
+    executor = backend.executor
+    status = await executor.get_workflow_status(prompt_id)
+    if status.error:
+        raise RuntimeError(status.error)
+    if status.completed or status.status_str == "error":
+        return backend, status
+    if prompt_id not in await executor.get_queued_prompt_ids():
+        # 查询 /queue 期间恰好执行完成
+        status = await executor.get_workflow_status(prompt_id)
+        return backend, status if status.completed or status.status_str == "error" else None
+    backend.in_flight += 1
+    try:
+        return backend, await asyncio.wait_for(executor.wait_for_completion(prompt_id), timeout)
+    finally:
+        backend.in_flight -= 1
+
+
+_backends: Dict[str, Backend] = {}
+_pools: Dict[str, ServerPool] = {}
+
+
+def _get_backend(config: ComfyConfig) -> Backend:
+    backend = _backends.get(config.name)
+    if backend is None:
+        backend = _backends[config.name] = Backend(config, get_async_executor(config))
+    elif backend.config != config:
+        backend.configure(config)
+        logger.info("后端配置已更新", extra={"backend": config.name})
+    return backend
+
+
+def get_server_pool(target: str) -> ServerPool:
+    """按分组名（或单个服务器名称）获取共享的服务器池"""
+    if target not in _pools:
+        if not _pools:
+            get_config_registry().subscribe(SERVERS_FILE, lambda servers: reload_server_pools())
+        _pools[target] = ServerPool(target, [_get_backend(config) for config in load_comfy_group(target)])
+    return _pools[target]
+
+
+def reload_server_pools():
+    """comfy_servers.json 变化后更新各服务器池的后端列表
+
+    新增的服务器立即参与调度；被移除的服务器不再接收新任务，其上正在执行的任务照常完成。
+    """
+    for target, pool in list(_pools.items()):
+        try:
+            configs = load_comfy_group(target)
+        except ValueError as e:
+            logger.error("新配置中缺少服务器池，保留原有后端", extra={"pool": target, "error": str(e)})
+            continue
+        backends = [_get_backend(config) for config in configs]
+        removed = {b.name for b in pool.backends} - {b.name for b in backends}
+        added = {b.name for b in backends} - {b.name for b in pool.backends}
+        pool.backends = backends
+        if added or removed:
+            logger.info("服务器池成员已更新", extra={"pool": target, "added": sorted(added), "removed": sorted(removed)})
+    in_use = {b.name for pool in _pools.values() for b in pool.backends}
+    for name in list(_backends):
+        if name not in in_use:
+            del _backends[name]
+
+
+def get_all_pools() -> List[ServerPool]:
+    return list(_pools.values())
+
+
+def _backend_gauge(value: Callable[[Backend], float]) -> Callable:
+    return lambda: [({"backend": name}, value(backend)) for name, backend in _backends.items()]
+
+
+REGISTRY.gauge_callback("comfybox_backend_in_flight", "已提交到 ComfyUI 且未结束的 prompt 数", _backend_gauge(lambda b: b.in_flight))
+REGISTRY.gauge_callback("comfybox_backend_queue_depth", "ComfyUI /queue 中的任务数（最近一次健康检查）", _backend_gauge(lambda b: b.queue_depth))
+REGISTRY.gauge_callback("comfybox_backend_healthy", "后端是否可用（1 / 0）", _backend_gauge(lambda b: int(b.healthy)))
+REGISTRY.gauge_callback("comfybox_backend_breaker_state", "熔断器状态（0 闭合 / 1 半开 / 2 断开）", _backend_gauge(lambda b: BreakerState.VALUES[b.breaker.state]))
+REGISTRY.gauge_callback("comfybox_admission_active", "占用准入名额的请求数", _backend_gauge(lambda b: b.admission.active))
+REGISTRY.gauge_callback("comfybox_admission_queued", "在网关准入队列中等待的请求数", _backend_gauge(lambda b: b.admission.queued))
@@ -1,3 +1,4 @@
+import time
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Any
 
@@ -9,6 +10,20 @@ class ComfyImageMeta:
     format: str = ".png"  # 默认值根据实际API调整
     node_id: Optional[str] = None  # 关联的节点ID
 
+@dataclass
+class DownloadedImage:
+    filename: str
+    node_id: Optional[str] = None
+    path: Optional[str] = None  # 本地落盘路径
+    url: Optional[str] = None  # 输出静态目录下的访问地址
+    size: int = 0
+    content_type: str = "image/png"
+    data: Optional[str] = None  # inline 模式下的 Base64 data URI
+    error: Optional[str] = None
+    elapsed_ms: float = 0  # 下载耗时（含重试）
+    attempts: int = 0
+    rendition: Optional[str] = None  # 派生版本名称（原图为 None）
+
 @dataclass
 class WorkflowStatus:
     prompt_id: str
@@ -18,6 +33,65 @@ class WorkflowStatus:
     messages: List[Dict[str, Any]] = field(default_factory=list)
     meta: Dict[str, Any] = field(default_factory=dict)
     error: Optional[str] = None
+    progress: Optional[float] = None  # 当前节点执行进度（来自 /ws progress 事件）
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    """输出图片的派生版本：格式转换 + 可选缩放"""
+    name: str
+    format: str = "webp"  # webp / jpeg / png
+    quality: int = 80
+    max_size: Optional[int] = None  # 长边像素上限（等比缩小，不放大）
+
+
+class PromptState:
+    SUBMITTED = "submitted"  # 已提交到 ComfyUI，结果尚未取回
+    COMPLETED = "completed"  # 结果已下载
+    FAILED = "failed"
+    REQUEUED = "requeued"  # 后端失联，已改派到其他后端
+    CANCELLED = "cancelled"  # 超过任务期限或对冲请求已先完成，已在 ComfyUI 中取消
+    RECOVERED = "recovered"  # 网关重启后从 /history 取回结果
+    LOST = "lost"  # 网关重启后在 ComfyUI 中已找不到
+
+
+@dataclass
+class JournalEntry:
+    """提交日志中的一个 prompt"""
+    prompt_id: str
+    backend: str  # comfy_servers.json 中的服务器名称
+    service: str = ""
+    job_id: Optional[str] = None  # 异步任务提交时的任务 ID
+    cache_key: Optional[str] = None  # 结果缓存键（不缓存时为空）
+    state: str = PromptState.SUBMITTED
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class InputAsset:
+    """网关本地按内容寻址保存的输入文件"""
+    asset_id: str  # 文件内容的 sha256
+    path: str
+    size: int
+    content_type: str = "image/png"
+
+    @property
+    def ref(self) -> str:
+        """在输入参数中引用该文件的写法"""
+        return f"asset://{self.asset_id}"
+
+
+@dataclass
+class SchedulingTicket:
+    """请求在准入队列中的调度信息"""
+    flow: str = "default"  # 公平排队的单位：服务名 + API key
+    service: str = ""  # 发起请求的服务（指标标签）
+    priority: int = 0  # 数值越小越优先（见 scheduler.PRIORITIES）
+    weight: float = 1.0  # 同一优先级内的份额权重
+    deadline: Optional[float] = None  # 任务总时长上限（秒，含排队、执行与改派），None 时使用 COMFY_JOB_DEADLINE
+    hedge: bool = True  # 是否允许对冲提交（服务 config.json 的 "hedge"）
 
 
 @dataclass
@@ -26,6 +100,24 @@ class ComfyConfig:
     port: int
     upload_dir: str
     base_url: str = None
+    name: Optional[str] = None  # comfy_servers.json 中的服务器名称
+    group: Optional[str] = None  # 所属服务器分组（同组服务器部署相同的模型与节点）
+    model_identity: Optional[str] = None  # 模型/节点版本标识，变更后结果缓存自动失效
+    # 连接池与超时（秒）
+    pool_size: int = 100
+    max_retries: int = 3  # 幂等 GET 请求的重试次数
+    connect_timeout: float = 3
+    submit_timeout: float = 10
+    status_timeout: float = 10
+    download_timeout: float = 30  # 单张图片的下载超时
+    download_concurrency: int = 4  # 单个任务并发下载的图片数
+    download_retries: int = 2  # 单张图片下载失败后的重试次数
+    # 准入控制
+    max_in_flight: int = 8  # 同时提交到 ComfyUI 的最大 prompt 数
+    max_queued: int = 100  # 网关内最多排队的请求数，超出返回 429
+    queue_timeout: float = 60  # 网关内排队的最长时间（秒）
+    # 输入文件传输方式：upload 通过 /upload/image 上传；copy 直接复制到 upload_dir（与网关同机部署时）
+    upload_mode: str = "upload"
 
     def __post_init__(self):
         self.base_url = f"http://{self.host}:{self.port}"
\ No newline at end of file
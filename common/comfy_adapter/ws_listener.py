@@ -0,0 +1,155 @@
+import time
+import uuid
+import logging
+import asyncio
+import aiohttp
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from common.utils.tracing import create_background_task
+
+logger = logging.getLogger(__name__)
+
+# 表示某个 prompt 执行结束的事件类型
+FINISH_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+
+class ComfyEventListener:
+    """单个 ComfyUI 服务器共享的 /ws 事件监听器
+
+    所有通过该监听器 client_id 提交的 prompt 共用一条 WebSocket 连接，
+    按 prompt_id 分发完成/进度事件；连接断开时唤醒所有等待者，由调用方回落到轮询。
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        get_session: Callable,
+        reconnect_min: float = 1.0,
+        reconnect_max: float = 30.0,
+        recent_size: int = 1024
+    ):
+        self.ws_url = f"ws://{host}:{port}/ws"
+        self.client_id = uuid.uuid4().hex
+        self.get_session = get_session
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._progress_callbacks: Dict[str, Callable[[str, float], None]] = {}
+        # 最近结束的 prompt_id，避免事件先于 wait() 注册到达时丢失
+        self._recent: "OrderedDict[str, str]" = OrderedDict()
+        self._recent_size = recent_size
+        # 收到 execution_start 的时间（网关时钟），用于区分 ComfyUI 排队与执行耗时
+        self._started: "OrderedDict[str, float]" = OrderedDict()
+
+    def start(self):
+        """启动后台监听任务（需在事件循环内调用，重复调用无副作用；由第一次提交触发）"""
+        if self._task is None or self._task.done():
+            self._task = create_background_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._set_disconnected()
+
+    async def wait(
+        self,
+        prompt_id: str,
+        timeout: float,
+        on_progress: Optional[Callable[[str, float], None]] = None
+    ) -> bool:
+        """等待 prompt 结束事件
+
+        返回 True 表示收到结束事件；False 表示连接断开或超时，调用方应改为轮询确认。
+        """
+        if prompt_id in self._recent:
+            return True
+        if not self.connected:
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(prompt_id, []).append(future)
+        if on_progress:
+            self._progress_callbacks[prompt_id] = on_progress
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters = self._waiters.get(prompt_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(prompt_id, None)
+                self._progress_callbacks.pop(prompt_id, None)
+
+    async def _run(self):
+        delay = self.reconnect_min
+        while True:
+            try:
+                session = await self.get_session()
+                async with session.ws_connect(
+                    self.ws_url,
+                    params={"clientId": self.client_id},
+                    heartbeat=30
+                ) as ws:
+                    self.connected = True
+                    delay = self.reconnect_min
+                    async for msg in ws:
+                        # 二进制消息为预览图，忽略
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._dispatch(msg.json())
+                        elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("WebSocket 连接失败", extra={"url": self.ws_url, "error": str(e)})
+
+            self._set_disconnected()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max)
+
+    def _dispatch(self, message: Dict):
+        event = message.get("type")
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+
+        if event == "execution_start":
+            self._started[prompt_id] = time.time()
+            if len(self._started) > self._recent_size:
+                self._started.popitem(last=False)
+        elif event == "progress":
+            callback = self._progress_callbacks.get(prompt_id)
+            if callback and data.get("max"):
+                callback(prompt_id, data["value"] / data["max"])
+        elif event in FINISH_EVENTS or (event == "executing" and data.get("node") is None):
+            self._finish(prompt_id, event)
+
+    def _finish(self, prompt_id: str, event: str):
+        self._recent[prompt_id] = event
+        if len(self._recent) > self._recent_size:
+            self._recent.popitem(last=False)
+        for future in self._waiters.get(prompt_id, []):
+            if not future.done():
+                future.set_result(True)
+
+    def started_at(self, prompt_id: str) -> Optional[float]:
+        """prompt 开始执行的时间（Unix 时间，收到 execution_start 事件时记录），未收到时返回 None"""
+        return self._started.get(prompt_id)
+
+    def _set_disconnected(self):
+        self.connected = False
+        for waiters in self._waiters.values():
+            for future in waiters:
+                if not future.done():
+                    future.set_result(False)
@@ -0,0 +1,115 @@
+import uuid
+import asyncio
+from typing import TYPE_CHECKING, Collection, Coroutine, Dict, List, Optional, Set
+from common.comfy_adapter.journal import journal_context
+from common.comfy_adapter.types import SchedulingTicket, WorkflowStatus
+from common.utils.tracing import current_request_id, start_trace, use_span
+from .types import Job, JobState
+from .store import JobStore, create_job_store
+
+if TYPE_CHECKING:
+    from common.base_service.service import BaseService
+    from common.base_service.workflow_template import PreparedWorkflow
+
+# 各阶段对应的粗粒度进度
+SUBMITTED_PROGRESS = 0.1
+DOWNLOADING_PROGRESS = 0.9  # 生成完成，正在下载结果
+
+
+class JobManager:
+    """提交即返回的任务管理：后台协程执行工作流，状态写入 JobStore"""
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(
+        self,
+        service: "BaseService",
+        user_inputs: List[Dict],
+        ticket: Optional[SchedulingTicket] = None,
+        rendition: Optional[str] = None
+    ) -> Job:
+        """校验并注入参数后立即返回任务（参数错误直接抛出 400，后端满载抛出 429）"""
+        workflow = await service.build_workflow(user_inputs)
+        service.check_admission(workflow)
+        job = Job(job_id=uuid.uuid4().hex, service_name=service.service_name)
+        self.store.save(job)
+
+        self.run_in_background(self._run(job, service, workflow, ticket, rendition))
+        return job
+
+    def run_in_background(self, coro: Coroutine) -> asyncio.Task:
+        """创建后台协程，关闭时统一取消"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    async def _run(
+        self,
+        job: Job,
+        service: "BaseService",
+        workflow: "PreparedWorkflow",
+        ticket: Optional[SchedulingTicket],
+        rendition: Optional[str] = None
+    ):
+        # 后台任务单独成一条追踪，沿用提交请求的 request_id
+        root = start_trace("job", current_request_id(), job_id=job.job_id, service=service.service_name)
+        with use_span(root), journal_context(job_id=job.job_id):
+            try:
+                job.result = await service.run_workflow(
+                    workflow,
+                    on_status=lambda status: self._on_status(job, status),
+                    ticket=ticket,
+                    rendition=rendition
+                )
+                job.state = JobState.COMPLETED
+                job.progress = 1.0
+            except Exception as e:
+                job.state = JobState.FAILED
+                job.error = f"执行失败: {str(e)}"
+                root.end(error=job.error)
+            self.store.save(job)
+
+    def _on_status(self, job: Job, status: WorkflowStatus):
+        """执行过程中的状态回调，仅在状态变化时落盘"""
+        if status.completed:
+            progress = DOWNLOADING_PROGRESS
+        elif status.progress is not None:
+            progress = SUBMITTED_PROGRESS + (DOWNLOADING_PROGRESS - SUBMITTED_PROGRESS) * status.progress
+        else:
+            progress = SUBMITTED_PROGRESS
+        # 进度只增不减（多个节点的 progress 事件会各自从 0 开始）
+        progress = round(max(job.progress, progress), 3)
+        if (job.state, job.prompt_id, job.status_str, job.progress) == \
+                (JobState.RUNNING, status.prompt_id, status.status_str, progress):
+            return
+        job.state = JobState.RUNNING
+        job.prompt_id = status.prompt_id
+        job.status_str = status.status_str
+        job.progress = progress
+        self.store.save(job)
+
+    def recover(self, exclude: Collection[str] = ()) -> int:
+        """启动时将上次进程遗留的未完成任务标记为失败；exclude 为可从提交日志恢复的任务"""
+        return self.store.fail_unfinished("网关重启，任务已中断", exclude)
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self.store.close()
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """进程内共享的任务管理器"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(create_job_store())
+    return _job_manager
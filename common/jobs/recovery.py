@@ -0,0 +1,109 @@
+import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from common.base_service.service import BaseService
+from common.comfy_adapter.journal import get_prompt_journal
+from common.comfy_adapter.outputs import index_outputs
+from common.comfy_adapter.result_cache import get_result_cache
+from common.comfy_adapter.server_pool import journal_finish, reattach
+from common.comfy_adapter.types import JournalEntry, PromptState
+from common.utils.file_handler import get_output_subdir
+from common.utils.tracing import start_trace, use_span
+from .manager import JobManager
+from .types import JobState
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 等待仍在执行的 prompt 的最长时间（秒）、同时恢复的 prompt 数
+RECOVERY_TIMEOUT = float(os.getenv("PROMPT_RECOVERY_TIMEOUT", 3600))
+RECOVERY_CONCURRENCY = int(os.getenv("PROMPT_RECOVERY_CONCURRENCY", 8))
+
+
+async def recover_prompts(manager: JobManager, started_at: Optional[float] = None) -> Dict[str, int]:
+    """网关启动时恢复上次进程提交到 ComfyUI、尚未取回结果的 prompt
+
+    按提交日志重新关联（不重新提交）：已结束的从 /history 取回结果，仍在执行的等待完成；
+    结果下载到输出目录后写入结果缓存（客户端重试时直接命中）并完成对应的异步任务。
+    不在日志中的未完成任务仍按原逻辑标记为失败。
+    """
+    journal = get_prompt_journal()
+    entries = await asyncio.to_thread(journal.unfinished, started_at) if journal is not None else []
+    interrupted = manager.recover(exclude={entry.job_id for entry in entries if entry.job_id})
+    if interrupted:
+        logger.warning("未完成任务因重启被标记为失败", extra={"jobs": interrupted})
+    if not entries:
+        return {}
+
+    logger.info("开始恢复上次提交的 prompt", extra={"prompts": len(entries)})
+    semaphore = asyncio.Semaphore(RECOVERY_CONCURRENCY)
+
+    async def recover(entry: JournalEntry) -> str:
+        async with semaphore:
+            return await _recover_entry(manager, entry)
+
+    states = Counter(await asyncio.gather(*(recover(entry) for entry in entries)))
+    logger.info("prompt 恢复完成", extra={"states": dict(states)})
+    return dict(states)
+
+
+async def _recover_entry(manager: JobManager, entry: JournalEntry) -> str:
+    root = start_trace(
+        "recover",
+        entry.job_id or entry.prompt_id,
+        prompt_id=entry.prompt_id,
+        backend=entry.backend,
+        service=entry.service
+    )
+    with use_span(root):
+        try:
+            backend, status = await reattach(entry.backend, entry.prompt_id, RECOVERY_TIMEOUT)
+        except Exception as e:
+            status, error = None, f"重新关联失败: {type(e).__name__}: {str(e)}"
+        else:
+            if status is None:
+                error = "ComfyUI 中已找不到该 prompt"
+            elif not status.completed:
+                error = f"ComfyUI 执行失败: {status.status_str}"
+            else:
+                error = None
+
+        if error is not None:
+            state = PromptState.LOST if status is None else PromptState.FAILED
+            root.end(error=error)
+            journal_finish(entry.prompt_id, state, error)
+            _finish_job(manager, entry, error=f"执行失败: {error}")
+            return state
+
+        images = await backend.executor.download_images(
+            status.images_meta,
+            str(get_output_subdir(entry.service, entry.prompt_id, entry.created_at))
+        )
+        await index_outputs(entry.prompt_id, entry.service, backend.name, images)
+        result = {"prompt_id": entry.prompt_id, "backend": backend.name, "images": images}
+        cache = get_result_cache()
+        if entry.cache_key and cache is not None:
+            await cache.put(entry.cache_key, result)
+        journal_finish(entry.prompt_id, PromptState.RECOVERED, BaseService._download_error(images))
+        _finish_job(manager, entry, result={**BaseService.format_result(result), "recovered": True})
+        return PromptState.RECOVERED
+
+
+def _finish_job(manager: JobManager, entry: JournalEntry, result: Optional[Dict] = None, error: Optional[str] = None):
+    job = manager.get(entry.job_id) if entry.job_id else None
+    if job is None or job.finished:
+        return
+    job.result, job.error = result, error
+    job.state = JobState.COMPLETED if error is None else JobState.FAILED
+    if error is None:
+        job.progress = 1.0
+    manager.store.save(job)
+
+
+def start_recovery(manager: JobManager) -> asyncio.Task:
+    """在后台执行恢复（不阻塞启动）；只处理本进程启动之前提交的 prompt"""
+    return manager.run_in_background(recover_prompts(manager, time.time()))
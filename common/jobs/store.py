@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Collection, Dict, Optional
+from dotenv import load_dotenv
+from common.utils.file_handler import get_state_path
+from .types import Job, JobState
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# SQLite 存储的合并写入间隔（秒）：期间同一任务的多次更新只写最后一次，每批一个事务
+JOB_FLUSH_INTERVAL = float(os.getenv("JOB_FLUSH_INTERVAL", 0.2))
+PRUNE_INTERVAL = 60  # 内存存储清理过期任务的最小间隔（秒）
+PRUNE_EVERY = 100  # SQLite 存储每写入多少批清理一次
+
+
+class JobStore(ABC):
+    """任务存储接口：实现 save/get/prune 即可替换后端"""
+
+    def __init__(self, max_jobs: int = 10000, ttl: float = 24 * 3600):
+        self.max_jobs = max_jobs  # 最多保留的任务数
+        self.ttl = ttl  # 已结束任务的保留时长（秒）
+
+    @abstractmethod
+    def save(self, job: Job):
+        """新增或更新任务"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        """按 ID 查询任务"""
+
+    @abstractmethod
+    def prune(self):
+        """清理过期/超量的已结束任务"""
+
+    def fail_unfinished(self, reason: str, exclude: Collection[str] = ()) -> int:
+        """将上次进程遗留的未完成任务标记为失败（内存存储无遗留任务）；exclude 中的任务仍可恢复，不做处理"""
+        return 0
+
+    def close(self):
+        pass
+
+
+class MemoryJobStore(JobStore):
+    """进程内存储，按创建顺序淘汰；过期任务在查询时即不可见，并在写入时定期清理"""
+
+    def __init__(self, max_jobs: int = 10000, ttl: float = 24 * 3600):
+        super().__init__(max_jobs, ttl)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pruned_at = time.monotonic()
+
+    def save(self, job: Job):
+        job.updated_at = time.time()
+        self._jobs[job.job_id] = job
+        if len(self._jobs) > self.max_jobs or time.monotonic() - self._pruned_at > min(self.ttl, PRUNE_INTERVAL):
+            self.prune()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None and self._expired(job, time.time() - self.ttl):
+            del self._jobs[job_id]
+            return None
+        return job
+
+    @staticmethod
+    def _expired(job: Job, expire_before: float) -> bool:
+        return job.finished and job.updated_at < expire_before
+
+    def prune(self):
+        self._pruned_at = time.monotonic()
+        expire_before = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if self._expired(job, expire_before):
+                del self._jobs[job_id]
+
+        # 仍然超量时，从最旧的已结束任务开始淘汰（运行中的任务不淘汰）
+        overflow = len(self._jobs) - self.max_jobs
+        for job_id, job in list(self._jobs.items()):
+            if overflow <= 0:
+                break
+            if job.finished:
+                del self._jobs[job_id]
+                overflow -= 1
+
+
+class SqliteJobStore(JobStore):
+    """SQLite 存储，进程重启后仍可查询历史任务
+
+    save 在事件循环中只记下任务的最新状态，由后台线程每隔 flush_interval 合并写入
+    （同一任务的多次进度更新只写最后一次，每批一个事务，synchronous=NORMAL）；
+    get 优先返回尚未落盘的状态。进程崩溃时最多丢失一个批次间隔内的状态更新。
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_jobs: int = 10000,
+        ttl: float = 24 * 3600,
+        flush_interval: float = JOB_FLUSH_INTERVAL
+    ):
+        super().__init__(max_jobs, ttl)
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()  # 保护数据库连接；写入线程在取出批次到提交完成期间一直持有
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated_at)")
+        self._conn.commit()
+        self._pending: Dict[str, tuple] = {}
+        self._changed = threading.Condition()  # 保护 _pending / _writing / _closed
+        self._writing = False
+        self._closed = False
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="job-store", daemon=True)
+        self._thread.start()
+
+    def save(self, job: Job):
+        job.updated_at = time.time()
+        row = (job.job_id, job.state, job.created_at, job.updated_at,
+               json.dumps(job.to_dict(), ensure_ascii=False))
+        with self._changed:
+            self._pending[job.job_id] = row
+            self._changed.notify_all()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._changed:
+            row = self._pending.get(job_id)
+        if row is not None:
+            return Job(**json.loads(row[4]))
+        # 写入线程取出批次后一直持有 _lock 直到提交，这里读到的不会早于已取出的状态
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return Job(**json.loads(row[0])) if row else None
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._pending and not self._closed:
+                    self._changed.wait()
+                if not self._pending:
+                    return
+                # 等待一个合并间隔，期间的更新一并写入；关闭时立即写入
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and time.monotonic() < deadline:
+                    self._changed.wait(deadline - time.monotonic())
+            with self._lock:
+                with self._changed:
+                    batch, self._pending = list(self._pending.values()), {}
+                    self._writing = True
+                try:
+                    self._write(batch)
+                except sqlite3.Error:
+                    logger.exception("任务状态写入失败", extra={"records": len(batch)})
+                finally:
+                    with self._changed:
+                        self._writing = False
+                        self._changed.notify_all()
+
+    def _write(self, batch):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO jobs (job_id, state, created_at, updated_at, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                batch
+            )
+        self.batches += 1
+        # 每写入一定批数做一次清理，避免每次写入都扫描
+        if self.batches % PRUNE_EVERY == 0:
+            self._prune()
+
+    def flush(self):
+        """等待已保存的状态全部写入数据库"""
+        with self._changed:
+            while self._pending or self._writing:
+                self._changed.wait()
+
+    def prune(self):
+        with self._lock:
+            self._prune()
+
+    def _prune(self):
+        finished = tuple(JobState.FINISHED)
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?",
+                (*finished, time.time() - self.ttl)
+            )
+            self._conn.execute(
+                "DELETE FROM jobs WHERE job_id IN ("
+                "  SELECT job_id FROM jobs WHERE state IN (?, ?) ORDER BY created_at"
+                "  LIMIT MAX((SELECT COUNT(*) FROM jobs) - ?, 0))",
+                (*finished, self.max_jobs)
+            )
+
+    def fail_unfinished(self, reason: str, exclude: Collection[str] = ()) -> int:
+        """将上次进程遗留的未完成任务标记为失败；exclude 中的任务仍可恢复，不做处理"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, data FROM jobs WHERE state NOT IN (?, ?)", tuple(JobState.FINISHED)
+            ).fetchall()
+        failed = 0
+        for job_id, data in rows:
+            if job_id in exclude:
+                continue
+            job = Job(**json.loads(data))
+            job.state = JobState.FAILED
+            job.error = reason
+            self.save(job)
+            failed += 1
+        return failed
+
+    def close(self):
+        """写入剩余的状态后关闭"""
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join(timeout=10)
+        with self._lock:
+            self._conn.close()
+
+
+def create_job_store() -> JobStore:
+    """根据环境变量创建任务存储：JOB_STORE=memory|sqlite"""
+    backend = os.getenv("JOB_STORE", "memory")
+    max_jobs = int(os.getenv("JOB_MAX_JOBS", 10000))
+    ttl = float(os.getenv("JOB_TTL", 24 * 3600))
+
+    if backend == "memory":
+        return MemoryJobStore(max_jobs, ttl)
+    if backend == "sqlite":
+        return SqliteJobStore(os.getenv("JOB_DB_PATH") or str(get_state_path("jobs.db")), max_jobs, ttl)
+    raise ValueError(f"未知的任务存储类型: {backend}")
@@ -0,0 +1,33 @@
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Optional, Any
+
+
+class JobState:
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    FINISHED = (COMPLETED, FAILED)
+
+
+@dataclass
+class Job:
+    job_id: str
+    service_name: str
+    state: str = JobState.PENDING
+    prompt_id: Optional[str] = None
+    status_str: str = ""  # 最近一次 WorkflowStatus.status_str
+    progress: float = 0.0  # 0 ~ 1
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in JobState.FINISHED
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
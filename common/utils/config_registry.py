@@ -0,0 +1,148 @@
+import os
+import json
+import asyncio
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+from typing import Any, Callable, Dict, List, Optional, Tuple
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 检查配置文件变化的间隔（秒），0 表示关闭热加载
+CONFIG_RELOAD_INTERVAL = float(os.getenv("CONFIG_RELOAD_INTERVAL", 2))
+
+Stamp = Tuple[int, int]  # (mtime_ns, size)
+
+
+def _stamp(path: Path) -> Optional[Stamp]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_json(path: Path) -> Tuple[Any, Optional[Stamp]]:
+    # 先取 stamp 再读取：读取期间文件再次变化时，下一轮检查仍会发现
+    stamp = _stamp(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f), stamp
+
+
+class _Entry:
+    def __init__(self, value: Any, stamp: Optional[Stamp]):
+        self.value = value
+        self.stamp = stamp
+        self.callbacks: List[Callable[[Any], None]] = []
+
+
+class ConfigRegistry:
+    """JSON 配置文件（workflow.json / config.json / comfy_servers.json）的进程内缓存
+
+    首次读取后缓存解析结果，之后的读取不访问磁盘；后台任务按 mtime/size 轮询已加载的文件，
+    变化时重新解析并通知订阅者。解析失败时保留旧值，不影响正在执行的请求。
+    """
+
+    def __init__(self, interval: float = CONFIG_RELOAD_INTERVAL):
+        self.interval = interval
+        self.reloads = 0
+        self.errors = 0
+        self._entries: Dict[Path, _Entry] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(path) -> Path:
+        return Path(path).resolve()
+
+    def load_json(self, path) -> Any:
+        """读取 JSON 文件（已缓存时直接返回）；文件不存在时抛出 FileNotFoundError"""
+        key = self._key(path)
+        entry = self._entries.get(key)
+        if entry is None:
+            if not key.exists():
+                raise FileNotFoundError(f"配置文件缺失: {path}")
+            entry = self._entries[key] = _Entry(*_read_json(key))
+        return entry.value
+
+    def subscribe(self, path, callback: Callable[[Any], None]):
+        """文件内容变化并成功解析后，以新内容调用 callback（在事件循环中执行）"""
+        self.load_json(path)
+        self._entries[self._key(path)].callbacks.append(callback)
+
+    def invalidate(self, path=None):
+        """丢弃缓存，下次读取时重新加载（path 为空时丢弃全部）"""
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(self._key(path), None)
+
+    def start(self):
+        """启动后台轮询（需在事件循环内调用，重复调用无副作用）"""
+        if self.interval <= 0:
+            return
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("检查配置文件变化失败")
+
+    async def check(self) -> List[Path]:
+        """检查一次所有已加载的文件，返回重新加载的文件列表"""
+        changed = [
+            key for key, entry in list(self._entries.items())
+            if (stamp := _stamp(key)) is not None and stamp != entry.stamp
+        ]
+        reloaded = []
+        for key in changed:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            try:
+                # 读取与解析放到线程中，大工作流不阻塞事件循环
+                value, stamp = await asyncio.to_thread(_read_json, key)
+            except (OSError, ValueError) as e:
+                # 编辑器保存过程中可能读到不完整的文件，记录 stamp 避免重复报错，等待下一次变化
+                entry.stamp = _stamp(key)
+                self.errors += 1
+                logger.error("配置文件解析失败，继续使用旧配置", extra={"path": str(key), "error": str(e)})
+                continue
+            entry.value, entry.stamp = value, stamp
+            self.reloads += 1
+            reloaded.append(key)
+            logger.info("配置文件已重新加载", extra={"path": str(key)})
+            for callback in entry.callbacks:
+                try:
+                    callback(value)
+                except Exception:
+                    logger.exception("应用新配置失败", extra={"path": str(key)})
+        return reloaded
+
+    def stats(self) -> Dict:
+        return {
+            "files": len(self._entries),
+            "interval": self.interval,
+            "reloads": self.reloads,
+            "errors": self.errors
+        }
+
+
+_config_registry: Optional[ConfigRegistry] = None
+
+
+def get_config_registry() -> ConfigRegistry:
+    """进程内共享的配置缓存"""
+    global _config_registry
+    if _config_registry is None:
+        _config_registry = ConfigRegistry()
+    return _config_registry
@@ -1,9 +1,12 @@
 # common/utils/file_handler.py
 import os
-import json
-from typing import Dict, List
+import re
+import time
+import uuid
+from typing import Dict, List, Optional
 from pathlib import Path
 from dotenv import load_dotenv
+from common.utils.config_registry import get_config_registry
 
 # 加载环境变量
 load_dotenv()
@@ -23,12 +26,11 @@ def get_service_path(service_name: str) -> str:
     return Path(os.getenv("SERVICE_ROOT")) / service_name
     
 def get_service_config(service_name: str) -> Dict:
-    """获取服务配置"""
+    """获取服务配置（缓存的解析结果，文件变化时自动重新加载；调用方不得修改返回值）"""
     config_path = get_service_path(service_name) / "config.json"
     if not config_path.exists():
         raise FileNotFoundError(f"配置文件缺失: {config_path}")
-    with open(config_path, 'r') as f:
-        return json.load(f)
+    return get_config_registry().load_json(config_path)
     
 
 def get_project_root() -> Path:
@@ -50,3 +52,49 @@ def get_input_dir() -> Path:
 def get_output_dir() -> Path:
     """获取输出目录"""
     return Path(os.getenv("OUTPUT_DIR"))
+
+def get_state_path(filename: str) -> Path:
+    """网关自身状态文件（任务库、提交日志、输出索引等 SQLite 数据库）的路径：<STATE_DIR>/<filename>
+
+    STATE_DIR 默认为项目根目录下的 data/state（不在对外提供静态访问的输出目录中），不存在时自动创建
+    """
+    state_dir = Path(os.getenv("STATE_DIR") or get_project_root() / "data" / "state")
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir / filename
+
+def get_output_subdir(service_name: str, prompt_id: str, created_at: Optional[float] = None) -> Path:
+    """一次执行的输出目录：<OUTPUT_DIR>/<服务名>/<日期>/<prompt_id[:2]>/<prompt_id>/
+
+    按服务与日期分层，同一天内再按 prompt_id 前两位分片，避免单个目录下文件过多；
+    不同 prompt 的同名文件互不覆盖，按 prompt 整目录清理。
+    """
+    day = time.strftime("%Y-%m-%d", time.localtime(created_at))
+    safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", prompt_id) or "_"
+    return get_output_dir() / service_name / day / safe_id[:2] / safe_id
+
+def get_output_url_prefix() -> str:
+    """获取输出目录的静态访问前缀"""
+    return os.getenv("OUTPUT_URL_PREFIX", "/outputs").rstrip("/")
+
+def get_output_url(path: Path) -> Optional[str]:
+    """将输出目录下的文件路径转换为静态访问地址，不在输出目录下时返回 None"""
+    try:
+        relative = Path(path).resolve().relative_to(get_output_dir().resolve())
+    except ValueError:
+        return None
+    return f"{get_output_url_prefix()}/{relative.as_posix()}"
+
+def get_output_path(url: str) -> Optional[Path]:
+    """get_output_url 的逆操作：静态访问地址对应的输出文件路径，不是输出地址或越出输出目录时返回 None"""
+    prefix = get_output_url_prefix() + "/"
+    if not url or not url.startswith(prefix):
+        return None
+    output_dir = get_output_dir().resolve()
+    path = (output_dir / url[len(prefix):]).resolve()
+    return path if output_dir in path.parents else None
+
+
+def get_temp_path(path: Path) -> Path:
+    """同目录下的临时文件路径，写完后通过 os.replace 原子替换为目标文件"""
+    path = Path(path)
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
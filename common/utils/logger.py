@@ -0,0 +1,174 @@
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional
+from common.utils.metrics import REGISTRY
+from common.utils.tracing import current_request_id
+load_dotenv()
+
+# 单个字段（字符串）保留的最大长度，超出部分截断：避免 Base64 图片等大字段写入日志
+LOG_MAX_FIELD = int(os.getenv("LOG_MAX_FIELD", 1024))
+# 日志队列长度：写日志的线程只负责入队，队列满时丢弃并计数，不阻塞事件循环
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# LogRecord 自带的属性，其余属性（extra=...）作为结构化字段输出
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+def truncate(value: Any, limit: int = LOG_MAX_FIELD, depth: int = 4) -> Any:
+    """递归截断过长的字符串与过长的列表，返回新对象（不修改原值）"""
+    if isinstance(value, str):
+        if len(value) > limit:
+            return f"{value[:limit]}...(已截断 {len(value) - limit} 字符)"
+        return value
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    if depth <= 0:
+        return truncate(repr(value), limit, 0)
+    if isinstance(value, dict):
+        return {str(k): truncate(v, limit, depth - 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = list(value)
+        result = [truncate(v, limit, depth - 1) for v in items[:100]]
+        if len(items) > 100:
+            result.append(f"...(另有 {len(items) - 100} 项)")
+        return result
+    return truncate(str(value), limit, 0)
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行 JSON：ts / level / logger / request_id / msg，以及 extra 传入的字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage()
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RESERVED})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """本地调试用的单行文本格式"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {k: v for k, v in vars(record).items() if k not in _RESERVED}
+        line = (
+            f"{datetime.fromtimestamp(record.created).strftime('%H:%M:%S.%f')[:-3]} "
+            f"{record.levelname:<7} [{getattr(record, 'request_id', '-')}] {record.name}: {record.getMessage()}"
+        )
+        if fields:
+            line += " " + json.dumps(fields, ensure_ascii=False, default=str)
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class RequestQueueHandler(QueueHandler):
+    """在调用方完成取值与截断后入队，格式化与写出在后台线程中进行
+
+    request_id 需要在调用方的上下文中读取（contextvars），因此在入队前设置。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.request_id = current_request_id()
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        for key, value in list(vars(record).items()):
+            if key not in _RESERVED:
+                setattr(record, key, truncate(value))
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """解析按模块设置的日志级别："common.comfy_adapter=DEBUG,main=WARNING" """
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        if not level or not isinstance(logging.getLevelName(level.strip().upper()), int):
+            raise ValueError(f"无效的日志级别配置: {item}")
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+_handler: Optional[RequestQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    levels: Optional[str] = None,
+    fmt: Optional[str] = None,
+    log_file: Optional[str] = None
+):
+    """配置根日志器（重复调用无副作用）
+
+    LOG_LEVEL 为默认级别；LOG_LEVELS 按模块覆盖；LOG_FORMAT 为 json（默认）或 text；
+    LOG_FILE 设置后同时写入文件（兼容 logrotate）
+    """
+    global _handler, _listener
+    if _handler is not None:
+        return
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    levels = levels if levels is not None else os.getenv("LOG_LEVELS", "")
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+    log_file = log_file or os.getenv("LOG_FILE")
+
+    formatter = TextFormatter() if fmt == "text" else JsonFormatter()
+    outputs: List[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        outputs.append(WatchedFileHandler(log_file, encoding="utf-8"))
+    for output in outputs:
+        output.setFormatter(formatter)
+
+    _handler = RequestQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _listener = QueueListener(_handler.queue, *outputs, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+
+def shutdown_logging():
+    """写出队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_logs() -> int:
+    """因队列已满丢弃的日志条数"""
+    return _handler.dropped if _handler is not None else 0
+
+
+REGISTRY.gauge_callback("comfybox_log_dropped", "因日志队列已满丢弃的日志条数", lambda: [({}, dropped_logs())])
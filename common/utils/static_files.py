@@ -0,0 +1,125 @@
+import os
+import stat
+from email.utils import parsedate
+from pathlib import Path
+from typing import Optional
+from dotenv import load_dotenv
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+from common.utils.file_handler import get_output_dir
+load_dotenv()
+
+# 不会被覆盖的输出文件（分片目录、结果缓存）长期缓存；其余文件（如旧版平铺的文件）按 ETag 重新验证
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MUTABLE_CACHE_CONTROL = f"public, max-age={int(os.getenv('OUTPUT_CACHE_MAX_AGE', 0))}, must-revalidate"
+# 读取文件的块大小（服务器不支持零拷贝时），块越大线程切换越少
+OUTPUT_CHUNK_SIZE = int(os.getenv("OUTPUT_CHUNK_SIZE", 1024 * 1024))
+# 前置 nginx 时设置为 internal location 的前缀（如 /_outputs/），由 nginx 通过 X-Accel-Redirect 以 sendfile 发送
+OUTPUT_ACCEL_PREFIX = os.getenv("OUTPUT_ACCEL_PREFIX", "")
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+def is_immutable_output(relative: Path) -> bool:
+    """相对输出目录的路径是否指向内容不变的文件
+
+    - 结果缓存 _cache/<key[:2]>/<key>/<文件名>：按内容寻址
+    - 分片目录 <服务名>/<日期>/<prompt_id[:2]>/<prompt_id>/<文件名>：prompt_id 唯一，派生文件名带参数摘要
+    """
+    parts = relative.parts
+    if len(parts) == 4 and parts[0] == "_cache":
+        return parts[2][:2] == parts[1]
+    return len(parts) == 5 and parts[3][:2] == parts[2]
+
+
+def is_not_modified(request_headers: Headers, response_headers: Headers) -> bool:
+    """条件请求判断：同时带 If-None-Match 与 If-Modified-Since 时只看 If-None-Match（RFC 9110）"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response_headers["etag"]
+        return if_none_match.strip() == "*" or etag in (
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        )
+    if_modified_since = parsedate(request_headers.get("if-modified-since", ""))
+    last_modified = parsedate(response_headers["last-modified"])
+    return if_modified_since is not None and last_modified is not None and if_modified_since >= last_modified
+
+
+def is_internal_output(relative: Path) -> bool:
+    """不对外提供的文件：下载 / 编码中的临时文件（.<文件名>.<随机串>.part）与其他隐藏文件、结果缓存的 manifest.json"""
+    parts = relative.parts
+    if any(part.startswith(".") for part in parts):
+        return True
+    return len(parts) == 4 and parts[0] == "_cache" and parts[3] == "manifest.json"
+
+
+class OutputFileResponse(FileResponse):
+    """输出文件响应：Range / If-Range 由 FileResponse 处理（分块大小 OUTPUT_CHUNK_SIZE）；
+    服务器支持 ASGI zerocopysend 扩展时，不带 Range 的 GET 整文件以零拷贝发送
+    """
+
+    chunk_size = OUTPUT_CHUNK_SIZE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+        if not zerocopy or scope["method"].upper() != "GET" or "range" in Headers(scope=scope):
+            return await super().__call__(scope, receive, send)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        with open(self.path, "rb") as file:
+            await send({
+                "type": ZEROCOPY_EXTENSION,
+                "file": file,
+                "offset": 0,
+                "count": int(self.headers["content-length"]),
+                "more_body": False
+            })
+        if self.background is not None:
+            await self.background()
+
+
+def output_file_response(path: Path, request_headers: Headers, stat_result: Optional[os.stat_result] = None) -> Response:
+    """输出目录下文件的响应：ETag / Last-Modified 条件请求返回 304，按文件是否可变设置 Cache-Control，
+    配置 OUTPUT_ACCEL_PREFIX 时交给前置 nginx 发送；文件不在输出目录下、不存在或为内部文件时抛出 FileNotFoundError
+    """
+    output_dir = get_output_dir().resolve()
+    path = Path(path).resolve()
+    try:
+        relative = path.relative_to(output_dir)
+    except ValueError:
+        raise FileNotFoundError(path)
+    if is_internal_output(relative):
+        raise FileNotFoundError(path)
+    stat_result = stat_result or os.stat(path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_immutable_output(relative) else MUTABLE_CACHE_CONTROL
+    response = OutputFileResponse(path, stat_result=stat_result, headers={"cache-control": cache_control})
+    if is_not_modified(request_headers, response.headers):
+        return NotModifiedResponse(response.headers)
+    if OUTPUT_ACCEL_PREFIX:
+        headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+        headers["x-accel-redirect"] = OUTPUT_ACCEL_PREFIX.rstrip("/") + "/" + relative.as_posix()
+        return Response(status_code=200, headers=headers)
+    return response
+
+
+class OutputFiles(StaticFiles):
+    """输出目录的静态访问（替代 StaticFiles）：缓存策略、条件请求与发送方式同 output_file_response，内部文件返回 404"""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if is_internal_output(Path(path)):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        if status_code != 200:
+            return super().file_response(full_path, stat_result, scope, status_code)
+        try:
+            return output_file_response(Path(full_path), Headers(scope=scope), stat_result)
+        except FileNotFoundError:
+            # 输出目录内的符号链接指向目录外时按普通静态文件处理
+            return super().file_response(full_path, stat_result, scope, status_code)
@@ -0,0 +1,315 @@
+import os
+import logging
+import json
+import time
+import uuid
+import queue
+import asyncio
+import contextvars
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from typing import Any, Coroutine, Deque, Dict, Iterator, List, Optional
+from common.utils.metrics import STAGE_SECONDS
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 内存中保留的最近追踪数、单个追踪最多记录的 span 数
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 200))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 1000))
+SERVICE_NAME = "comfyuibox"
+# 需要追踪的接口前缀（静态文件、指标等不追踪）
+TRACE_PATHS = ("/service/", "/assets", "/jobs")
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """一次请求（或一个后台任务）的全部 span"""
+
+    def __init__(self, request_id: str):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.prompt_ids: List[str] = []
+
+    def to_dict(self) -> Dict:
+        root = self.spans[0] if self.spans else None
+        return {
+            "trace_id": self.trace_id,
+            "request_id": self.request_id,
+            "name": root.name if root else None,
+            "start_time": root.start_time if root else None,
+            "duration_ms": root.duration_ms if root else None,
+            "prompt_ids": self.prompt_ids,
+            "dropped_spans": self.dropped,
+            "spans": [span.to_dict() for span in self.spans]
+        }
+
+
+class Span:
+    """一段计时区间；end() 可重复调用，只有第一次生效"""
+
+    def __init__(self, name: str, trace: Trace, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        if len(trace.spans) < TRACE_MAX_SPANS:
+            trace.spans.append(self)
+        else:
+            trace.dropped += 1
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, error: str):
+        self.error = error
+
+    def end(self, error: Optional[str] = None) -> float:
+        """结束 span 并返回耗时（秒）"""
+        if self.duration_ms is None:
+            self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+            if error is not None:
+                self.error = error
+            if self.parent_id is None:
+                _finish_trace(self.trace)
+        return self.duration_ms / 1000
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+    def to_otlp(self) -> Dict:
+        """OTLP/JSON 格式的 span（时间为 Unix 纳秒字符串）"""
+        start_ns = int(self.start_time * 1e9)
+        end_ns = start_ns + int((self.duration_ms or 0) * 1e6)
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2 if self.parent_id is None else 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def start_trace(name: str, request_id: Optional[str] = None, **attributes) -> Span:
+    """开始新的追踪并返回根 span（根 span 结束时追踪进入环形缓冲区与导出器）"""
+    trace = Trace(request_id or uuid.uuid4().hex)
+    return Span(name, trace, None, {"request_id": trace.request_id, **attributes})
+
+
+def start_span(name: str, **attributes) -> Span:
+    """在当前 span 下创建子 span，但不切换当前 span（用于跨越 await / yield 的手动计时）
+
+    当前没有追踪时新建一个追踪。
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return start_trace(name, **attributes)
+    return Span(name, parent.trace, parent, attributes)
+
+
+@contextmanager
+def use_span(span: Span, end: bool = True) -> Iterator[Span]:
+    """将 span 设为当前 span，代码块内新建的 span（含其中创建的任务）都挂在它下面"""
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        if end:
+            span.end(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        if end:
+            span.end()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    with use_span(start_span(name, **attributes)) as current:
+        yield current
+
+
+@contextmanager
+def stage(name: str, service: str, backend: str = "", **attributes) -> Iterator[Span]:
+    """执行链路中的一个阶段：同时记录 span 与 comfybox_stage_seconds 直方图"""
+    with span(name, service=service, backend=backend or None, **attributes) as current:
+        try:
+            yield current
+        finally:
+            STAGE_SECONDS.observe(
+                time.perf_counter() - current._started,
+                stage=name,
+                service=service,
+                backend=backend
+            )
+
+
+def record_stage(name: str, service: str, backend: str, start_time: float, seconds: float, **attributes):
+    """补记一个已经结束的阶段（起始时间为 Unix 时间）：挂在当前 span 下，并记录 comfybox_stage_seconds"""
+    parent = _current_span.get()
+    if parent is not None:
+        current = Span(name, parent.trace, parent, {"service": service, "backend": backend or None, **attributes})
+        current.start_time = start_time
+        current.duration_ms = round(seconds * 1000, 3)
+    STAGE_SECONDS.observe(seconds, stage=name, service=service, backend=backend)
+
+
+def create_background_task(coro: Coroutine) -> asyncio.Task:
+    """在空白上下文中创建长期运行的后台任务
+
+    asyncio.create_task 会复制当前上下文；在请求中首次启动的后台循环若直接创建，之后的日志与 span
+    都会归到触发它的那个请求下
+    """
+    return contextvars.Context().run(asyncio.create_task, coro)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_request_id() -> str:
+    """当前请求的 ID（不在请求上下文中时返回 "-"），用于日志关联"""
+    current = _current_span.get()
+    return current.trace.request_id if current else "-"
+
+
+def add_prompt_id(prompt_id: str):
+    """将 ComfyUI prompt_id 关联到当前追踪"""
+    current = _current_span.get()
+    if current is not None and prompt_id not in current.trace.prompt_ids:
+        current.trace.prompt_ids.append(prompt_id)
+
+
+class TraceFileExporter:
+    """将结束的追踪以 OTLP/JSON（ExportTraceServiceRequest）逐行追加到文件，写入在后台线程完成"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[Trace]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        self._queue.put(trace)
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            payload = {
+                "resourceSpans": [{
+                    "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                    "scopeSpans": [{
+                        "scope": {"name": SERVICE_NAME},
+                        "spans": [span.to_otlp() for span in trace.spans]
+                    }]
+                }]
+            }
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning("追踪导出失败", extra={"path": self.path, "error": str(e)})
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+_recent: Deque[Trace] = deque(maxlen=TRACE_BUFFER_SIZE)
+_exporter = TraceFileExporter(os.getenv("TRACE_EXPORT_FILE")) if os.getenv("TRACE_EXPORT_FILE") else None
+
+
+def _finish_trace(trace: Trace):
+    _recent.append(trace)
+    if _exporter is not None:
+        _exporter.export(trace)
+
+
+def get_recent_traces(limit: int = 50) -> List[Dict]:
+    """最近结束的追踪（新的在前）"""
+    return [trace.to_dict() for trace in list(_recent)[::-1][:limit]]
+
+
+def get_trace(trace_or_request_id: str) -> Optional[Dict]:
+    for trace in reversed(_recent):
+        if trace_or_request_id in (trace.trace_id, trace.request_id):
+            return trace.to_dict()
+    return None
+
+
+class TracingMiddleware:
+    """为每个请求开始一条追踪：请求 ID 取 X-Request-ID 请求头（没有时生成），并写回响应头
+
+    使用纯 ASGI 中间件而非 BaseHTTPMiddleware，流式响应推送完成后根 span 才结束。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(TRACE_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        header = REQUEST_ID_HEADER.lower().encode("latin-1")
+        request_id = next(
+            (value.decode("latin-1") for key, value in scope["headers"] if key == header),
+            None
+        )
+        root = start_trace(f"{scope['method']} {scope['path']}", request_id[:128] if request_id else None)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                message["headers"] = list(message.get("headers", [])) + [
+                    (header, root.trace.request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        with use_span(root):
+            await self.app(scope, receive, send_with_request_id)
+
+
+def close_exporter():
+    if _exporter is not None:
+        _exporter.close()
@@ -1,105 +1,187 @@
 import os
-import json
+import time
 from fastapi import HTTPException
-from typing import List, Dict, Any
+from dotenv import load_dotenv
+from typing import Any, Callable, Dict, List, Optional, Tuple
+load_dotenv()
 
-def validate_inputs(inputs: List[Dict], mappings: List[Dict]) -> List[Dict]:
-    """
-    参数校验器：
-    1. 检查必填字段
-    2. 验证数据类型
-    3. 检查文件路径存在性
-    4. 应用默认值
+# filepath 参数的文件存在性检查结果缓存时间（秒），0 表示每次都检查
+FILE_CHECK_TTL = float(os.getenv("FILE_CHECK_TTL", 5))
+FILE_CHECK_MAX_ENTRIES = 4096
+
+
+class FileExistsCache:
+    """带 TTL 的文件存在性检查：同一路径在 TTL 内只访问一次文件系统（存在与不存在都缓存）"""
+
+    def __init__(self, ttl: float = FILE_CHECK_TTL, max_entries: int = FILE_CHECK_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[bool, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def exists(self, path: str) -> bool:
+        now = time.monotonic()
+        entry = self._entries.get(path)
+        if entry is not None and entry[1] > now:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        result = os.path.exists(path)
+        if self.ttl > 0:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[path] = (result, now + self.ttl)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+
+_file_cache = FileExistsCache()
+
+
+def get_file_cache() -> FileExistsCache:
+    return _file_cache
+
+
+def _to_int(value: Any) -> int:
+    return value if isinstance(value, int) else int(value)
+
+
+def _to_float(value: Any) -> float:
+    return value if isinstance(value, float) else float(value)
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).lower()
+    if text not in ("true", "false"):
+        raise ValueError(text)
+    return text == "true"
+
+
+def _to_str(value: Any) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+def _to_filepath(value: Any) -> Any:
+    if not isinstance(value, str) or not _file_cache.exists(value):
+        raise FileNotFoundError(value)
+    return value
+
+
+# data_type -> (类型转换函数, 无需转换的值类型, 转换失败时的提示)
+COERCERS: Dict[str, Tuple[Callable[[Any], Any], Optional[type], str]] = {
+    "int": (_to_int, int, "参数 {field} 需要整数类型"),
+    "float": (_to_float, float, "参数 {field} 需要浮点数类型"),
+    "bool": (_to_bool, bool, "参数 {field} 需要布尔类型"),
+    "str": (_to_str, str, "参数 {field} 需要字符串类型"),
+    "filepath": (_to_filepath, None, "文件路径不存在: {value}")
+}
+
+
+class FieldValidator:
+    """input_mappings 中的一个参数（加载时预先绑定类型转换函数与必填/默认值）"""
+
+    __slots__ = ("node_id", "field", "key", "data_type", "required", "default", "coerce", "exact_type", "error")
+
+    def __init__(self, mapping: Dict):
+        self.node_id = str(mapping.get("node_id"))
+        self.field = mapping.get("input_field")
+        self.key = (self.node_id, self.field)
+        self.data_type = mapping.get("data_type")
+        self.required = mapping.get("required", False)
+        self.default = mapping.get("default_value")
+        self.coerce, self.exact_type, self.error = COERCERS.get(self.data_type, (None, None, "未知数据类型: {data_type}"))
+
+    def validate(self, value: Any) -> Any:
+        if type(value) is self.exact_type:
+            return value
+        if self.coerce is None:
+            raise HTTPException(400, self.error.format(data_type=self.data_type))
+        try:
+            return self.coerce(value)
+        except (TypeError, ValueError, OSError):
+            raise HTTPException(400, self.error.format(field=self.field, value=value))
+
+
+class InputValidator:
+    """预编译的参数校验器（每个服务加载 config.json 时创建一次）
+
+    用户输入按 (node_id, input_field) 与映射对齐，与顺序无关：
+    [{"node_id": "5", "prompt": "..."}, {"node_id": "44", "image": "..."}]
+    不带 node_id 的输入项按位置对应第 i 个映射（兼容旧版请求）。
     """
-    validated_data = []
-    
-    for i, mapping in enumerate(mappings):
-
-        input = inputs[i]
-        node_id = mapping.get("node_id")
-        data_type = mapping.get("data_type")
-        field = mapping.get("input_field")
-        required = mapping.get("required", False)
-        default = mapping.get("default_value")
-
-        # 必填检查
-        if required and node_id != input.get("node_id"):
-            raise HTTPException(
-                status_code=400,
-                detail=f"输入缺失节点ID或者无法与映射节点ID对齐: {node_id}"
-            )
-
-        if required and field not in input:
-            raise HTTPException(
-                status_code=400,
-                detail=f"输入参数缺失: {field}"
-            )
-        
-        # 获取值（优先用户输入，否则使用默认值）
-        value = input.get(field, default)
-        
-        # 非必填且无默认值时跳过
-        if value is None and not required:
-            continue
-        
-        # 类型校验
-        if data_type == "int":
-            if not isinstance(value, int):
-                try:
-                    value = int(value)
-                    inputs[field] = value  # 自动转换类型
-                except:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"参数 {field} 需要整数类型"
-                    )
-        
-        elif data_type == "float":
-            if not isinstance(value, float):
-                try:
-                    value = float(value)
-                    inputs[field] = value
-                except:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"参数 {field} 需要浮点数类型"
-                    )
-        
-        elif data_type == "bool":
-            if not isinstance(value, bool):
-                if str(value).lower() in ["true", "false"]:
-                    value = str(value).lower() == "true"
-                    inputs[field] = value
-                else:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"参数 {field} 需要布尔类型"
-                    )
-        
-        elif data_type == "filepath":
-            if not os.path.exists(value):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"文件路径不存在: {value}"
-                )
-        
-        elif data_type == "str":
-            if not isinstance(value, str):
-                inputs[field] = str(value)
-        
-        else:
-            # 自定义类型校验（可扩展）
-            raise HTTPException(
-                status_code=400,
-                detail=f"未知数据类型: {data_type}"
-            )
-        
-        # 更新输入值（可能经过类型转换）
-        input[node_id] = value
-        validated_data.append(input)
-        
-
-    return validated_data
+
+    def __init__(self, mappings: List[Dict]):
+        self.fields = [FieldValidator(m) for m in mappings]
+        self._positional = [f.node_id for f in self.fields]
+
+    def _index(self, inputs: List[Dict]) -> Dict[Tuple[str, str], Any]:
+        index = {}
+        for i, item in enumerate(inputs):
+            if not isinstance(item, dict):
+                raise HTTPException(400, f"第 {i} 项输入必须是对象")
+            node_id = item.get("node_id")
+            if node_id is None:
+                if i >= len(self._positional):
+                    continue
+                node_id = self._positional[i]
+            node_id = str(node_id)
+            for key, value in item.items():
+                if key != "node_id":
+                    index[(node_id, key)] = value
+        return index
+
+    def validate(self, inputs: List[Dict]) -> List[Any]:
+        """返回按 input_mappings 顺序排列的参数值（None 表示使用工作流中的默认值）
+
+        1. 检查必填参数
+        2. 应用默认值
+        3. 类型转换（int / float / bool / str），filepath 检查文件存在（结果按 TTL 缓存）
+        """
+        if not isinstance(inputs, list):
+            raise HTTPException(400, "输入必须是列表: [{\"node_id\": ..., <参数名>: <值>}, ...]")
+        index = None
+        count = len(inputs)
+        values = []
+        for i, field in enumerate(self.fields):
+            # 常见情况：第 i 项输入正好对应第 i 个映射，无需建立索引
+            item = inputs[i] if i < count else None
+            if type(item) is dict and field.field in item and item.get("node_id", field.node_id) == field.node_id:
+                value = item[field.field]
+            else:
+                if index is None:
+                    index = self._index(inputs)
+                value = index.get(field.key)
+            if value is None:
+                if field.required:
+                    raise HTTPException(400, f"输入参数缺失: {field.field}（节点 {field.node_id}）")
+                value = field.default
+                # 非必填且无默认值时交由工作流默认值
+                if value is None:
+                    values.append(None)
+                    continue
+            values.append(field.validate(value))
+        return values
+
+    def validate_many(self, batch: List[List[Dict]]) -> Tuple[List[Optional[List[Any]]], List[Dict]]:
+        """批量校验：返回 (每组的参数值，失败项为 None；错误列表 [{"index", "detail"}])"""
+        results, errors = [], []
+        for i, inputs in enumerate(batch):
+            try:
+                results.append(self.validate(inputs))
+            except HTTPException as e:
+                results.append(None)
+                errors.append({"index": i, "detail": e.detail})
+        return results, errors
+
+
+def validate_inputs(inputs: List[Dict], mappings: List[Dict]) -> List[Any]:
+    """一次性校验（每次调用都重新编译映射）；服务内请使用加载时创建的 InputValidator"""
+    return InputValidator(mappings).validate(inputs)
 
 def validate_file_path(value: str):
     """验证文件路径格式"""
@@ -112,4 +194,4 @@ def validate_base64_image(data: str):
     if not data.startswith("data:image"):
         raise ValueError("无效的 Base64 图片格式")
     if len(data.split(",")) != 2:
-        raise ValueError("缺少 Base64 数据头")
\ No newline at end of file
+        raise ValueError("缺少 Base64 数据头")
@@ -1,7 +1,7 @@
 import axios from 'axios';
 
 // 定义基础 API URL
-const API_URL = 'http://10.5.101.151:8686' || import.meta.env.VITE_API_URL;
+export const API_URL = 'http://10.5.101.151:8686' || import.meta.env.VITE_API_URL;
 
 // 获取所有服务列表
 export const getServices = async () => {
@@ -1,3 +1,8 @@
+import { API_URL } from '../api/service.js';
+
+// 后端默认返回输出目录下的相对地址，需拼接 API 地址
+const resolveUrl = (img) => (img.startsWith('/') ? `${API_URL}${img}` : img);
+
 const ImageViewer = ({ images }) => {
   return (
     <div className="image-gallery">
@@ -6,8 +11,8 @@ const ImageViewer = ({ images }) => {
           {img.startsWith('data:image') ? (
             <img src={img} alt={`result-${index}`} />
           ) : (
-            <a href={`${img}`} download>
-              <img src={`${img}`} alt={`result-${index}`} />
+            <a href={resolveUrl(img)} download>
+              <img src={resolveUrl(img)} alt={`result-${index}`} />
               <button>下载</button>
             </a>
           )}
@@ -1,18 +1,35 @@
 # main.py
 import os
 import sys
-import importlib
+import logging
+import asyncio
 import uvicorn
 from pathlib import Path
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.routing import APIRouter
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from common.utils.file_handler import get_service_names, get_service_config
+from common.utils.file_handler import get_service_config, get_output_path, get_output_url_prefix
+from common.utils.static_files import OutputFiles, output_file_response
+from common.jobs.manager import get_job_manager
+from common.jobs.recovery import start_recovery
+from common.comfy_adapter.journal import close_prompt_journal, get_prompt_journal
+from common.comfy_adapter.renditions import close_renderer, get_renderer
+from common.comfy_adapter.outputs import close_outputs, get_output_index, get_output_janitor
+from common.comfy_adapter.server_pool import get_all_pools
+from common.comfy_adapter.assets import get_asset_store
+from common.utils.metrics import REGISTRY, CONTENT_TYPE
+from common.utils.tracing import TracingMiddleware, close_exporter, get_recent_traces, get_trace
+from common.utils.logger import setup_logging, shutdown_logging
+from common.utils.config_registry import get_config_registry
+from common.base_service.registry import ServiceRegistry
 from dotenv import load_dotenv
 load_dotenv()
 
+setup_logging()
+logger = logging.getLogger("main")
+
 # 添加项目根目录到 Python 路径
 ROOT_DIR = Path(os.getenv("PROJECT_ROOT")).resolve()
 OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR")).resolve()
@@ -21,6 +38,10 @@ sys.path.append(str(ROOT_DIR))
 # 创建主应用
 app = FastAPI()
 
+# 服务注册表；已加载的服务实例（用于关闭连接池等生命周期管理）
+service_registry = ServiceRegistry(Path(os.getenv("SERVICE_ROOT")))
+loaded_services = service_registry.loaded
+
 # 在主程序中添加服务列表接口
 @app.get("/services")
 def list_services():
@@ -29,78 +50,169 @@ def list_services():
             "name": name,
             "input_parameters": get_service_config(name).get("input_mappings", [])
         }
-        for name in get_service_names()
+        for name, lazy in service_registry.services.items() if lazy.state != "failed" or lazy.instance
     ]
 
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(404, f"任务不存在: {job_id}")
+    return job.to_dict()
+
+@app.get("/prompts/{prompt_id}/outputs")
+def list_prompt_outputs(prompt_id: str):
+    """按 ComfyUI prompt_id 查询输出文件（来自输出索引，不扫描输出目录）"""
+    index = get_output_index()
+    if index is None:
+        raise HTTPException(404, "输出索引未启用（OUTPUT_INDEX_ENABLED=0）")
+    outputs = index.by_prompt(prompt_id)
+    if not outputs:
+        raise HTTPException(404, f"没有该 prompt 的输出或已被清理: {prompt_id}")
+    return {"prompt_id": prompt_id, "outputs": outputs}
+
+@app.api_route("/prompts/{prompt_id}/outputs/{filename}", methods=["GET", "HEAD"])
+def read_prompt_output(prompt_id: str, filename: str, request: Request):
+    """按 prompt_id 下载输出文件（含派生图片），支持 Range、ETag / If-None-Match、Last-Modified"""
+    index = get_output_index()
+    path = index.locate(prompt_id, filename) if index is not None else None
+    return _output_response(path, request, f"{prompt_id}/{filename}")
+
+@app.api_route("/jobs/{job_id}/outputs/{filename}", methods=["GET", "HEAD"])
+def read_job_output(job_id: str, filename: str, request: Request):
+    """按任务 ID 下载结果中的输出文件（含结果缓存命中与派生图片）"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(404, f"任务不存在: {job_id}")
+    outputs = (job.result or {}).get("outputs", [])
+    url = next((output["url"] for output in outputs if output.get("filename") == filename), None)
+    return _output_response(get_output_path(url), request, f"{job_id}/{filename}")
+
+def _output_response(path, request: Request, name: str) -> Response:
+    if path is None:
+        raise HTTPException(404, f"输出文件不存在或已被清理: {name}")
+    try:
+        return output_file_response(path, request.headers)
+    except FileNotFoundError:
+        raise HTTPException(404, f"输出文件不存在或已被清理: {name}")
+
+@app.post("/assets")
+async def upload_asset(request: Request, filename: str = None):
+    """上传输入图片（请求体为文件内容），返回可在输入参数中使用的 asset:// 引用
+
+    相同内容只保存一份；执行时按需传到实际派发的 ComfyUI 服务器
+    """
+    data = await request.body()
+    try:
+        asset = await asyncio.to_thread(
+            get_asset_store().put, data, request.headers.get("content-type"), filename
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {
+        "asset_id": asset.asset_id,
+        "ref": asset.ref,
+        "size": asset.size,
+        "content_type": asset.content_type
+    }
+
+@app.get("/backends")
+def list_backends():
+    """各服务器池的后端负载、健康状态与连接池统计"""
+    return [pool.stats() for pool in get_all_pools()]
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus 指标（文本格式）"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/debug/services")
+def service_report():
+    """服务注册报告：清单来源、注册耗时，以及每个服务的加载状态与耗时"""
+    return service_registry.stats()
+
+@app.get("/debug/journal")
+def journal_report():
+    """提交日志：各状态的 prompt 数与批量写入统计"""
+    journal = get_prompt_journal()
+    if journal is None:
+        raise HTTPException(404, "提交日志未启用（PROMPT_JOURNAL_ENABLED=0）")
+    return journal.stats()
+
+@app.get("/debug/renditions")
+def rendition_report():
+    """派生图片：编码/复用/失败次数与原图、派生图片的累计字节数"""
+    return get_renderer().stats()
+
+@app.get("/debug/outputs")
+def output_report():
+    """输出目录：索引中的 prompt 数、文件数与总大小，以及清理任务的配置与累计清理量"""
+    janitor = get_output_janitor()
+    if janitor is None:
+        raise HTTPException(404, "输出索引未启用（OUTPUT_INDEX_ENABLED=0）")
+    return janitor.stats()
+
+@app.get("/debug/traces")
+def list_traces(limit: int = 50):
+    """最近结束的请求追踪（新的在前），每条含各阶段 span 耗时与 ComfyUI prompt_id"""
+    return get_recent_traces(limit)
+
+@app.get("/debug/traces/{trace_id}")
+def read_trace(trace_id: str):
+    """按 trace_id 或 X-Request-ID 查询追踪"""
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(404, f"追踪不存在或已被淘汰: {trace_id}")
+    return trace
+
 @app.get("/routes")
 async def list_routes():
     return {route.path: route.name for route in app.routes}
 
 @app.on_event("startup")
 async def debug_routes():
-    print("\n=== 已注册路由 ===")
-    for route in app.routes:
-        if hasattr(route, "path"):
-            print(f"{route.path} -> {route.name}")
-    print("=================\n")
+    logger.debug("已注册路由", extra={
+        "routes": {route.path: route.name for route in app.routes if hasattr(route, "path")}
+    })
 
-# 动态加载所有服务
-def load_all_services():
+@app.on_event("startup")
+async def watch_configs():
+    # 工作流、服务配置与 comfy_servers.json 变化时自动重新加载，无需重启
+    get_config_registry().start()
+
+@app.on_event("startup")
+async def recover_jobs():
+    # 上次进程提交到 ComfyUI 的 prompt 在后台重新关联并取回结果（不重新提交）
+    start_recovery(get_job_manager())
 
-    services_root = Path(os.getenv("SERVICE_ROOT"))
-    for service_dir in services_root.iterdir():
-        # 跳过隐藏目录
-        if service_dir.name.startswith(("_", ".")):
-            continue
-
-        print(f"正在加载服务目录: {service_dir}")
-        if not service_dir.is_dir():
-            continue
-            
-        # 验证服务完整性
-        service_file = service_dir / "service.py"
-        if not service_file.exists():
-            print(f"⚠️ 服务 {service_name} 缺少 service.py")
-            continue
-
-        service_name = service_dir.name
-        if not (service_dir / "workflow.json").exists():
-            print(f"⚠️ 服务目录 {service_name} 缺少 workflow.json")
-            continue
-
-        print(f"  正在挂载服务: {service_name}")
-    
-        try:
-            # 动态导入服务模块
-            spec = importlib.util.spec_from_file_location(
-                f"services.{service_name}.service",
-                service_file
-            )
-            service_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(service_module)
-            
-            # 创建服务实例
-            service_class = getattr(service_module, f"{service_name}Service")
-            service_instance = service_class()
-            
-            # 修正挂载方式（使用 include_router 而非 mount）
-            app.include_router(
-                service_instance.router,
-                prefix=f"/service/{service_name}",  # 主程序统一添加前缀
-                tags=[service_name]
-            )
-            
-            print(f"✅ 服务 {service_name} 已挂载到 /service/{service_name}")
-            print(f"  已注册路由: {[route.path for route in service_instance.router.routes]}")
-
-            
-        except Exception as e:
-            print(f"❌ 加载服务 {service_name} 失败: {str(e)}")
+@app.on_event("startup")
+async def clean_outputs():
+    # 按 OUTPUT_RETENTION / OUTPUT_MAX_BYTES 定期清理输出目录（均为 0 时不启动）
+    janitor = get_output_janitor()
+    if janitor is not None:
+        janitor.start()
+
+@app.on_event("shutdown")
+async def close_services():
+    for service_instance in loaded_services.values():
+        await service_instance.close()
+    await get_job_manager().close()
+    close_prompt_journal()
+    close_renderer()
+    await close_outputs()
+    await get_config_registry().stop()
+    close_exporter()
+    shutdown_logging()
+
+# 按服务清单注册所有服务的路由，服务实例在首次请求时创建（SERVICE_PRELOAD=1 时启动即加载）
+def load_all_services():
+    service_registry.mount(app)
+    if os.getenv("SERVICE_PRELOAD", "0") == "1":
+        service_registry.preload()
 
 # 自动加载所有服务
 load_all_services()
-print(f"\n=== 主程序路由表 ===")
-print({route.path: route.name for route in app.routes})
+logger.debug("主程序路由表", extra={"routes": {route.path: route.name for route in app.routes}})
 
 app.add_middleware(
     CORSMiddleware,
@@ -108,7 +220,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+app.add_middleware(TracingMiddleware)
+# 挂载输出目录（需在前端 "/" 之前挂载，否则请求会被前端静态目录拦截）
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+app.mount(
+    get_output_url_prefix(),
+    OutputFiles(directory=OUTPUT_DIR),
+    name="outputs"
+)
+
 # 挂载前端静态文件
 app.mount("/", StaticFiles(directory="frontend/dist", html=True), name="frontend")
 
@@ -120,13 +242,6 @@ async def read_index(request: Request):
         return {"error": "Frontend files not found. Please build the frontend first."}
     return index_file.read_text()
 
-# 挂载输出目录
-app.mount(
-    f"{str(OUTPUT_DIR)}",
-    StaticFiles(directory=OUTPUT_DIR),
-    name="outputs"
-)
-
 if __name__ == "__main__":
 
     # 修复启动方式（使用模块路径启动）
@@ -135,7 +250,7 @@ if __name__ == "__main__":
         "main:app",
         host=os.getenv("API_HOST", "0.0.0.0"),
         port=int(os.getenv("API_PORT", 8686)),
-        reload=True
+        reload=os.getenv("API_RELOAD", "0") == "1"
     )
 
 
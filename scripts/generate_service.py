@@ -1,10 +1,15 @@
 import os
+import sys
 import json
 import shutil
 import argparse
+from pathlib import Path
 from jinja2 import Environment, FileSystemLoader
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.base_service.manifest import build_manifest, get_manifest_path
+
 # 加载环境变量
 load_dotenv()
 
@@ -23,6 +28,11 @@ def parse_arguments():
         default=service_config,
         help='服务配置文件路径（默认: ../services_config.json）'
     )
+    parser.add_argument(
+        '--manifest-only',
+        action='store_true',
+        help='只根据现有服务目录重新生成服务清单'
+    )
     return parser.parse_args()
 
 def generate_services(config_file: str):
@@ -106,11 +116,25 @@ def parse_config(config_path: str) -> list:
     except Exception as e:
         raise ValueError(f"配置解析失败: {str(e)}")
 
+def generate_manifest():
+    """生成服务清单，网关启动时据此注册路由
+
+    清单是部署产物，不提交到仓库：部署时（或新增、删除服务、修改 config.json 后）运行
+    python scripts/generate_service.py --manifest-only 重新生成；没有清单时网关扫描服务目录
+    """
+    manifest = build_manifest(service_root, get_manifest_path())
+    broken = [s for s in manifest['services'] if s['error']]
+    print(f"\n服务清单已生成: {get_manifest_path()}（{len(manifest['services'])} 个服务）")
+    for service in broken:
+        print(f"  [警告] {service['name']}: {service['error']}")
+
 if __name__ == '__main__':
     args = parse_arguments()
     try:
-        generate_services(args.config)
-        print("\n=== 所有服务生成完毕！===")
+        if not args.manifest_only:
+            generate_services(args.config)
+            print("\n=== 所有服务生成完毕！===")
+        generate_manifest()
     except Exception as e:
         print(f"\n=== 生成终止: {str(e)} ===")
         exit(1)
\ No newline at end of file
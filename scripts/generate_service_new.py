@@ -35,16 +35,19 @@ def generate_services(config_file: str):
         generate_single_service(service)
 
 def generate_single_service(service_config: dict):
-    required_fields = ['name', 'server', 'workflow', 'config']
+    required_fields = ['name', 'workflow', 'config']
     if any(field not in service_config for field in required_fields):
         raise ValueError(f"服务配置缺失必要字段: {required_fields}")
+    if 'server' not in service_config and 'group' not in service_config:
+        raise ValueError("服务配置需要指定 server 或 group 字段")
     
     service_name = service_config['name']
-    server_name = service_config['server']
+    server_name = service_config.get('server')
+    server_group = service_config.get('group')
     service_dir = os.path.join(service_root, service_name)
     
     print(f"开始生成服务: {service_name}")
-    print(f"  关联服务器: {server_name}")
+    print(f"  关联服务器: {server_group or server_name}")
     print(f"  Workflow路径: {service_config['workflow']}")
     print(f"  Config路径: {service_config['config']}")
     
@@ -74,6 +77,7 @@ def generate_single_service(service_config: dict):
         content = template.render(
             service_name=service_name,
             server_name=server_name,  # 新增：传递服务器名称
+            server_group=server_group,  # 可选：按分组负载均衡
             input_mappings=parse_config(service_config['config'])
         )
         
@@ -14,6 +14,7 @@ def setup_environment():
         "WORKFLOW_DIR": str(project_root / "data/workflows"),
         "INPUT_DIR": str(project_root / "data/inputs"),
         "OUTPUT_DIR": str(project_root / "data/outputs"),
+        "STATE_DIR": str(project_root / "data/state"),
         "API_HOST": "0.0.0.0",
         "API_PORT": "8686",
         "WEBUI_HOST": "0.0.0.0",
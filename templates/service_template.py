@@ -4,7 +4,11 @@ class {{ service_name }}Service(BaseService):
     def __init__(self):
         super().__init__(
             service_name="{{ service_name }}",
+{%- if server_group %}
+            server_group="{{ server_group }}",  # 按服务器分组负载均衡
+{%- else %}
             server_name="{{ server_name }}",  # 新增服务器名称参数
+{%- endif %}
         )
         
         # 如果需要自定义路由
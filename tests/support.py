@@ -0,0 +1,47 @@
+"""测试共用的工具：进程内启动模拟 ComfyUI（benchmarks/fake_comfy.py）"""
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+from aiohttp.test_utils import TestServer
+from benchmarks.fake_comfy import create_app, parse_args
+from common.comfy_adapter.async_executor import AsyncComfyExecutor
+from common.comfy_adapter.types import ComfyConfig
+
+# 一个 SaveImage 节点的最小工作流（/prompt 请求体）
+WORKFLOW = {"prompt": {"9": {"class_type": "SaveImage", "inputs": {}}}}
+
+
+@asynccontextmanager
+async def fake_comfy(*argv: str) -> AsyncIterator[TestServer]:
+    """在随机端口启动模拟 ComfyUI，默认每个 prompt 执行 0.05 秒"""
+    server = TestServer(create_app(parse_args(["--exec-time", "fixed:0.05", "--image-kb", "1", *argv])))
+    await server.start_server()
+    try:
+        yield server
+    finally:
+        await server.close()
+
+
+@asynccontextmanager
+async def comfy_executor(server: TestServer, **kwargs) -> AsyncIterator[AsyncComfyExecutor]:
+    config = ComfyConfig(host=server.host, port=server.port, upload_dir="")
+    executor = AsyncComfyExecutor(config, **kwargs)
+    try:
+        yield executor
+    finally:
+        await executor.close()
+
+
+async def wait_until(condition: Callable[[], bool], timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待条件成立超时")
+        await asyncio.sleep(0.01)
+
+
+async def fake_stats(executor: AsyncComfyExecutor) -> dict:
+    session = await executor.get_session()
+    async with session.get(f"{executor.base_url}/system_stats") as response:
+        return (await response.json())["fake"]
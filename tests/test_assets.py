@@ -0,0 +1,26 @@
+import asyncio
+from common.comfy_adapter.assets import AssetStore
+from common.comfy_adapter.server_pool import Backend
+from .support import comfy_executor, fake_comfy, fake_stats
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 64
+
+
+def test_backend_recovery_forgets_transferred_inputs(tmp_path):
+    asset = AssetStore(str(tmp_path)).put(PNG, content_type="image/png")
+
+    async def main():
+        async with fake_comfy() as server, comfy_executor(server, use_websocket=False) as executor:
+            backend = Backend(executor.config, executor)
+            name = await backend.assets.ensure(asset)
+            assert await backend.assets.ensure(asset) == name
+            assert backend.assets.transferred == 1
+
+            # 后端重启后输入目录中可能已没有该文件，恢复可用时重新上传
+            backend.mark_down("重启")
+            backend.mark_up(queue_depth=0)
+            assert await backend.assets.ensure(asset) == name
+            assert backend.assets.transferred == 2
+            assert (await fake_stats(executor))["uploads"] == 2
+
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+import asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from .support import comfy_executor
+
+
+def query_status(responses):
+    """依次用 responses 中的响应回答 /history，返回查询结果与收到的请求数"""
+    calls = []
+
+    async def history(request):
+        calls.append(request.match_info["prompt_id"])
+        return responses[min(len(calls), len(responses)) - 1]()
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/history/{prompt_id}", history)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            async with comfy_executor(server, use_websocket=False) as executor:
+                return await executor.get_workflow_status("p1")
+        finally:
+            await server.close()
+
+    return asyncio.run(main()), len(calls)
+
+
+def test_status_query_retries_gateway_errors():
+    status, calls = query_status([
+        lambda: web.Response(status=503),
+        lambda: web.json_response({"p1": {"status": {"completed": True, "status_str": "success"}, "outputs": {}}})
+    ])
+    assert status.completed and status.error is None
+    assert calls == 2
+
+
+def test_status_query_does_not_retry_client_errors():
+    status, calls = query_status([lambda: web.Response(status=404)])
+    assert not status.completed and "404" in status.error
+    assert calls == 1
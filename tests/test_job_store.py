@@ -0,0 +1,50 @@
+import time
+from common.jobs.store import MemoryJobStore, SqliteJobStore
+from common.jobs.types import Job, JobState
+
+
+def test_memory_store_expires_finished_jobs_below_max_jobs():
+    store = MemoryJobStore(max_jobs=100, ttl=0.05)
+    done = Job(job_id="done", service_name="s", state=JobState.COMPLETED)
+    running = Job(job_id="running", service_name="s", state=JobState.RUNNING)
+    store.save(done)
+    store.save(running)
+    time.sleep(0.1)
+    assert store.get("done") is None
+    assert store.get("running") is running
+    store.save(Job(job_id="other", service_name="s"))
+    assert set(store._jobs) == {"running", "other"}
+
+
+def test_sqlite_store_coalesces_updates(tmp_path):
+    store = SqliteJobStore(str(tmp_path / "jobs.db"), flush_interval=0.05)
+    job = Job(job_id="j1", service_name="s", state=JobState.RUNNING)
+    for step in range(20):
+        job.progress = step / 20
+        store.save(job)
+        # 尚未落盘的状态同样可以查询到
+        assert store.get("j1").progress == job.progress
+    job.state = JobState.COMPLETED
+    store.save(job)
+    store.flush()
+    assert store.batches <= 2
+    store.close()
+
+    reopened = SqliteJobStore(str(tmp_path / "jobs.db"))
+    assert reopened.get("j1").state == JobState.COMPLETED
+    reopened.close()
+
+
+def test_sqlite_store_writes_pending_updates_on_close(tmp_path):
+    store = SqliteJobStore(str(tmp_path / "jobs.db"), flush_interval=10)
+    store.save(Job(job_id="j1", service_name="s", state=JobState.RUNNING))
+    time.sleep(0.05)  # 写入线程已在等待合并间隔
+    started = time.monotonic()
+    store.close()
+    assert time.monotonic() - started < 1
+
+    reopened = SqliteJobStore(str(tmp_path / "jobs.db"))
+    assert reopened.fail_unfinished("重启") == 1
+    reopened.flush()
+    assert reopened.get("j1").state == JobState.FAILED
+    reopened.close()
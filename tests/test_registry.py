@@ -0,0 +1,41 @@
+import asyncio
+from common.base_service.registry import LazyService
+
+SLOW_SERVICE = '''
+import time
+
+
+class SlowService:
+    loads = 0
+
+    def __init__(self):
+        time.sleep(0.2)
+        SlowService.loads += 1
+'''
+
+
+def test_first_requests_load_once_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setenv("SERVICE_ROOT", str(tmp_path))
+    (tmp_path / "Slow").mkdir()
+    (tmp_path / "Slow" / "service.py").write_text(SLOW_SERVICE, encoding="utf-8")
+    lazy = LazyService({"name": "Slow"})
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        instances = await asyncio.gather(*(lazy.aget() for _ in range(5)))
+        task.cancel()
+        return instances, ticks
+
+    instances, ticks = asyncio.run(main())
+    assert all(instance is lazy.instance for instance in instances)
+    assert type(lazy.instance).loads == 1
+    # 加载期间事件循环仍在运行其他协程
+    assert ticks >= 5
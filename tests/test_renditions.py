@@ -0,0 +1,23 @@
+import pytest
+from common.comfy_adapter.renditions import parse_renditions
+
+
+def test_custom_rendition_overrides_defaults(monkeypatch):
+    monkeypatch.delenv("OUTPUT_RENDITIONS", raising=False)
+    renditions = parse_renditions({"renditions": {"thumb": {"format": "jpeg", "max_size": 128}}})
+    assert renditions["thumb"].format == "jpeg" and renditions["thumb"].max_size == 128
+    assert "webp" in renditions
+
+
+@pytest.mark.parametrize("definition, message", [
+    ({"format": "webp", "qualty": 80}, "未知字段: qualty"),
+    ({"name": "other"}, "未知字段: name"),
+    ("webp", "定义需为对象"),
+    ({"format": "gif"}, "格式不受支持"),
+    ({"quality": "80"}, "quality"),
+    ({"max_size": 0}, "max_size"),
+])
+def test_invalid_rendition_raises_value_error(monkeypatch, definition, message):
+    monkeypatch.delenv("OUTPUT_RENDITIONS", raising=False)
+    with pytest.raises(ValueError, match=f"派生版本 bad .*{message}"):
+        parse_renditions({"renditions": {"bad": definition}})
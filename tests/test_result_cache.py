@@ -0,0 +1,104 @@
+import asyncio
+from common.comfy_adapter.result_cache import ResultCache
+from common.comfy_adapter.types import DownloadedImage
+
+
+def test_follower_survives_leader_disconnect(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path))
+        release = asyncio.Event()
+        runs = []
+
+        async def run():
+            runs.append(1)
+            await release.wait()
+            return {"prompt_id": "p1", "backend": "b", "images": []}
+
+        leader = asyncio.create_task(cache.get_or_run("k", run))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_run("k", run))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        result = await follower
+        assert leader.cancelled()
+        assert result["prompt_id"] == "p1" and result["cached"] is True
+        assert runs == [1]
+
+    asyncio.run(main())
+
+
+def test_last_waiter_leaving_cancels_execution(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path))
+        cancelled = asyncio.Event()
+
+        async def run():
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(cache.get_or_run("k", run)) for _ in range(2)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        assert not cancelled.is_set()
+        waiters[1].cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert cache.stats()["inflight"] == 0
+
+    asyncio.run(main())
+
+
+def test_failure_reaches_every_waiter(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path))
+
+        async def run():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(*(cache.get_or_run("k", run) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert cache.stats()["inflight"] == 0
+
+    asyncio.run(main())
+
+
+def _result(tmp_path, name: str, size: int) -> dict:
+    path = tmp_path / "outputs" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    return {"prompt_id": name, "backend": "b", "images": [DownloadedImage(filename=name, path=str(path), size=size)]}
+
+
+def test_put_evicts_least_recently_used(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+        await cache.put("a" * 64, _result(tmp_path, "a.png", 100))
+        await cache.put("b" * 64, _result(tmp_path, "b.png", 100))
+        assert cache.get("a" * 64) is not None  # a 变为最近使用
+        await cache.put("c" * 64, _result(tmp_path, "c.png", 100))
+        assert cache.get("b" * 64) is None
+        assert not cache._entry_dir("b" * 64).exists()
+        assert cache._entry_dir("a" * 64).exists() and cache._entry_dir("c" * 64).exists()
+        assert cache.stats()["bytes"] == 200 and cache.stats()["pending_removal"] == 0
+
+    asyncio.run(main())
+
+
+def test_expired_entry_is_rewritten(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path / "cache"), ttl=0.05)
+        key = "d" * 64
+        await cache.put(key, _result(tmp_path, "old.png", 10))
+        await asyncio.sleep(0.1)
+        assert cache.get(key) is None
+        await cache.put(key, _result(tmp_path, "new.png", 10))
+        assert [image.filename for image in cache.get(key)["images"]] == ["new.png"]
+        assert sorted(p.name for p in cache._entry_dir(key).iterdir()) == ["manifest.json", "new.png"]
+
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+from collections import Counter
+from benchmarks.sim_scheduler import FakeExecutor, FifoQueue, build_requests
+from common.comfy_adapter.scheduler import PRIORITIES, FairQueue, make_ticket
+from common.comfy_adapter.types import SchedulingTicket
+
+
+def ticket(flow: str, weight: float = 1.0, priority: str = "batch") -> SchedulingTicket:
+    return SchedulingTicket(flow=flow, priority=PRIORITIES[priority], weight=weight)
+
+
+def drain(queue: FairQueue, count: int = None):
+    count = len(queue) if count is None else count
+    return [queue.pop() for _ in range(count)]
+
+
+def test_round_robin_between_equal_flows():
+    queue = FairQueue()
+    for item in ("a1", "a2", "a3"):
+        queue.push(item, ticket("a"))
+    queue.push("b1", ticket("b"))
+    queue.push("c1", ticket("c"))
+    # 积压的流 a 不会挡住之后到达的 b、c
+    assert drain(queue) == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_idle_flow_gets_no_credit_for_unused_share():
+    queue = FairQueue()
+    for i in range(4):
+        queue.push(f"a{i}", ticket("a"))
+    assert drain(queue, 2) == ["a0", "a1"]
+    queue.push("b0", ticket("b"))
+    queue.push("b1", ticket("b"))
+    # b 从当前虚拟时间开始排队，不会因为之前空闲而连续出队两次
+    assert drain(queue) == ["b0", "a2", "b1", "a3"]
+
+
+def test_weight_ratio():
+    queue = FairQueue()
+    for i in range(300):
+        queue.push(("heavy", i), ticket("heavy", weight=2))
+    for i in range(300):
+        queue.push(("light", i), ticket("light", weight=1))
+    shares = Counter(flow for flow, _ in drain(queue, 90))
+    assert shares == {"heavy": 60, "light": 30}
+
+
+def test_interactive_always_before_batch():
+    queue = FairQueue()
+    for i in range(5):
+        queue.push(("batch", i), ticket("nightly", weight=100, priority="batch"))
+    queue.push(("interactive", 0), ticket("web", priority="interactive"))
+    queue.push(("interactive", 1), ticket("web", priority="interactive"))
+    assert [kind for kind, _ in drain(queue)] == ["interactive"] * 2 + ["batch"] * 5
+
+
+def test_discard_and_stats():
+    queue = FairQueue()
+    queue.push("a", ticket("svc:k1"))
+    queue.push("b", ticket("svc:k2", priority="interactive"))
+    queue.push("c", ticket("svc:k1"))
+    assert queue.stats() == {"batch": {"svc:k1": 2}, "interactive": {"svc:k2": 1}}
+    queue.discard("b")
+    queue.discard("missing")
+    assert len(queue) == 2
+    assert drain(queue) == ["a", "c"]
+
+
+def test_make_ticket_rejects_unknown_priority():
+    assert make_ticket("Svc", "interactive", "key").flow == "Svc:key"
+    try:
+        make_ticket("Svc", "urgent")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知优先级应抛出 ValueError")
+
+
+def simulate(queue, **kwargs):
+    executor = FakeExecutor(queue, max_in_flight=2)
+    for request in build_requests(**kwargs):
+        executor.submit(request)
+    return executor.run()
+
+
+def interactive_latency(finished):
+    return [r["finished"] - r["arrival"] for r in finished if r["flow"].startswith("GenerateStory")]
+
+
+def test_interactive_latency_with_batch_backlog():
+    scenario = {"batch_size": 50, "interactive_every": 3.0, "horizon": 60.0}
+    fair = interactive_latency(simulate(FairQueue(), **scenario))
+    fifo = interactive_latency(simulate(FifoQueue(), **scenario))
+    # 交互式请求最多等待一个批量任务（2 秒）释放名额，再执行 1 秒
+    assert max(fair) <= 3.0
+    assert max(fifo) > 30
+
+
+def test_batch_flows_share_slots_by_weight():
+    finished = simulate(FairQueue(), batch_size=100, interactive_every=1000.0, horizon=0.0)
+    started = sorted(finished, key=lambda r: (r["started"], r["id"]))
+    # 前 2 个请求到达时有空闲名额直接执行；之后经过队列的 60 个名额按权重 2:1 分配
+    shares = Counter(r["flow"] for r in started[2:62])
+    assert shares == {"MultiAngle:pipeline-a": 40, "MultiAngle:pipeline-b": 20}
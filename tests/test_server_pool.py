@@ -0,0 +1,35 @@
+import asyncio
+from common.comfy_adapter.circuit_breaker import BreakerState
+from common.comfy_adapter.server_pool import Backend, NoBackendAvailable, ServerPool
+from .support import WORKFLOW, comfy_executor, fake_comfy, fake_stats
+
+
+def test_half_open_backend_admits_one_probe_after_queueing(monkeypatch):
+    monkeypatch.setenv("COMFY_JOB_DEADLINE", "0")
+
+    async def main():
+        async with fake_comfy() as server, comfy_executor(server) as executor:
+            executor.config.max_in_flight = 2
+            backend = Backend(executor.config, executor)
+            pool = ServerPool("test", [backend])
+            # 占满执行名额，后续请求进入准入队列
+            for _ in range(2):
+                await backend.admission.acquire()
+            requests = [asyncio.create_task(pool.execute(WORKFLOW)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            assert backend.admission.queued == 2
+
+            # 排队期间熔断器进入半开状态，只允许一个探测请求
+            backend.breaker._state = BreakerState.HALF_OPEN
+            for _ in range(2):
+                backend.admission.release()
+            results = await asyncio.gather(*requests, return_exceptions=True)
+            prompts = (await fake_stats(executor))["prompts"]
+            await pool.close()
+            return results, prompts, backend.breaker.state
+
+    results, prompts, state = asyncio.run(main())
+    assert sum(isinstance(r, NoBackendAvailable) for r in results) == 1
+    completed = [r for r in results if not isinstance(r, Exception)]
+    assert len(completed) == 1 and completed[0][1].completed
+    assert prompts == 1 and state == BreakerState.CLOSED
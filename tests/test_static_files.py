@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from common.utils.static_files import IMMUTABLE_CACHE_CONTROL, OutputFileResponse, OutputFiles
+
+SHARDED = "GenerateStory/2026-10-18/ab/abcdef/out_0.png"
+CACHED = "_cache/cd/cdef/out_0.png"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path))
+    for relative in (SHARDED, CACHED, "_cache/cd/cdef/manifest.json", "GenerateStory/2026-10-18/ab/abcdef/.out_1.png.1234.part"):
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(bytes(range(256)) * 4)
+    app = Starlette(routes=[Mount("/outputs", OutputFiles(directory=str(tmp_path)))])
+    return TestClient(app)
+
+
+def test_immutable_output_and_conditional_get(client):
+    response = client.get(f"/outputs/{SHARDED}")
+    assert response.status_code == 200 and len(response.content) == 1024
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    etag = response.headers["etag"]
+    assert client.get(f"/outputs/{SHARDED}", headers={"If-None-Match": etag}).status_code == 304
+    # If-None-Match 不匹配时忽略 If-Modified-Since
+    response = client.get(f"/outputs/{SHARDED}", headers={
+        "If-None-Match": '"other"', "If-Modified-Since": response.headers["last-modified"]
+    })
+    assert response.status_code == 200
+
+
+def test_range_request(client):
+    response = client.get(f"/outputs/{CACHED}", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == bytes(range(10, 20))
+    assert response.headers["content-range"] == "bytes 10-19/1024"
+
+
+def test_internal_files_are_not_served(client):
+    assert client.get("/outputs/_cache/cd/cdef/manifest.json").status_code == 404
+    assert client.get("/outputs/GenerateStory/2026-10-18/ab/abcdef/.out_1.png.1234.part").status_code == 404
+
+
+def test_zerocopy_send(tmp_path):
+    path = tmp_path / "out.png"
+    path.write_bytes(b"x" * 100)
+    messages = []
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopysend":
+            message = {**message, "file": message["file"].read()}
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "headers": [], "extensions": {"http.response.zerocopysend": {}}}
+    asyncio.run(OutputFileResponse(path, stat_result=path.stat())(scope, None, send))
+    assert messages[0]["status"] == 200
+    assert messages[1] == {"type": "http.response.zerocopysend", "file": b"x" * 100, "offset": 0, "count": 100, "more_body": False}
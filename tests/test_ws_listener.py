@@ -0,0 +1,93 @@
+import asyncio
+from common.comfy_adapter.executor import execution_seconds
+from tests.support import WORKFLOW, comfy_executor, fake_comfy, fake_stats, wait_until
+
+
+def test_completion_event_over_shared_connection():
+    async def main():
+        async with fake_comfy("--progress-steps", "2") as server, comfy_executor(server) as executor:
+            executor.events.start()
+            await wait_until(lambda: executor.events.connected)
+            progress = []
+            prompt_ids = [await executor.submit_workflow(WORKFLOW) for _ in range(3)]
+            finished = await asyncio.gather(*(
+                executor.events.wait(prompt_id, 5, lambda _, value: progress.append(value))
+                for prompt_id in prompt_ids
+            ))
+            assert finished == [True, True, True]
+            assert progress and max(progress) == 1.0
+
+            status = await executor.wait_for_completion(prompt_ids[0])
+            assert status.completed
+            assert [meta.filename for meta in status.images_meta] == [f"{prompt_ids[0]}_9_0.png"]
+
+    asyncio.run(main())
+
+
+def test_polling_fallback_without_websocket():
+    async def main():
+        async with fake_comfy("--no-ws") as server, comfy_executor(server, poll_interval=0.1) as executor:
+            prompt_id = await executor.submit_workflow(WORKFLOW)
+            status = await asyncio.wait_for(executor.wait_for_completion(prompt_id), 5)
+            assert status.completed
+            assert not executor.events.connected
+            assert await executor.events.wait(prompt_id, 1) is False
+            # 提交、若干次 /history 轮询
+            assert executor.pool_stats()["requests"] > 2
+
+    asyncio.run(main())
+
+
+def test_finish_event_before_wait_is_not_lost():
+    async def main():
+        async with fake_comfy() as server, comfy_executor(server) as executor:
+            executor.events.start()
+            await wait_until(lambda: executor.events.connected)
+            prompt_id = await executor.submit_workflow(WORKFLOW)
+            await wait_until(lambda: prompt_id in executor.events._recent)
+            # 结束事件先于 wait() 到达：立即返回，不等待超时
+            assert await asyncio.wait_for(executor.events.wait(prompt_id, 30), 0.5) is True
+
+    asyncio.run(main())
+
+
+def test_execution_error_ends_wait():
+    async def main():
+        async with fake_comfy("--fail-rate", "1") as server, comfy_executor(server) as executor:
+            prompt_id = await executor.submit_workflow(WORKFLOW)
+            status = await asyncio.wait_for(executor.wait_for_completion(prompt_id), 5)
+            assert not status.completed and status.status_str == "error"
+            assert (await fake_stats(executor))["failed"] == 1
+
+    asyncio.run(main())
+
+
+def test_disconnect_wakes_waiters():
+    async def main():
+        async with fake_comfy("--hang-rate", "1") as server, comfy_executor(server) as executor:
+            executor.events.start()
+            await wait_until(lambda: executor.events.connected)
+            prompt_id = await executor.submit_workflow(WORKFLOW)
+            waiter = asyncio.create_task(executor.events.wait(prompt_id, 30))
+            await asyncio.sleep(0.05)
+            await executor.events.stop()
+            # 连接断开时返回 False，调用方回落到轮询
+            assert await asyncio.wait_for(waiter, 1) is False
+
+    asyncio.run(main())
+
+
+def test_execution_start_splits_queue_and_execution_time():
+    async def main():
+        async with fake_comfy("--exec-time", "fixed:0.2") as server, comfy_executor(server) as executor:
+            executor.events.start()
+            await wait_until(lambda: executor.events.connected)
+            first, second = [await executor.submit_workflow(WORKFLOW) for _ in range(2)]
+            statuses = await asyncio.gather(*(executor.wait_for_completion(p) for p in (first, second)))
+            # 单个执行槽：第二个 prompt 先排队约 0.2 秒，两者的执行时长都约为 0.2 秒
+            for status in statuses:
+                assert 0.15 <= execution_seconds(status) <= 0.4
+            started = [executor.events.started_at(p) for p in (first, second)]
+            assert None not in started and started[1] - started[0] >= 0.15
+
+    asyncio.run(main())